@@ -0,0 +1,115 @@
+"""Compares encoding and decoding transformed items, which contain
+datetimes, with the msgpack extension type that ``ocd_serializer`` uses
+for datetimes and with the legacy ``{'__datetime__': True, 'as_str': ...}``
+dicts.
+
+The items are ``(object_id, combined_index_doc, doc)`` tuples built from
+the documents in the test dumps, as they are passed between the
+transformer, enrichers and loader.
+
+Usage (from the root of the repository)::
+
+    python -m benchmarks.datetimes [--batch-size N] [--repeat N]
+"""
+from hashlib import sha1
+from timeit import default_timer
+import argparse
+import datetime
+import json
+import os
+
+import msgpack
+
+from ocd_backend.serializers import encoder, decoder, decode_datetime
+
+DUMPS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'tests',
+                         'ocd_backend', 'test_dumps')
+
+DATETIME_FIELDS = ('date', 'processing_started', 'processing_finished')
+
+
+def legacy_encode_datetime(obj):
+    if isinstance(obj, datetime.datetime):
+        return {'__datetime__': True, 'as_str': obj.isoformat()}
+    return obj
+
+
+def legacy_encoder(obj):
+    return msgpack.packb(obj, default=legacy_encode_datetime)
+
+
+def legacy_decoder(obj):
+    return msgpack.unpackb(obj, object_hook=decode_datetime)
+
+
+def parse_datetimes(doc):
+    """Replaces the ISO 8601 strings in ``DATETIME_FIELDS`` of ``doc`` (and
+    its meta) by datetimes, like the items of the pipeline contain."""
+    for d in (doc, doc.get('meta', {})):
+        for field in DATETIME_FIELDS:
+            if field in d:
+                try:
+                    d[field] = datetime.datetime.strptime(
+                        d[field], '%Y-%m-%dT%H:%M:%S.%f')
+                except ValueError:
+                    d[field] = datetime.datetime.strptime(
+                        d[field], '%Y-%m-%dT%H:%M:%S')
+    return doc
+
+
+def load_item():
+    with open(os.path.join(DUMPS_DIR, 'combined_index_doc.json')) as f:
+        combined_index_doc = parse_datetimes(json.load(f))
+    with open(os.path.join(DUMPS_DIR, 'index_doc.json')) as f:
+        doc = parse_datetimes(json.load(f))
+
+    object_id = sha1(combined_index_doc['meta']['original_object_id'])\
+        .hexdigest()
+
+    return object_id, combined_index_doc, doc
+
+
+def benchmark(encode, decode, message, repeat):
+    started = default_timer()
+    for _ in xrange(repeat):
+        payload = encode(message)
+    encode_seconds = (default_timer() - started) / repeat
+
+    started = default_timer()
+    for _ in xrange(repeat):
+        decoded = decode(payload)
+    decode_seconds = (default_timer() - started) / repeat
+
+    assert decoded == message
+
+    return len(payload), encode_seconds * 1e6, decode_seconds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='the number of items in a batch message')
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    item = load_item()
+    messages = [
+        ('single item', list(item)),
+        ('batch of %d items' % args.batch_size, [[list(item)] * args.batch_size])
+    ]
+    serializers = [
+        ('legacy dicts', legacy_encoder, legacy_decoder),
+        ('extension type', encoder, decoder)
+    ]
+
+    print '%-20s %-16s %10s %12s %12s' % ('message', 'datetimes', 'bytes',
+                                          'encode us', 'decode us')
+    for message_name, message in messages:
+        for serializer_name, encode, decode in serializers:
+            print '%-20s %-16s %10d %12.1f %12.1f' % (
+                (message_name, serializer_name) +
+                benchmark(encode, decode, message, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
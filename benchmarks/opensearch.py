@@ -0,0 +1,219 @@
+"""Compares the way the Opensearch extractor used to split a page into
+items (a deep copy of the channel per item) with the current one (the
+channel is serialized once, and each item is inserted into it), and the
+time it takes to page through a result set with a fixed delay between
+requests and with the adaptive rate limiter.
+
+The pages are generated, and modelled after the responses of the
+Nationaal Archief Beeldbank. The paging comparison uses a simulated
+clock and endpoint, which rejects requests (with a 429 status) that
+exceed its capacity. With a fixed delay, the extractor used to skip
+rejected pages; with the adaptive rate limiter, the extractor's own
+``opensearch_call`` is used, which retries rejected pages up to
+``settings.HTTP_RETRIES`` times before it skips them.
+
+Usage (from the root of the repository)::
+
+    python -m benchmarks.opensearch [--items N] [--repeat N] [--pages N]
+        [--latency SECONDS] [--capacity REQUESTS_PER_SECOND]
+        [--delay SECONDS]
+"""
+from copy import deepcopy
+from timeit import default_timer
+import argparse
+
+from lxml import etree
+import mock
+from requests.exceptions import HTTPError
+
+from ocd_backend.extractors.opensearch import OpensearchExtractor
+
+PAGE_HEADER = """<rss version="2.0"
+     xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/"
+     xmlns:dc="http://purl.org/dc/elements/1.1/"
+     xmlns:ese="http://www.europeana.eu/schemas/ese/">
+  <channel>
+    <title>Beeldbank Nationaal Archief</title>
+    <link>http://www.gahetna.nl/beeldbank-api/opensearch/</link>
+    <description>Zoekresultaten voor *:*</description>
+    <language>nl-nl</language>
+    <opensearch:totalResults>1000000</opensearch:totalResults>
+    <opensearch:startIndex>1</opensearch:startIndex>
+    <opensearch:itemsPerPage>%(items)s</opensearch:itemsPerPage>
+    <opensearch:Query role="request" searchTerms="*:*" startPage="1" />
+"""
+
+PAGE_ITEM = """    <item>
+      <title>Foto %(i)s</title>
+      <link>http://www.gahetna.nl/collectie/afbeeldingen/fotocollectie/%(i)s</link>
+      <guid>http://proxy.handle.net/10648/%(i)s</guid>
+      <description>Beschrijving van foto %(i)s</description>
+      <dc:identifier>%(i)s</dc:identifier>
+      <dc:date>1950-01-01</dc:date>
+      <dc:creator>Fotograaf onbekend</dc:creator>
+      <ese:isShownBy>http://example.org/thumb/800x600/%(i)s.jpg</ese:isShownBy>
+    </item>
+"""
+
+PAGE_FOOTER = """  </channel>
+</rss>
+"""
+
+
+def create_page(items):
+    return (PAGE_HEADER % {'items': items} +
+            ''.join(PAGE_ITEM % {'i': i} for i in range(items)) + PAGE_FOOTER)
+
+
+def deepcopy_items(tree):
+    """The way items used to be split off a page."""
+    itemless_tree = deepcopy(tree)
+    for item in itemless_tree.xpath('.//channel/item'):
+        item.getparent().remove(item)
+
+    for item in tree.xpath('.//channel/item'):
+        single_item_tree = deepcopy(itemless_tree)
+        single_item_tree.find('./channel').append(item)
+
+        yield etree.tostring(single_item_tree)
+
+
+def canonicalize(document):
+    return etree.tostring(etree.fromstring(document), method='c14n')
+
+
+def create_extractor(delay=1):
+    return OpensearchExtractor({
+        'id': 'benchmark',
+        'opensearch_url': 'http://example.org/opensearch',
+        'opensearch_query': '*:*',
+        'opensearch_delay': delay
+    })
+
+
+def benchmark_items(page, repeat):
+    extractor = create_extractor()
+    results = {}
+    for name, split in [('deepcopy', deepcopy_items),
+                        ('splice', extractor.serialize_items)]:
+        seconds = 0.0
+        for _ in xrange(repeat):
+            tree = etree.fromstring(page)
+            started = default_timer()
+            items = list(split(tree))
+            seconds += default_timer() - started
+
+        results[name] = (items, seconds / repeat)
+
+    return results
+
+
+class SimulatedEndpoint(object):
+    """An endpoint that takes ``latency`` seconds to respond, and rejects
+    requests that arrive within ``1 / capacity`` seconds of the previous
+    accepted request."""
+    def __init__(self, clock, latency, capacity):
+        self.clock = clock
+        self.latency = latency
+        self.min_interval = 1.0 / capacity
+        self.last_accepted = None
+        self.rejected = 0
+
+    def get(self, url, params=None):
+        now = self.clock[0]
+        self.clock[0] += self.latency
+
+        r = mock.Mock(status_code=200, headers={},
+                      content=create_page(0))
+        if self.last_accepted is not None and \
+                now - self.last_accepted < self.min_interval:
+            self.rejected += 1
+            r.status_code = 429
+            r.raise_for_status.side_effect = HTTPError('429')
+        else:
+            self.last_accepted = now
+
+        return r
+
+
+def simulate_paging(pages, latency, capacity, delay, adaptive):
+    """Returns the simulated number of seconds it takes to request
+    ``pages`` pages, the number of rejected requests and the number of
+    pages that were skipped because they were rejected."""
+    clock = [0.0]
+
+    def sleep(seconds):
+        clock[0] += seconds
+
+    endpoint = SimulatedEndpoint(clock, latency, capacity)
+    extractor = create_extractor(delay)
+    skipped = 0
+
+    with mock.patch('ocd_backend.utils.concurrency.time',
+                    lambda: clock[0]), \
+            mock.patch('ocd_backend.utils.concurrency.sleep', sleep), \
+            mock.patch('ocd_backend.utils.http.sleep', sleep), \
+            mock.patch.object(OpensearchExtractor, 'plain_http_session',
+                              endpoint):
+        for _ in xrange(pages):
+            try:
+                if adaptive:
+                    extractor.opensearch_call({'q': '*:*'})
+                else:
+                    # The previous behaviour: a fixed delay before each
+                    # page, and a single request
+                    sleep(delay)
+                    endpoint.get(extractor.url).raise_for_status()
+            except HTTPError:
+                skipped += 1
+
+    return clock[0], endpoint.rejected, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--items', type=int, default=100,
+                        help='number of items per page')
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--pages', type=int, default=100,
+                        help='number of pages of the simulated result set')
+    parser.add_argument('--latency', type=float, default=0.5,
+                        help='response time of the simulated endpoint')
+    parser.add_argument('--capacity', type=float, default=1.0,
+                        help='requests per second the simulated endpoint '
+                             'accepts')
+    parser.add_argument('--delay', type=float, default=2.0,
+                        help='fixed delay between requests (and maximal '
+                             'delay of the adaptive rate limiter)')
+    args = parser.parse_args()
+
+    page = create_page(args.items)
+    results = benchmark_items(page, args.repeat)
+
+    deepcopy_docs, deepcopy_seconds = results['deepcopy']
+    splice_docs, splice_seconds = results['splice']
+    assert map(canonicalize, deepcopy_docs) == map(canonicalize, splice_docs)
+
+    print 'Splitting a page of %d items (%d bytes)' % (args.items, len(page))
+    print
+    print '%-10s %12s %12s' % ('method', 'ms per page', 'us per item')
+    for name, seconds in [('deepcopy', deepcopy_seconds),
+                          ('splice', splice_seconds)]:
+        print '%-10s %12.2f %12.1f' % (name, seconds * 1e3,
+                                       seconds / args.items * 1e6)
+
+    print
+    print 'Paging through %d pages (latency %.2fs, capacity %.2f ' \
+          'requests/s, delay %.2fs)' % (args.pages, args.latency,
+                                        args.capacity, args.delay)
+    print
+    print '%-10s %12s %12s %12s' % ('pacing', 'seconds', 'rejected',
+                                    'skipped')
+    for name, adaptive in [('fixed', False), ('adaptive', True)]:
+        seconds, rejected, skipped = simulate_paging(
+            args.pages, args.latency, args.capacity, args.delay, adaptive)
+        print '%-10s %12.1f %12d %12d' % (name, seconds, rejected, skipped)
+
+
+if __name__ == '__main__':
+    main()
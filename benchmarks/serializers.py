@@ -0,0 +1,115 @@
+"""Compares the size of task messages, and the time it takes to encode and
+decode them, for each of the serializers of the pipeline.
+
+The messages are modelled after the first task of a chain: the raw items
+in the test dumps, with the run identifier as the only kwarg. The broker
+size is the size of the message as it is kept in Redis by kombu, which
+base64 encodes binary message bodies.
+
+Usage (from the root of the repository)::
+
+    python -m benchmarks.serializers [--dumps DIR] [--repeat N]
+"""
+from base64 import b64encode
+from glob import glob
+from timeit import default_timer
+import argparse
+import os
+import uuid
+
+from kombu.serialization import registry
+
+# Registers the serializers
+from ocd_backend import settings
+
+SERIALIZERS = ['ocd_serializer', 'ocd_zlib_serializer']
+
+DUMPS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'tests',
+                         'ocd_backend', 'test_dumps')
+
+CONTENT_TYPES = {
+    '.xml': 'application/xml',
+    '.json': 'application/json'
+}
+
+
+def load_messages(dumps_dir):
+    """Returns a task message for each XML and JSON file in ``dumps_dir``."""
+    messages = []
+    for path in sorted(glob(os.path.join(dumps_dir, '*'))):
+        content_type = CONTENT_TYPES.get(os.path.splitext(path)[1])
+        if not content_type:
+            continue
+
+        with open(path) as f:
+            raw_item = f.read()
+
+        messages.append({
+            'task': 'ocd_backend.transformers.BaseTransformer',
+            'id': str(uuid.uuid4()),
+            'args': [content_type, raw_item],
+            'kwargs': {'run_identifier': 'run_%s' % uuid.uuid4().hex},
+            'retries': 0,
+            'eta': None,
+            'expires': None,
+            'utc': True,
+            'callbacks': None,
+            'errbacks': None,
+            'timelimit': [None, None],
+            'taskset': None,
+            'chord': None
+        })
+
+    return messages
+
+
+def benchmark(name, messages, repeat):
+    encode = registry._encoders[name].encoder
+    decode = registry._decoders[registry.name_to_type[name]]
+
+    started = default_timer()
+    for _ in xrange(repeat):
+        payloads = [encode(message) for message in messages]
+    encode_seconds = (default_timer() - started) / repeat
+
+    started = default_timer()
+    for _ in xrange(repeat):
+        for payload in payloads:
+            decode(payload)
+    decode_seconds = (default_timer() - started) / repeat
+
+    return {
+        'payload_bytes': sum(len(p) for p in payloads),
+        'broker_bytes': sum(len(b64encode(p)) for p in payloads),
+        'encode_us': encode_seconds / len(messages) * 1e6,
+        'decode_us': decode_seconds / len(messages) * 1e6
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--dumps', default=DUMPS_DIR,
+                        help='directory with XML and JSON items')
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    messages = load_messages(args.dumps)
+    raw_bytes = sum(len(m['args'][1]) for m in messages)
+    print '%d messages, %d bytes of raw items (compression threshold: %d ' \
+          'bytes, level %d)' % (len(messages), raw_bytes,
+                                settings.TASK_COMPRESSION_THRESHOLD,
+                                settings.TASK_COMPRESSION_LEVEL)
+    print
+    print '%-22s %14s %14s %12s %12s' % ('serializer', 'payload bytes',
+                                         'broker bytes', 'encode us',
+                                         'decode us')
+
+    for name in SERIALIZERS:
+        result = benchmark(name, messages, args.repeat)
+        print '%-22s %14d %14d %12.1f %12.1f' % (
+            name, result['payload_bytes'], result['broker_bytes'],
+            result['encode_us'], result['decode_us'])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 from glob import glob
 import gzip
@@ -23,11 +23,17 @@ from elasticsearch import helpers as es_helpers
 from elasticsearch.exceptions import RequestError
 from werkzeug.serving import run_simple
 
+from ocd_backend import celery_app
 from ocd_backend.es import elasticsearch as es
 from ocd_backend.items import BaseItem
-from ocd_backend.pipeline import setup_pipeline
+from ocd_backend.exceptions import NotFound, RunInProgress
+from ocd_backend.metrics import (summarize_stage, stage_sort_key,
+                                 estimate_backlog)
+from ocd_backend.pipeline import (setup_pipeline, resume_pipeline,
+                                  replay_dead_letters, EXECUTORS)
 from ocd_backend.settings import (
-    SOURCES_CONFIG_FILE, DEFAULT_INDEX_PREFIX, COMBINED_INDEX)
+    SOURCES_CONFIG_FILE, DEFAULT_INDEX_PREFIX, COMBINED_INDEX,
+    METRICS_LATENCY_BUCKETS)
 from ocd_backend.utils.misc import load_sources_config
 from ocd_frontend.settings import DUMPS_DIR, API_URL, LOCAL_DUMPS_DIR
 from ocd_frontend.wsgi import application
@@ -391,14 +397,22 @@ def extract_list_sources(sources_config):
 @command('start')
 @click.option('--sources_config', default=SOURCES_CONFIG_FILE,
               type=click.File('rb'))
+@click.option('--incremental', is_flag=True, expose_value=True,
+              help='Only extract the items that changed since the last '
+                   'successful harvest, and update the current index')
+@click.option('--executor', default='celery', type=click.Choice(EXECUTORS),
+              help='Process the items with Celery workers (default), or in '
+                   'local processes')
 @click.argument('source_id')
-def extract_start(source_id, sources_config):
+def extract_start(source_id, sources_config, incremental, executor):
     """
     Start extraction for a pipeline specified by ``source_id`` defined in
     ``--sources-config``. ``--sources-config defaults to ``settings.SOURCES_CONFIG_FILE``.
 
     :param sources_config: Path to file containing pipeline definitions. Defaults to the value of ``settings.SOURCES_CONFIG_FILE``
     :param source_id: identifier used in ``--sources_config`` to describe pipeline
+    :param incremental: only extract the items that changed since the last successful harvest (currently supported by the OAI-PMH extractor)
+    :param executor: ``celery`` to process the items with Celery workers, or ``local`` to process them in local processes, without a broker
     """
     sources = load_sources_config(sources_config)
 
@@ -415,7 +429,99 @@ def extract_start(source_id, sources_config):
                    'config' % source_id)
         return
 
-    setup_pipeline(source)
+    setup_pipeline(source, incremental=incremental, executor=executor)
+
+
+@command('resume')
+@click.argument('run_identifier')
+def extract_resume(run_identifier):
+    """
+    Resume an interrupted extraction run, identified by ``run_identifier``
+    (for example ``pipeline_0f8fad5bd9cb469fa16570867728950e``). Items are
+    loaded into the same new index as the interrupted run. Extractors that
+    store checkpoints, such as the OAI-PMH extractor, continue after the
+    last completed page.
+
+    :param run_identifier: identifier of the run to resume
+    """
+    try:
+        resume_pipeline(run_identifier)
+    except NotFound as e:
+        click.secho('Error: unable to resume run: %s' % e, fg='red')
+
+
+@command('status')
+@click.argument('run_identifier')
+def extract_status(run_identifier):
+    """
+    Show the progress of an extraction run, identified by ``run_identifier``.
+    For each stage of the pipeline, the number of processed items, the
+    number of errors, the throughput (items per second) and the p50/p95
+    of the time it took to process an item are shown, followed by the
+    number of items that still have to be loaded and an estimate of the
+    time this takes.
+
+    :param run_identifier: identifier of the run
+    """
+    metrics = celery_app.backend.get_metrics(run_identifier)
+    if not metrics:
+        click.secho('Error: no metrics available for run "%s"'
+                    % run_identifier, fg='red')
+        return
+
+    click.secho('Run "%s" of source "%s": %s' % (
+        run_identifier, metrics['source'],
+        celery_app.backend.get(run_identifier) or 'unknown'), fg='green')
+
+    def format_seconds(seconds):
+        if seconds is None:
+            return '>%ss' % METRICS_LATENCY_BUCKETS[-1]
+        return '%.3fs' % seconds
+
+    row = '{:<32}{:>10}{:>8}{:>12}{:>10}{:>10}{:>10}'
+    click.echo(row.format('Stage', 'Items', 'Errors', 'Items/sec', 'Mean',
+                          'p50', 'p95'))
+    for stage in sorted(metrics['stages'], key=stage_sort_key):
+        stage_metrics = metrics['stages'][stage]
+        summary = summarize_stage(stage_metrics)
+        items_per_second = summary['items_per_second']
+
+        click.echo(row.format(
+            stage, stage_metrics['count'], stage_metrics['errors'],
+            '%.1f' % items_per_second if items_per_second else '-',
+            format_seconds(summary['mean']), format_seconds(summary['p50']),
+            format_seconds(summary['p95'])
+        ))
+
+    backlog, eta = estimate_backlog(metrics['stages'])
+    click.echo('Backlog: %s items (%s chains pending)'
+               % (backlog, celery_app.backend.get_pending(run_identifier)))
+    click.echo('ETA of the backlog: %s' % (
+        timedelta(seconds=int(eta)) if eta is not None else 'unknown'))
+    click.echo('Dead letters: %s'
+               % celery_app.backend.count_dead_letters(run_identifier))
+
+
+@command('replay')
+@click.argument('run_identifier')
+def extract_replay(run_identifier):
+    """
+    Replay the items that failed in an extraction run, identified by
+    ``run_identifier``, after the cause of the failures is fixed. Each
+    failed item is sent through the pipeline again, starting at the stage
+    that failed (the transformer, an enricher or the loader), in a new run
+    that loads the items into the current index of the source.
+
+    :param run_identifier: identifier of the run of which the failed items are replayed
+    """
+    try:
+        replay_run_identifier = replay_dead_letters(run_identifier)
+    except (NotFound, RunInProgress) as e:
+        click.secho('Error: unable to replay run: %s' % e, fg='red')
+        return
+
+    click.secho('Replaying the failed items of run "%s" in run "%s"'
+                % (run_identifier, replay_run_identifier), fg='green')
 
 
 @command('runserver')
@@ -622,12 +728,16 @@ def download_dumps(api_url, destination, collections, all_collections):
                                               'is name. If left empty, collecti'
                                               'on name will be derived from dum'
                                               'p name.', default=None)
-def load_dump(collection_dump, collection_name):
+@click.option('--executor', default='celery', type=click.Choice(EXECUTORS),
+              help='Process the items with Celery workers (default), or in '
+                   'local processes')
+def load_dump(collection_dump, collection_name, executor):
     """
     Restore an index from a dump file.
 
     :param collection_dump: Path to a local gzipped dump to load.
     :param collection_name: Name for the local index to restore the dump to. Optional; will be derived from the dump name, at your own risk. Note that the pipeline will add a "ocd_" prefix string to the collection name, to ensure the proper mapping and settings are applied.
+    :param executor: ``celery`` to process the items with Celery workers, or ``local`` to process them in local processes, without a broker
     """
     available_dumps = glob(os.path.join(LOCAL_DUMPS_DIR, '*/*.gz'))
     if not collection_dump:
@@ -666,11 +776,14 @@ def load_dump(collection_dump, collection_name):
 
     click.secho(str(source_definition), fg='yellow')
 
-    setup_pipeline(source_definition)
+    setup_pipeline(source_definition, executor=executor)
 
-    click.secho('Queued items from {}. Please make sure your Celery workers'
-                ' are running, so the loaded items are processed.'.format(collection),
-                fg='green')
+    if executor == 'local':
+        click.secho('Loaded items from {}.'.format(collection), fg='green')
+    else:
+        click.secho('Queued items from {}. Please make sure your Celery workers'
+                    ' are running, so the loaded items are processed.'.format(collection),
+                    fg='green')
 
 
 # Register commands explicitly with groups, so we can easily use the docstring
@@ -690,6 +803,9 @@ elasticsearch.add_command(available_indices)
 
 extract.add_command(extract_list_sources)
 extract.add_command(extract_start)
+extract.add_command(extract_resume)
+extract.add_command(extract_status)
+extract.add_command(extract_replay)
 
 qa.add_command(qa_matrix)
 
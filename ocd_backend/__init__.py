@@ -1,6 +1,8 @@
+import os
+
 from celery import Celery
 
-from ocd_backend.settings import CELERY_CONFIG
+from ocd_backend.settings import CELERY_CONFIG, CELERY_STAGE_CONFIG
 
 celery_app = Celery('ocd_backend', include=[
     'ocd_backend.extractors',
@@ -11,3 +13,9 @@ celery_app = Celery('ocd_backend', include=[
 ])
 
 celery_app.conf.update(**CELERY_CONFIG)
+
+# Workers that consume the queue of a single stage of the pipeline use the
+# concurrency and prefetch settings of that stage
+worker_stage = os.environ.get('OCD_WORKER_STAGE')
+if worker_stage:
+    celery_app.conf.update(**CELERY_STAGE_CONFIG[worker_stage])
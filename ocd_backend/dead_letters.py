@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from ocd_backend import celery_app
+from ocd_backend.spool import ItemSpool, SPOOLED_ITEM_CONTENT_TYPE
+
+#: The stages at which failed items can re-enter the pipeline. Items that
+#: failed in the transformer (or in a fused task) are stored as raw
+#: ``(content-type, data)`` tuples, items that failed in an enricher or
+#: the loader as transformed ``(object_id, combined_index_doc, doc)``
+#: tuples.
+RAW_ITEM_STAGES = ('transformer', 'fused')
+STAGES = RAW_ITEM_STAGES + ('enricher', 'loader')
+
+
+def record_dead_letters(run_identifier, source_id, stage, items, exc,
+                        traceback, enricher_index=None):
+    """Stores items that failed to be processed in the dead letters of
+    a run, so they can be replayed (see
+    :func:`~ocd_backend.pipeline.replay_dead_letters`) once the cause of
+    the failure is fixed.
+
+    :param run_identifier: the identifier of the run.
+    :param source_id: the identifier of the source of the run.
+    :param stage: the stage (one of ``STAGES``) that failed.
+    :param items: the items the stage failed to process.
+    :param exc: the exception that was raised.
+    :param traceback: the formatted traceback of the exception.
+    :param enricher_index: the index of the settings of the failed
+        enricher in the source definition.
+    """
+    if not run_identifier or not items:
+        return
+
+    if stage in RAW_ITEM_STAGES:
+        # The spool of a run is removed when the run is finished, so the
+        # raw data of spooled items is stored instead
+        spool = ItemSpool(run_identifier)
+        items = [spool.get(item[1])
+                 if item[0] == SPOOLED_ITEM_CONTENT_TYPE else item
+                 for item in items]
+
+    failed_at = datetime.utcnow()
+    celery_app.backend.add_dead_letters(run_identifier, [{
+        'run_identifier': run_identifier,
+        'source_id': source_id,
+        'stage': stage,
+        'enricher_index': enricher_index,
+        'item': item,
+        'exception': '%s: %s' % (exc.__class__.__name__, exc),
+        'traceback': traceback,
+        'failed_at': failed_at
+    } for item in items])
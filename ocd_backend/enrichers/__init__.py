@@ -2,19 +2,30 @@ from ocd_backend import celery_app
 from ocd_backend import settings
 from ocd_backend.exceptions import SkipEnrichment
 from ocd_backend.log import get_source_logger
+from ocd_backend.mixins import OCDBackendBatchMixin, OCDBackendMetricsMixin
+from ocd_backend.run_context import expand_task_kwargs
 
 log = get_source_logger('enricher')
 
 
-class BaseEnricher(celery_app.Task):
+class BaseEnricher(OCDBackendBatchMixin, OCDBackendMetricsMixin,
+                   celery_app.Task):
     """The base class that enrichers should inherit."""
+    dead_letter_stage = 'enricher'
+
+    def get_metrics_stage(self):
+        return 'enricher.%s' % self.__class__.__name__
 
     def run(self, *args, **kwargs):
         """Start enrichment of a single item.
 
         This method is called by the transformer or by another enricher
         and expects args to contain a transformed (and possibly enriched)
-        item. Kwargs should contain the ``source_definition`` dict.
+        item. Kwargs should contain the ``source_definition`` dict and the
+        ``enricher_settings``, or the ``run_identifier`` of a run of which
+        the context is stored and the ``enricher_index`` of the settings
+        of the enricher in the source definition (see
+        :func:`~ocd_backend.run_context.expand_task_kwargs`).
 
         :param item: The item tuple as returned by a transformer or by
             a previously runned enricher.
@@ -24,13 +35,30 @@ class BaseEnricher(celery_app.Task):
         :param enricher_settings: The settings for the requested enricher,
             as provided in the source definition.
         :type enricher_settings: dict.
-        :returns: the output of :py:meth:`~BaseEnricher.enrich_item`
+        :param batch: when ``True``, the first argument is a list of
+            item tuples instead of a single item tuple.
+        :type batch: bool.
+        :returns: the output of :py:meth:`~BaseEnricher.enrich_item`,
+            or a list of those outputs when a batch is enriched.
         """
-
+        kwargs = expand_task_kwargs(kwargs)
         self.source_definition = kwargs['source_definition']
         self.enricher_settings = kwargs['enricher_settings']
 
-        object_id, combined_index_doc, doc = args[0]
+        enrich = self.measured(self.enrich)
+        try:
+            if kwargs.get('batch'):
+                return self.run_batch(args[0], enrich, **kwargs)
+
+            return enrich(args[0])
+        finally:
+            self.flush_metrics(**kwargs)
+
+    def enrich(self, item):
+        """Enrich a single item tuple and return the (enriched) item
+        tuple. Errors raised by :py:meth:`~BaseEnricher.enrich_item` are
+        logged, and result in the item being returned unmodified."""
+        object_id, combined_index_doc, doc = item
         try:
             enrichments = self.enrich_item(
                 doc['enrichments'],
@@ -2,14 +2,11 @@ from copy import deepcopy
 import os
 from tempfile import SpooledTemporaryFile
 
-from requests import Session
-from requests.packages.urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
-
-from ocd_backend.settings import TEMP_DIR_PATH, USER_AGENT
+from ocd_backend.settings import TEMP_DIR_PATH
 from ocd_backend.enrichers import BaseEnricher
 from ocd_backend.exceptions import SkipEnrichment, UnsupportedContentType
 from ocd_backend.log import get_source_logger
+from ocd_backend.registry import registry
 
 from .tasks import ImageMetadata, MediaType
 
@@ -34,24 +31,16 @@ class MediaEnricher(BaseEnricher):
         'media_type': MediaType
     }
 
-    http_session = None
-
-    def setup_http_session(self):
-        if self.http_session:
-            self.http_session.close()
-
-        self.http_session = Session()
-        self.http_session.headers['User-Agent'] = USER_AGENT
-
-        http_retry = Retry(total=5, status_forcelist=[500, 503],
-                           backoff_factor=.5)
-        http_adapter = HTTPAdapter(max_retries=http_retry)
-        self.http_session.mount('http://', http_adapter)
-
-        http_retry = Retry(total=5, status_forcelist=[500, 503],
-                           backoff_factor=.5)
-        http_adapter = HTTPAdapter(max_retries=http_retry)
-        self.http_session.mount('https://', http_adapter)
+    @property
+    def http_session(self):
+        """The HTTP session of the source, which is kept (with its pool of
+        keep-alive connections) in the registry of the worker. The size of
+        the pool can be set with the ``http_pool_maxsize`` setting of the
+        enricher."""
+        return registry.get_http_session(
+            self.source_definition['id'],
+            pool_maxsize=self.enricher_settings.get('http_pool_maxsize')
+        )
 
     def fetch_media(self, url, partial_fetch=False):
         """Retrieves a given media object from a remote (HTTP) location
@@ -134,8 +123,6 @@ class MediaEnricher(BaseEnricher):
         if not doc.get('media_urls', []):
             raise SkipEnrichment('No "media_urls" in document.')
 
-        self.setup_http_session()
-
         # Check the settings to see if media should by fetch partially
         partial_fetch = self.enricher_settings.get('partial_media_fetch', False)
 
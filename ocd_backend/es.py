@@ -7,3 +7,20 @@ def setup_elasticsearch(host=ELASTICSEARCH_HOST, port=ELASTICSEARCH_PORT):
     return Elasticsearch([{'host': host, 'port': port}])
 
 elasticsearch = setup_elasticsearch()
+
+
+#: The values Elasticsearch uses for index settings that aren't set
+DEFAULT_INDEX_SETTINGS = {
+    'refresh_interval': '1s'
+}
+
+
+def get_index_settings(es, index_name, keys):
+    """Returns a dict with the values of the settings ``keys`` of an
+    index. Settings that aren't set for the index get the default value
+    of Elasticsearch."""
+    index_settings = es.indices.get_settings(
+        index=index_name)[index_name]['settings']['index']
+
+    return dict((key, index_settings.get(key, DEFAULT_INDEX_SETTINGS.get(key)))
+                for key in keys)
@@ -33,3 +33,24 @@ class SkipEnrichment(Exception):
 class UnsupportedContentType(Exception):
     """Exception thrown when a media enrichemnt task is asked to process
     media content that is doesn't understand."""
+
+
+class RunInProgress(Exception):
+    """Thrown when an operation requires a run of the pipeline to be
+    finished, while it is still running."""
+
+
+class BulkDocumentError(Exception):
+    """Indicates that Elasticsearch rejected a document of a bulk
+    request."""
+
+
+class RunStalled(Exception):
+    """Thrown when the workers don't process the pending chains of a run
+    within the expected time, or when the run failed while the extractor
+    was waiting for them."""
+
+
+class WorkerLost(Exception):
+    """Thrown when a worker process of a local run exits before it
+    processed all of its batches."""
@@ -1,23 +1,81 @@
-import requests
-from requests.packages.urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
-
-from ocd_backend.settings import USER_AGENT
+from ocd_backend import celery_app
+from ocd_backend.settings import PIPELINE_RUN_STATE_TTL
 from ocd_backend.log import get_source_logger
+from ocd_backend.registry import registry
 
 log = get_source_logger('extractor')
 
+#: The content-type of items that represent a record that was deleted at
+#: the source; the data of such an item is the original object id
+DELETED_ITEM_CONTENT_TYPE = 'application/x-ocd-deleted'
+
+
+def checkpoint_key(run_identifier):
+    """Returns the key under which the checkpoint of a run is stored."""
+    return '{}_checkpoint'.format(run_identifier)
+
+
+def last_harvest_key(source_id):
+    """Returns the key under which the datestamp of the last successful
+    harvest of a source is stored."""
+    return '{}_last_harvest'.format(source_id)
+
 
 class BaseExtractor(object):
     """The base class that other extractors should inherit."""
 
-    def __init__(self, source_definition):
+    #: Whether the extractor is able to only extract the items that changed
+    #: since the last successful harvest
+    supports_incremental = False
+
+    def __init__(self, source_definition, run_identifier=None,
+                 incremental=False):
         """
         :param source_definition: The configuration of a single source in
             the form of a dictionary (as defined in the settings).
         :type source_definition: dict.
+        :param run_identifier: The identifier of the pipeline run the
+            extractor is used in. When provided, the extractor can store
+            checkpoints that allow resuming an interrupted run.
+        :type run_identifier: str.
+        :param incremental: Only extract the items that changed since the
+            last successful harvest (if the extractor supports it).
+        :type incremental: bool.
         """
         self.source_definition = source_definition
+        self.run_identifier = run_identifier
+        self.incremental = incremental and self.supports_incremental
+
+    def get_last_harvest_datestamp(self):
+        """Returns the datestamp of the last successful harvest of the
+        source, or ``None`` if the source was never harvested."""
+        return celery_app.backend.get_json(
+            last_harvest_key(self.source_definition['id']))
+
+    def get_checkpoint(self):
+        """Returns the last checkpoint stored by the extractor in the
+        current run, or ``None`` if there is no checkpoint.
+
+        :rtype: dict or None.
+        """
+        if not self.run_identifier:
+            return None
+
+        return celery_app.backend.get_json(checkpoint_key(self.run_identifier))
+
+    def save_checkpoint(self, checkpoint):
+        """Stores the state of the extractor in the result backend, so
+        the run can be resumed from this point. Does nothing when the
+        extractor is not used in a pipeline run.
+
+        :param checkpoint: JSON serializable state of the extractor.
+        :type checkpoint: dict.
+        """
+        if not self.run_identifier:
+            return
+
+        celery_app.backend.set_json(checkpoint_key(self.run_identifier),
+                                    checkpoint, ttl=PIPELINE_RUN_STATE_TTL)
 
     def run(self):
         """Starts the extraction process.
@@ -31,6 +89,15 @@ class BaseExtractor(object):
           ``application/json``)
         - the data in it's original format, as retrieved from the source
           (as a string)
+
+        In incremental mode, records that were deleted at the source are
+        yielded with :data:`DELETED_ITEM_CONTENT_TYPE` as content-type and
+        the original object id as data.
+
+        Extractors that support incremental harvesting should store the
+        datestamp from which the next incremental harvest should start as
+        ``harvest_datestamp`` in their checkpoint. It is stored as the
+        datestamp of the last harvest once the run has finished.
         """
         raise NotImplementedError
 
@@ -44,23 +111,16 @@ class HttpRequestMixin(object):
 
     @property
     def http_session(self):
-        """Returns a :class:`requests.Session` object. A new session is
-        created if it doesn't already exist."""
-        http_session = getattr(self, '_http_session', None)
-        if not http_session:
-            session = requests.Session()
-            session.headers['User-Agent'] = USER_AGENT
-
-            http_retry = Retry(total=5, status_forcelist=[500, 503],
-                               backoff_factor=.5)
-            http_adapter = HTTPAdapter(max_retries=http_retry)
-            session.mount('http://', http_adapter)
-
-            http_retry = Retry(total=5, status_forcelist=[500, 503],
-                               backoff_factor=.5)
-            http_adapter = HTTPAdapter(max_retries=http_retry)
-            session.mount('https://', http_adapter)
-
-            self._http_session = session
-
-        return self._http_session
+        """Returns the :class:`requests.Session` of the source. The session
+        is kept in the registry of the process, so it is shared by all
+        extractors and items of the same source."""
+        return registry.get_http_session(self.source_definition['id'])
+
+    @property
+    def plain_http_session(self):
+        """Returns a :class:`requests.Session` of the source that doesn't
+        retry requests itself. Use it with
+        :func:`~ocd_backend.utils.http.get_with_retries`, which handles
+        the retries (and the ``Retry-After`` headers of the responses)."""
+        return registry.get_http_session(self.source_definition['id'],
+                                         adapter_retries=False)
@@ -2,6 +2,8 @@ from lxml import etree
 
 from ocd_backend.extractors import BaseExtractor, HttpRequestMixin
 from ocd_backend.extractors import log
+from ocd_backend.utils.concurrency import bounded_imap
+from ocd_backend.utils.http import get_with_retries
 
 
 class AdlibExtractor(BaseExtractor, HttpRequestMixin):
@@ -26,12 +28,17 @@ class AdlibExtractor(BaseExtractor, HttpRequestMixin):
         if 'adlib_per_page_limit' in self.source_definition:
             self.per_page_limit = self.source_definition['adlib_per_page_limit']
 
+        # The number of pages that are fetched concurrently
+        self.concurrency = self.source_definition.get('adlib_concurrency', 1)
+
         self.adlib_base_url = self.source_definition['adlib_base_url']
         self.adlib_database = self.source_definition['adlib_database']
 
     def adlib_search_call(self, params={}):
         """Makes a call to the Adlib endpoint and returns the response
-        as a string.
+        as a string. Calls that fail to connect, or that get a 429 or 5xx
+        response, are retried ``settings.HTTP_RETRIES`` times (see
+        :func:`~ocd_backend.utils.http.get_with_retries`).
 
         :type params: dict
         :param params: a dictonary sent as arguments in the query string
@@ -48,15 +55,20 @@ class AdlibExtractor(BaseExtractor, HttpRequestMixin):
         default_params.update(params)
 
         log.debug('Getting %s (params: %s)' % (self.adlib_base_url, default_params))
-        r = self.http_session.get(
+        r = get_with_retries(
+            self.plain_http_session,
             self.adlib_base_url,
             params=default_params
         )
-        r.raise_for_status()
 
         return etree.fromstring(r.content)
 
     def get_all_records(self):
+        if self.concurrency > 1:
+            for record in self.get_all_records_concurrently():
+                yield record
+            return
+
         total_hits = 0
         processed_items = 0
         start_from = 1
@@ -76,6 +88,44 @@ class AdlibExtractor(BaseExtractor, HttpRequestMixin):
             if processed_items == total_hits:
                 break
 
+    def get_all_records_concurrently(self):
+        """Retrieves all records, while up to ``adlib_concurrency`` pages
+        are fetched at the same time. The offsets of all pages are known
+        once the number of hits is read from the first page; the records
+        are yielded in the order of the pages.
+
+        A request that fails is retried on its own (see
+        :meth:`adlib_search_call`)."""
+        tree = self.adlib_search_call(params={'startfrom': 1})
+        total_hits = int(tree.find('.//diagnostic/hits').text)
+
+        for record in self.get_records(tree):
+            yield record
+
+        offsets = xrange(1 + self.per_page_limit, total_hits + 1,
+                         self.per_page_limit)
+        for records in bounded_imap(self.get_page, offsets, self.concurrency):
+            for record in records:
+                yield record
+
+    def get_page(self, start_from):
+        """Returns the records of the page that starts at ``start_from``.
+        When the page can't be retrieved, the error is raised, which fails
+        the run (instead of completing it without the records of the
+        page)."""
+        try:
+            tree = self.adlib_search_call(params={'startfrom': start_from})
+        except Exception:
+            log.error('Unable to retrieve the page starting at record %s'
+                      % start_from)
+            raise
+
+        return self.get_records(tree)
+
+    def get_records(self, tree):
+        return [('application/xml', etree.tostring(record))
+                for record in tree.xpath('.//recordList//record')]
+
     def run(self):
         for record in self.get_all_records():
             yield record
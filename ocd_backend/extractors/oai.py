@@ -1,13 +1,19 @@
 from lxml import etree
 
-from ocd_backend.extractors import BaseExtractor, HttpRequestMixin
+from ocd_backend.extractors import (BaseExtractor, HttpRequestMixin,
+                                    DELETED_ITEM_CONTENT_TYPE)
 from ocd_backend.extractors import log
+from ocd_backend.utils.concurrency import read_ahead
+from ocd_backend.utils.streams import CleanUTF8Reader
 
 
 class OaiExtractor(BaseExtractor, HttpRequestMixin):
     metadata_prefix = 'oai_dc'
     oai_set = ''
     namespaces = {'oai': 'http://www.openarchives.org/OAI/2.0/'}
+    supports_incremental = True
+    #: The granularity of the datestamps supported by the repository
+    datestamp_granularity = 'YYYY-MM-DDThh:mm:ssZ'
 
     def __init__(self, *args, **kwargs):
         super(OaiExtractor, self).__init__(*args, **kwargs)
@@ -20,8 +26,24 @@ class OaiExtractor(BaseExtractor, HttpRequestMixin):
         if 'oai_set' in self.source_definition:
             self.oai_set = self.source_definition['oai_set']
 
+        # Repositories that only support datestamps with a granularity of
+        # a day should set this to 'YYYY-MM-DD'
+        if 'oai_datestamp_granularity' in self.source_definition:
+            self.datestamp_granularity = \
+                self.source_definition['oai_datestamp_granularity']
+
         self.oai_base_url = self.source_definition['oai_base_url']
 
+        # The number of pages that are fetched and parsed by a background
+        # thread, while the records of the current page are processed;
+        # 0 (the default) fetches each page when it is needed
+        self.prefetch_pages = self.source_definition.get('oai_prefetch_pages',
+                                                         0)
+
+        # Parse responses while they are downloaded, instead of building
+        # a tree of each complete response
+        self.streaming = self.source_definition.get('oai_streaming', False)
+
     def oai_call(self, params={}):
         """Makes a call to the OAI endpoint and returns the response as
         a string.
@@ -29,22 +51,38 @@ class OaiExtractor(BaseExtractor, HttpRequestMixin):
         :type params: dict
         :param params: a dictionary sent as arguments in the query string
         """
+        return self.oai_request(params).content
+
+    def oai_stream(self, params={}):
+        """Makes a call to the OAI endpoint and returns the response as
+        a file-like object, which is read while the response is downloaded.
+
+        :type params: dict
+        :param params: a dictionary sent as arguments in the query string
+        """
+        r = self.oai_request(params, stream=True)
+        r.raw.decode_content = True
+
+        return r.raw
+
+    def oai_request(self, params, stream=False):
         # Add the set variable to the parameters (if available)
         if self.oai_set:
             params['set'] = self.oai_set
 
-        # Remove set and metadataPrefix, when a resumptionToken is present
+        # Remove set, metadataPrefix and from, when a resumptionToken is
+        # present
         if 'resumptionToken' in params:
-            if 'set' in params:
-                del params['set']
-            if 'metadataPrefix' in params:
-                del params['metadataPrefix']
+            for param in ['set', 'metadataPrefix', 'from']:
+                if param in params:
+                    del params[param]
 
         log.debug('Getting %s (params: %s)' % (self.oai_base_url, params))
-        r = self.http_session.get(self.oai_base_url, params=params)
+        r = self.http_session.get(self.oai_base_url, params=params,
+                                  stream=stream)
         r.raise_for_status()
 
-        return r.content
+        return r
 
     def parse_oai_response(self, content):
         """Parses an OAI XML response and returns an XML tree.
@@ -68,47 +106,187 @@ class OaiExtractor(BaseExtractor, HttpRequestMixin):
     def get_all_records(self):
         """Retrieves all available OAI records.
 
+        After all records of a page are yielded, the paging state (the
+        resumption token of the next page, and the number of pages and
+        records processed so far) is stored as a checkpoint. When the
+        run is resumed, harvesting continues with the page that follows
+        the last completed page.
+
+        In incremental mode, only the records that changed since the last
+        successful harvest are requested (using the ``from`` argument),
+        and deleted records are yielded as well (see
+        :meth:`~ocd_backend.extractors.BaseExtractor.run`). The
+        ``responseDate`` of the first page is stored in the checkpoint,
+        and serves as the starting point of the next incremental harvest.
+
+        Sources that set ``oai_prefetch_pages`` have the next pages fetched
+        and parsed by a background thread (see
+        :func:`~ocd_backend.utils.concurrency.read_ahead`), while the
+        records of the current page are processed.
+
         :returns: a generator that yields a tuple for each record,
             a tuple consists of the content-type and the content as a string.
         """
-        resumption_token = None
+        checkpoint = self.get_checkpoint() or {}
+        resumption_token = checkpoint.get('resumption_token')
+        pages = checkpoint.get('pages', 0)
+        records_yielded = checkpoint.get('records', 0)
+        harvest_datestamp = checkpoint.get('harvest_datestamp')
+
+        from_datestamp = None
+        if self.incremental:
+            from_datestamp = self.get_last_harvest_datestamp()
+            if self.datestamp_granularity == 'YYYY-MM-DD' and from_datestamp:
+                from_datestamp = from_datestamp[:10]
+
+            log.info('Harvesting records changed since %s' % from_datestamp)
+
+        if checkpoint.get('completed'):
+            log.info('All %s pages (%s records) were already harvested in '
+                     'this run' % (pages, records_yielded))
+            return
+
+        if resumption_token:
+            log.info('Resuming harvest after page %s (%s records), '
+                     'resumptionToken: %s' % (pages, records_yielded,
+                                              resumption_token))
+
+        pages_iter = self.get_pages(resumption_token, from_datestamp)
+        if self.prefetch_pages:
+            # The records of a page are retrieved by the background thread
+            # as well, as the resumption token of a streamed page is only
+            # known after its last record
+            pages_iter = read_ahead(((list(records), page) for records, page
+                                     in pages_iter), self.prefetch_pages)
+
+        for records, page in pages_iter:
+            for content_type, record in records:
+                if content_type == DELETED_ITEM_CONTENT_TYPE and \
+                        not self.incremental:
+                    log.debug('Header specifies that the record is '
+                              'deleted, skipping.')
+                    continue
+
+                records_yielded += 1
+                yield content_type, record
+
+            if not harvest_datestamp:
+                harvest_datestamp = page['response_date']
+
+            resumption_token = page['resumption_token']
+            pages += 1
+            self.save_checkpoint({
+                'resumption_token': resumption_token,
+                'pages': pages,
+                'records': records_yielded,
+                'completed': not resumption_token,
+                'harvest_datestamp': harvest_datestamp
+            })
+
+    def get_pages(self, resumption_token=None, from_datestamp=None):
+        """Retrieves the pages of the list of records, starting with the
+        page of ``resumption_token`` (or the first page).
+
+        :returns: a generator that yields a tuple for each page, consisting
+            of an iterator over the records of the page (see
+            :meth:`parse_record`) and a dict with the ``response_date`` of
+            the page and the ``resumption_token`` of the next page
+            (``None`` for the last page). The dict is complete once all
+            records of the page are retrieved.
+        """
         while True:
             req_params = {'verb': 'ListRecords'}
             if resumption_token:
                 req_params['resumptionToken'] = resumption_token
+            elif from_datestamp:
+                req_params['from'] = from_datestamp
 
             req_params['metadataPrefix'] = self.metadata_prefix
 
-            resp = self.oai_call(req_params)
-            tree = self.parse_oai_response(resp)
-
-            records = tree.xpath('.//oai:ListRecords/oai:record',
-                                 namespaces=self.namespaces)
-            for record in records:
-                # check if the record was deleted
-                header = record.find('oai:header[@status="deleted"]',
-                                     namespaces=self.namespaces)
-                if header is not None:
-                    log.debug('Header specifies that the record is deleted, skipping.')
-                    continue
-
-                yield 'application/xml', etree.tostring(record)
-
+            page = {'response_date': None, 'resumption_token': None}
+            if self.streaming:
+                records = self.stream_records(self.oai_stream(req_params),
+                                              page)
+            else:
+                records = self.tree_records(
+                    self.parse_oai_response(self.oai_call(req_params)), page)
 
-            # According to the OAI spec, we reached the last page of the
-            # list if the 'resumptionToken' element is empty. Some OAI
-            # implementations completely drop the 'resumptionToken'
-            # element on the last
-            try:
-                resumption_token = tree.find('.//oai:resumptionToken',
-                                             namespaces=self.namespaces).text
-            except AttributeError:
-                resumption_token = None
+            yield records, page
 
+            resumption_token = page['resumption_token']
             if not resumption_token:
                 log.debug('resumptionToken empty, done fetching list')
                 break
 
+    def tree_records(self, tree, page):
+        """Returns an iterator over the records of a parsed page, and
+        completes the ``page`` dict (see :meth:`get_pages`)."""
+        page['response_date'] = tree.findtext('.//oai:responseDate',
+                                              namespaces=self.namespaces)
+
+        # According to the OAI spec, we reached the last page of the
+        # list if the 'resumptionToken' element is empty. Some OAI
+        # implementations completely drop the 'resumptionToken'
+        # element on the last
+        page['resumption_token'] = tree.findtext('.//oai:resumptionToken',
+                                                 namespaces=self.namespaces)\
+            or None
+
+        records = tree.xpath('.//oai:ListRecords/oai:record',
+                             namespaces=self.namespaces)
+
+        return (self.parse_record(record) for record in records)
+
+    def stream_records(self, stream, page):
+        """Parses a page while it is read from ``stream``, and yields each
+        record as soon as it is complete. Records are removed from the tree
+        once they are yielded, so only a single record is kept in memory.
+        Like :meth:`parse_oai_response`, invalid UTF-8 and form feeds are
+        replaced while reading. The ``page`` dict (see :meth:`get_pages`)
+        is completed once all records are yielded.
+
+        Unlike the records of a parsed page, streamed records don't include
+        the whitespace that follows them."""
+        oai_ns = '{%s}' % self.namespaces['oai']
+        record_tag = oai_ns + 'record'
+        response_date_tag = oai_ns + 'responseDate'
+        resumption_token_tag = oai_ns + 'resumptionToken'
+
+        reader = CleanUTF8Reader(stream)
+        try:
+            elements = etree.iterparse(reader, events=('end',), recover=True,
+                                       encoding='utf-8',
+                                       tag=(record_tag, response_date_tag,
+                                            resumption_token_tag))
+            for _, element in elements:
+                if element.tag == record_tag:
+                    yield self.parse_record(element, with_tail=False)
+
+                    # Remove the record, and the records that preceded it
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+                elif element.tag == response_date_tag:
+                    page['response_date'] = element.text
+                else:
+                    page['resumption_token'] = element.text or None
+        finally:
+            reader.close()
+
+    def parse_record(self, record, with_tail=True):
+        """Returns the ``(content-type, data)`` tuple of a record; the
+        identifier of a deleted record is returned with the
+        ``DELETED_ITEM_CONTENT_TYPE``."""
+        # check if the record was deleted
+        header = record.find('oai:header[@status="deleted"]',
+                             namespaces=self.namespaces)
+        if header is not None:
+            return (DELETED_ITEM_CONTENT_TYPE,
+                    header.findtext('oai:identifier',
+                                    namespaces=self.namespaces))
+
+        return 'application/xml', etree.tostring(record, with_tail=with_tail)
+
     def run(self):
         for record in self.get_all_records():
             yield record
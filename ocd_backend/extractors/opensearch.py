@@ -1,11 +1,13 @@
-from copy import deepcopy
-from time import sleep
-
 from lxml import etree
 import requests
 
 from ocd_backend.extractors import BaseExtractor, HttpRequestMixin
 from ocd_backend.extractors import log
+from ocd_backend.utils.concurrency import AdaptiveRateLimiter
+from ocd_backend.utils.http import get_with_retries
+
+# The comment that marks the position of the items in the serialized channel
+ITEM_MARKER = 'ocd-opensearch-item'
 
 
 class OpensearchExtractor(BaseExtractor, HttpRequestMixin):
@@ -22,8 +24,19 @@ class OpensearchExtractor(BaseExtractor, HttpRequestMixin):
         if 'opensearch_per_page_count' in self.source_definition:
             self.per_page_count = self.source_definition['opensearch_per_page_count']
 
+        # Requests are made without delay, until the endpoint responds with
+        # a 429 or 5xx status; the delay is then increased up to
+        # 'opensearch_delay' seconds, and decreased again after successful
+        # requests. Rejected requests are retried after the delay.
+        self.rate_limiter = AdaptiveRateLimiter(
+            min_interval=self.source_definition.get('opensearch_min_delay', 0),
+            max_interval=self.source_definition.get('opensearch_delay', 1)
+        )
+
     def opensearch_call(self, params={}):
         """Makes a call to the Opensearch endpoint and returns an XML tree.
+        Calls that are rejected with a 429 or 5xx status are retried
+        ``settings.HTTP_RETRIES`` times, paced by the rate limiter.
 
         :type params: dict
         :param params: a dictonary sent as arguments in the query string
@@ -32,11 +45,35 @@ class OpensearchExtractor(BaseExtractor, HttpRequestMixin):
 
         log.debug('Getting %s (params: %s)' % (self.url, params))
 
-        r = self.http_session.get(self.url, params=params)
-        r.raise_for_status()
+        # The adaptive rate limiter sets the time between retries
+        r = get_with_retries(self.plain_http_session, self.url,
+                             rate_limiter=self.rate_limiter, backoff=0,
+                             params=params)
 
         return etree.fromstring(r.content)
 
+    def serialize_items(self, tree):
+        """Yields each item of a page as a separate document, that consists
+        of the channel of the page with only that item.
+
+        The channel (without items) is serialized once, and each serialized
+        item is inserted at the position of the items.
+
+        :param tree: the XML tree of a page; its items are removed.
+        """
+        channel = tree.find('./channel')
+        items = tree.xpath('.//channel/item')
+        for item in items:
+            item.getparent().remove(item)
+
+        marker = etree.Comment(ITEM_MARKER)
+        channel.append(marker)
+        head, _, tail = etree.tostring(tree).rpartition(
+            etree.tostring(marker))
+
+        for item in items:
+            yield head + etree.tostring(item) + tail
+
     def get_all_results(self):
         """Retrieves all available items in a result set.
 
@@ -51,11 +88,8 @@ class OpensearchExtractor(BaseExtractor, HttpRequestMixin):
         total_results = int(resp.find('.//channel/opensearch:totalResults',
                                       namespaces=resp.nsmap).text)
         start_index = 1
-        page_delay = self.source_definition.get('opensearch_delay', 1)
 
         while start_index <= total_results:
-            sleep(page_delay)
-
             log.info('Getting results for %s from %s' % (
                 self.query, start_index,))
 
@@ -76,17 +110,8 @@ class OpensearchExtractor(BaseExtractor, HttpRequestMixin):
                 start_index += self.per_page_count
                 continue
 
-            # Create a copy of the tree without any items
-            itemless_tree = deepcopy(resp)
-            for item in itemless_tree.xpath('.//channel/item'):
-                item.getparent().remove(item)
-
-            # Construct a tree that only includes the item we are iterating over
-            for item in resp.xpath('.//channel/item'):
-                single_item_tree = deepcopy(itemless_tree)
-                single_item_tree.find('./channel').append(item)
-
-                yield 'application/xml', etree.tostring(single_item_tree)
+            for item in self.serialize_items(resp):
+                yield 'application/xml', item
 
             start_index += self.per_page_count
 
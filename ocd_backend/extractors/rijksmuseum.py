@@ -4,20 +4,34 @@ import json
 from ocd_backend.extractors import BaseExtractor, HttpRequestMixin
 from ocd_backend.extractors import log
 from ocd_backend.exceptions import NotFound
+from ocd_backend.utils.concurrency import bounded_imap, RateLimiter
+from ocd_backend.utils.http import get_with_retries
 
 
 class RijksmuseumExtractor(BaseExtractor, HttpRequestMixin):
     api_base_url = 'https://www.rijksmuseum.nl/api/nl/'
     items_per_page = 100  # The number of items to request in a single API call
+    concurrency = 4  # The number of objects that are fetched concurrently
+    requests_per_second = 10  # The maximal rate of API calls
+
+    def __init__(self, *args, **kwargs):
+        super(RijksmuseumExtractor, self).__init__(*args, **kwargs)
+
+        self.concurrency = self.source_definition.get(
+            'rijksmuseum_concurrency', self.concurrency)
+
+        # API calls of all threads count towards the quota of the API key
+        self.rate_limiter = RateLimiter(self.source_definition.get(
+            'rijksmuseum_requests_per_second', self.requests_per_second))
 
     def api_call(self, url, params={}):
-        params.update(key=self.source_definition['rijksmuseum_api_key'],
-                      format='json')
+        params = dict(params, format='json',
+                      key=self.source_definition['rijksmuseum_api_key'])
         url = '%s%s' % (self.api_base_url, url)
 
         log.debug('Getting %s (params: %s)' % (url, params))
-        r = self.http_session.get(url, params=params)
-        r.raise_for_status()
+        r = get_with_retries(self.plain_http_session, url,
+                             rate_limiter=self.rate_limiter, params=params)
 
         return r.json()
 
@@ -56,5 +70,10 @@ class RijksmuseumExtractor(BaseExtractor, HttpRequestMixin):
                 self.source_definition['rijksmuseum_api_key']):
             raise ValueError('Missing Rijksmuseum API key in source settings')
 
-        for item in self.get_collection_objects():
-            yield self.get_object(item['objectNumber'])
+        # The details of the objects are fetched by a pool of threads,
+        # while the pages of the collection are retrieved by this one
+        object_numbers = (item['objectNumber'] for item
+                          in self.get_collection_objects())
+        for item in bounded_imap(self.get_object, object_numbers,
+                                 self.concurrency):
+            yield item
@@ -1,15 +1,30 @@
+from ocd_backend import settings
 from ocd_backend.extractors import BaseExtractor, HttpRequestMixin
+from ocd_backend.extractors import log
 from ocd_backend.exceptions import ConfigurationError
+from ocd_backend.utils.streams import iter_json_array
 
 from click import progressbar
+from tempfile import TemporaryFile
 import gzip
 import json
+import os
+import re
 from lxml import etree
 
+# A name test (optionally with a namespace prefix), such as ``record`` or
+# ``cb3:record``
+NAME_TEST = re.compile(r'^(?:(?P<prefix>[\w.-]+):)?(?P<name>[\w.-]+)$')
+
 
 class StaticFileBaseExtractor(BaseExtractor, HttpRequestMixin):
     """ A base class for implementing extractors that retrieve items
-    by fetching a single statically hosted external file."""
+    by fetching a single statically hosted external file.
+
+    Sources that set ``static_file_streaming`` have the file written to
+    a temporary file while it is downloaded, and the items are extracted
+    from that file by :py:meth:`stream_items`, instead of keeping the
+    complete file in memory."""
 
     def __init__(self, *args, **kwargs):
         super(StaticFileBaseExtractor, self).__init__(*args, **kwargs)
@@ -21,6 +36,8 @@ class StaticFileBaseExtractor(BaseExtractor, HttpRequestMixin):
             raise ConfigurationError('The \'file_url\' is empty')
 
         self.file_url = self.source_definition['file_url']
+        self.streaming = self.source_definition.get('static_file_streaming',
+                                                    False)
 
     def extract_items(self, static_content):
         """Parses the static content and extracts the items.
@@ -41,7 +58,49 @@ class StaticFileBaseExtractor(BaseExtractor, HttpRequestMixin):
         """
         raise NotImplementedError
 
+    def stream_items(self, static_file):
+        """Extracts the items from the downloaded file. Extractors that
+        can parse the file incrementally should override this method; by
+        default, the complete file is read and passed to
+        :py:meth:`extract_items`.
+
+        :param static_file: the file-like object containing the items.
+        """
+        return self.extract_items(static_file.read())
+
+    def download(self):
+        """Writes the static file to a temporary file (in
+        ``settings.TEMP_DIR_PATH``) while it is downloaded. The file is
+        removed once it is closed.
+
+        :returns: the temporary file, positioned at its start.
+        """
+        r = self.http_session.get(self.file_url, stream=True)
+        r.raise_for_status()
+
+        if not os.path.exists(settings.TEMP_DIR_PATH):
+            log.debug('Creating temp directory %s' % settings.TEMP_DIR_PATH)
+            os.makedirs(settings.TEMP_DIR_PATH)
+
+        static_file = TemporaryFile(prefix='ocd_s_', suffix='.tmp',
+                                    dir=settings.TEMP_DIR_PATH)
+        for chunk in r.iter_content(chunk_size=512*1024):
+            if chunk:  # filter out keep-alive chunks
+                static_file.write(chunk)
+
+        static_file.seek(0)
+        return static_file
+
     def run(self):
+        if self.streaming:
+            static_file = self.download()
+            try:
+                for item in self.stream_items(static_file):
+                    yield item
+            finally:
+                static_file.close()
+            return
+
         # Retrieve the static content from the source
         r = self.http_session.get(self.file_url)
         r.raise_for_status()
@@ -59,6 +118,12 @@ class StaticXmlExtractor(StaticFileBaseExtractor):
     The XPath expression used to extract items from the retrieved
     XML file should be specified in the definition of the source
     by populating the ``item_xpath`` attribute.
+
+    When the file is streamed, the items are the elements of which the
+    tag matches the last step of ``item_xpath`` (which has to be a plain
+    name, such as ``record`` or ``cb3:record``), regardless of where
+    they occur in the document (items can't contain other items).
+    Streamed items don't include the whitespace that follows them.
     """
 
     def __init__(self, *args, **kwargs):
@@ -78,28 +143,79 @@ class StaticXmlExtractor(StaticFileBaseExtractor):
                 'default_namespace'
             ]
 
-    def extract_items(self, static_content):
-        tree = etree.fromstring(static_content)
+        if self.streaming:
+            self.item_name_test = NAME_TEST.match(
+                self.item_xpath.rsplit('/', 1)[-1])
+            if not self.item_name_test:
+                raise ConfigurationError('The last step of \'item_xpath\' '
+                                         'has to be a name to stream items')
 
+    def get_namespaces(self, root):
         self.namespaces = None
         if self.default_namespace is not None:
             # the namespace map has a key None if there is a default namespace
             # so the configuration has to specify the default key
             # xpath queries do not allow an empty default namespace
-            self.namespaces = tree.nsmap
+            self.namespaces = root.nsmap
             try:
                 self.namespaces[self.default_namespace] = self.namespaces[None]
                 del self.namespaces[None]
             except KeyError as e:
                 pass
 
+        return self.namespaces
+
+    def extract_items(self, static_content):
+        tree = etree.fromstring(static_content)
+        self.get_namespaces(tree)
+
         for item in tree.xpath(self.item_xpath, namespaces=self.namespaces):
             yield 'application/xml', etree.tostring(item)
 
+    def get_item_tag(self, root):
+        """Returns the tag of the items, resolving the prefix of the
+        ``item_xpath`` with the namespaces of the ``root`` element."""
+        prefix = self.item_name_test.group('prefix')
+        name = self.item_name_test.group('name')
+        if prefix is None:
+            return name
+
+        namespaces = self.get_namespaces(root) or root.nsmap
+        if prefix not in namespaces:
+            raise ConfigurationError('The namespace prefix \'%s\' of '
+                                     '\'item_xpath\' is not defined' % prefix)
+
+        return '{%s}%s' % (namespaces[prefix], name)
+
+    def stream_items(self, static_file):
+        """Parses the file incrementally, and yields each item as soon as
+        it is complete. Items are removed from the tree once they are
+        yielded, so only a single item is kept in memory."""
+        item_tag = None
+        for event, element in etree.iterparse(static_file,
+                                              events=('start', 'end')):
+            if item_tag is None:
+                # The first event is the start of the root element
+                item_tag = self.get_item_tag(element)
+
+            if event != 'end' or element.tag != item_tag:
+                continue
+
+            yield 'application/xml', etree.tostring(element, with_tail=False)
+
+            # Remove the item, and the items that preceded it
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
 
 class StaticJSONExtractor(StaticFileBaseExtractor):
     """
     Extract items from JSON files.
+
+    When the file is streamed, the items are yielded as they appear in the
+    file (see :func:`~ocd_backend.utils.streams.iter_json_array`), instead
+    of being decoded and encoded again.
     """
 
     def extract_items(self, static_content):
@@ -112,6 +228,10 @@ class StaticJSONExtractor(StaticFileBaseExtractor):
         for item in static_json:
             yield 'application/json', json.dumps(item)
 
+    def stream_items(self, static_file):
+        for item in iter_json_array(static_file):
+            yield 'application/json', item
+
 
 class StaticJSONDumpExtractor(BaseExtractor):
     """
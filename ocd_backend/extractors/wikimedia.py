@@ -2,6 +2,7 @@ from lxml import etree
 
 from ocd_backend.extractors import BaseExtractor, HttpRequestMixin
 from ocd_backend.extractors import log
+from ocd_backend.utils.concurrency import bounded_imap
 
 
 class WikimediaCommonsExtractor(BaseExtractor, HttpRequestMixin):
@@ -11,15 +12,22 @@ class WikimediaCommonsExtractor(BaseExtractor, HttpRequestMixin):
     The Wikipedia API is used first to query for File pages in a specific
     category. For each found page, the metadata is retrieved by using the
     `Commons API <http://tools.wmflabs.org/magnus-toolserver/commonsapi.php>`_.
+
+    The Commons API only accepts a single image per request, so the
+    metadata of up to ``wikimedia_concurrency`` pages is requested
+    concurrently instead.
     """
 
     commons_api_url = 'http://tools.wmflabs.org/magnus-toolserver/commonsapi.php'
+    concurrency = 4  # The number of Commons API calls that run concurrently
 
     def __init__(self, *args, **kwargs):
         super(WikimediaCommonsExtractor, self).__init__(*args, **kwargs)
 
         self.base_url = self.source_definition['wikimedia_base_url']
         self.wikimedia_category = self.source_definition['wikimedia_category']
+        self.concurrency = self.source_definition.get('wikimedia_concurrency',
+                                                      self.concurrency)
 
     def wikimedia_api_call(self, params={}):
         """Calls the MediaWiki API and returns the response as a string.
@@ -62,7 +70,8 @@ class WikimediaCommonsExtractor(BaseExtractor, HttpRequestMixin):
 
         return r.content
 
-    def get_all_records(self):
+    def get_page_titles(self):
+        """Yields the titles of the file pages in the category."""
         cmcontinue = None
 
         while True:
@@ -73,22 +82,8 @@ class WikimediaCommonsExtractor(BaseExtractor, HttpRequestMixin):
             # Get the file pages in the specified Wiki category
             file_pages = etree.fromstring(self.wikimedia_api_call(req_params))
 
-            # Request the metadata of each page
             for file_page in file_pages.findall('.//cm'):
-                page_title = file_page.attrib['title']
-
-                page_meta = self.commons_api_call(page_title)
-                page_meta_tree = etree.fromstring(page_meta)
-
-                # Skip this page if the response contains errors (the Commons
-                # API doesn't return proper HTTP status codes)
-                page_meta_error = page_meta_tree.find('.//error')
-                if page_meta_error:
-                    log.warning('Skipping "%s" because of Commons API error: %s'
-                                % (page_title, page_meta_error.text))
-                    continue
-
-                yield 'application/xml', page_meta
+                yield file_page.attrib['title']
 
             try:
                 cmcontinue = file_pages.xpath('.//query-continue/categorymembers/@cmcontinue')[0]
@@ -100,6 +95,31 @@ class WikimediaCommonsExtractor(BaseExtractor, HttpRequestMixin):
                 log.debug('cmcontinue empty, done fetching category pages')
                 break
 
+    def get_page_meta(self, page_title):
+        """Returns the metadata of a file page, or ``None`` when the Commons
+        API returned an error."""
+        page_meta = self.commons_api_call(page_title)
+        page_meta_tree = etree.fromstring(page_meta)
+
+        # Skip this page if the response contains errors (the Commons
+        # API doesn't return proper HTTP status codes)
+        page_meta_error = page_meta_tree.find('.//error')
+        if page_meta_error:
+            log.warning('Skipping "%s" because of Commons API error: %s'
+                        % (page_title, page_meta_error.text))
+            return None
+
+        return page_meta
+
+    def get_all_records(self):
+        # Request the metadata of each page, while the next pages of the
+        # category are retrieved
+        for page_meta in bounded_imap(self.get_page_meta,
+                                      self.get_page_titles(),
+                                      self.concurrency):
+            if page_meta is not None:
+                yield 'application/xml', page_meta
+
     def run(self):
         for record in self.get_all_records():
             yield record
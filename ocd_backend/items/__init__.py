@@ -4,6 +4,7 @@ from hashlib import sha1
 import json
 
 from ocd_backend.utils import json_encoder
+from ocd_backend.utils.misc import hash_raw_item
 from ocd_backend.exceptions import (UnableToGenerateObjectId,
                                     FieldNotAvailable)
 
@@ -35,6 +36,7 @@ class BaseItem(object):
         'rights': unicode,
         'original_object_id': unicode,
         'original_object_urls': dict,
+        'hash': unicode,
     }
 
     #: Allowed key-value pairs for the document inserted in the 'combined index'
@@ -73,6 +75,11 @@ class BaseItem(object):
         self.meta['original_object_id'] = self.get_original_object_id()
         self.meta['original_object_urls'] = self.get_original_object_urls()
 
+        # The hash of the original data is used to detect if an item
+        # changed since it was last harvested
+        self.meta['hash'] = unicode(hash_raw_item(self.data_content_type,
+                                                  self.data))
+
     def _construct_combined_index_data(self):
         self.combined_index_data = StrictMappingDict(self.combined_index_fields)
 
@@ -1,38 +1,61 @@
 from datetime import datetime
+from time import time
 
 from elasticsearch import ConflictError
 from ocd_backend import celery_app
 
 from ocd_backend import settings
 from ocd_backend.es import elasticsearch
-from ocd_backend.exceptions import ConfigurationError
+from ocd_backend.exceptions import ConfigurationError, BulkDocumentError
 from ocd_backend.log import get_source_logger
+from ocd_backend.run_context import expand_task_kwargs
 from ocd_backend.mixins import (OCDBackendTaskSuccessMixin,
-                                OCDBackendTaskFailureMixin)
+                                OCDBackendTaskFailureMixin,
+                                OCDBackendBatchMixin,
+                                OCDBackendMetricsMixin)
 
 log = get_source_logger('loader')
 
 
 class BaseLoader(OCDBackendTaskSuccessMixin, OCDBackendTaskFailureMixin,
-                 celery_app.Task):
+                 OCDBackendBatchMixin, OCDBackendMetricsMixin, celery_app.Task):
     """The base class that other loaders should inherit."""
+    metrics_stage = 'loader'
+    dead_letter_stage = 'loader'
 
     def run(self, *args, **kwargs):
         """Start loading of a single item.
 
         This method is called by the transformer and expects args to
         contain the output of the transformer as a tuple.
-        Kwargs should contain the ``source_definition`` dict.
+        Kwargs should contain the ``source_definition`` dict, or the
+        ``run_identifier`` of a run of which the context is stored (see
+        :func:`~ocd_backend.run_context.expand_task_kwargs`).
 
         :param item:
         :param source_definition: The configuration of a single source in
             the form of a dictionary (as defined in the settings).
         :type source_definition: dict.
+        :param batch: when ``True``, the first argument is a list of
+            item tuples instead of a single item tuple.
+        :type batch: bool.
         :returns: the output of :py:meth:`~BaseTransformer.transform_item`
         """
+        kwargs = expand_task_kwargs(kwargs)
         self.source_definition = kwargs['source_definition']
 
-        object_id, combined_index_doc, doc = args[0]
+        load = self.measured(self.load)
+        try:
+            if kwargs.get('batch'):
+                return self.run_batch(args[0], load, **kwargs)
+
+            return load(args[0])
+        finally:
+            self.flush_metrics(**kwargs)
+
+    def load(self, item):
+        """Load a single item tuple."""
+        object_id, combined_index_doc, doc = item
 
         # Add the 'processing.finished' datetime to the documents
         finished = datetime.now()
@@ -44,6 +67,24 @@ class BaseLoader(OCDBackendTaskSuccessMixin, OCDBackendTaskFailureMixin,
     def load_item(self, object_id, combined_index_doc, doc):
         raise NotImplemented
 
+    def delete(self, original_object_id, **kwargs):
+        """Remove an item that was deleted at the source.
+
+        This method is not called as a task, but directly by the pipeline
+        while it is extracting items in incremental mode. Kwargs should
+        contain the same arguments as passed to :meth:`run`.
+
+        :param original_object_id: the ID used by the source to identify
+            the deleted item.
+        :type original_object_id: unicode.
+        """
+        self.source_definition = kwargs['source_definition']
+
+        return self.delete_item(original_object_id)
+
+    def delete_item(self, original_object_id):
+        raise NotImplementedError
+
 
 class ElasticsearchLoader(BaseLoader):
     """Indexes items into Elasticsearch.
@@ -56,6 +97,18 @@ class ElasticsearchLoader(BaseLoader):
     ``RESOLVER_URL_INDEX`` (if it doesn't already exist).
     """
     def run(self, *args, **kwargs):
+        kwargs = expand_task_kwargs(kwargs)
+        self.set_index_names(**kwargs)
+
+        return super(ElasticsearchLoader, self).run(*args, **kwargs)
+
+    def delete(self, original_object_id, **kwargs):
+        self.set_index_names(**kwargs)
+
+        return super(ElasticsearchLoader, self).delete(original_object_id,
+                                                       **kwargs)
+
+    def set_index_names(self, **kwargs):
         self.current_index_name = kwargs.get('current_index_name')
         self.index_name = kwargs.get('new_index_name')
         self.alias = kwargs.get('index_alias')
@@ -63,8 +116,6 @@ class ElasticsearchLoader(BaseLoader):
         if not self.index_name:
             raise ConfigurationError('The name of the index is not provided')
 
-        return super(ElasticsearchLoader, self).run(*args, **kwargs)
-
     def load_item(self, object_id, combined_index_doc, doc):
         log.info('Indexing documents...')
         elasticsearch.index(index=settings.COMBINED_INDEX, doc_type='item',
@@ -74,6 +125,40 @@ class ElasticsearchLoader(BaseLoader):
         elasticsearch.index(index=self.index_name, doc_type='item', body=doc,
                             id=object_id)
 
+        # For each media_urls.url, add a resolver document to the
+        # RESOLVER_URL_INDEX
+        for url_hash, url_doc in self.get_resolver_docs(doc):
+            try:
+                elasticsearch.create(index=settings.RESOLVER_URL_INDEX,
+                                     doc_type='url', id=url_hash,
+                                     body=url_doc)
+            except ConflictError:
+                log.debug('Resolver document %s already exists' % url_hash)
+
+    def delete_item(self, original_object_id):
+        log.info('Deleting documents of %s...' % original_object_id)
+        query = {
+            'query': {
+                'filtered': {
+                    'filter': {
+                        'and': [
+                            {'term': {'meta.source_id':
+                                      self.source_definition['id']}},
+                            {'term': {'meta.original_object_id':
+                                      original_object_id}}
+                        ]
+                    }
+                }
+            }
+        }
+
+        for index in [settings.COMBINED_INDEX, self.index_name]:
+            elasticsearch.delete_by_query(index=index, doc_type='item',
+                                          body=query)
+
+    def get_resolver_docs(self, doc):
+        """Returns a list of ``(url_hash, url_doc)`` tuples, one for
+        each URL in the ``media_urls`` of ``doc``."""
         m_url_content_types = {}
         if 'media_urls' in doc['enrichments']:
             for media_url in doc['enrichments']['media_urls']:
@@ -81,25 +166,155 @@ class ElasticsearchLoader(BaseLoader):
                     m_url_content_types[media_url['original_url']] = \
                         media_url['content_type']
 
-        # For each media_urls.url, add a resolver document to the
-        # RESOLVER_URL_INDEX
-        if 'media_urls' in doc:
-            for media_url in doc['media_urls']:
-                url_hash = media_url['url'].split('/')[-1]
-                url_doc = {
-                    'original_url': media_url['original_url']
-                }
+        resolver_docs = []
+        for media_url in doc.get('media_urls', []):
+            url_hash = media_url['url'].split('/')[-1]
+            url_doc = {
+                'original_url': media_url['original_url']
+            }
+
+            if media_url['original_url'] in m_url_content_types:
+                url_doc['content_type'] = \
+                    m_url_content_types[media_url['original_url']]
+
+            resolver_docs.append((url_hash, url_doc))
+
+        return resolver_docs
+
+
+class BulkElasticsearchLoader(ElasticsearchLoader):
+    """Indexes items into Elasticsearch using the ``_bulk`` API.
+
+    Instead of sending a separate request for the combined index, the
+    source index and each resolver document, all documents are collected
+    in a buffer that is sent as a single bulk request. The buffer is
+    flushed when it holds ``bulk_flush_docs`` documents or
+    ``bulk_flush_bytes`` bytes (both can be set in the source definition),
+    and at the end of each task. This loader is therefore most effective
+    when the source also defines a ``batch_size``.
+
+    Errors of individual documents don't fail the batch. Resolver
+    documents that already exist are ignored; the items of other documents
+    that failed are stored in the dead letters of the run, so they can be
+    replayed.
+    """
+    def run(self, *args, **kwargs):
+        kwargs = expand_task_kwargs(kwargs)
+        self.task_kwargs = kwargs
+        source_definition = kwargs['source_definition']
+        self.flush_docs = source_definition.get('bulk_flush_docs',
+                                                settings.ES_BULK_FLUSH_DOCS)
+        self.flush_bytes = source_definition.get('bulk_flush_bytes',
+                                                 settings.ES_BULK_FLUSH_BYTES)
+
+        self.bulk_buffer = []
+        # The item of each buffered document
+        self.bulk_buffer_items = []
+        self.bulk_buffer_docs = 0
+        self.bulk_buffer_bytes = 0
+
+        try:
+            return super(BulkElasticsearchLoader, self).run(*args, **kwargs)
+        finally:
+            try:
+                self.flush()
+            finally:
+                # Record the metrics of the last bulk request as well
+                self.flush_metrics(**kwargs)
+
+    def run_batch(self, items, process_item, **kwargs):
+        # Flush outside of the per-item error handling of a batch, so a
+        # failing bulk request fails the task instead of a single item
+        results = []
+        for item in items:
+            results += super(BulkElasticsearchLoader, self).run_batch(
+                [item], process_item, **kwargs)
+
+            if (self.bulk_buffer_docs >= self.flush_docs or
+                    self.bulk_buffer_bytes >= self.flush_bytes):
+                self.flush()
+
+        return results
+
+    def load_item(self, object_id, combined_index_doc, doc):
+        item = (object_id, combined_index_doc, doc)
+        self.add_to_buffer('index', settings.COMBINED_INDEX, 'item', object_id,
+                           combined_index_doc, item)
+        self.add_to_buffer('index', self.index_name, 'item', object_id, doc,
+                           item)
+
+        for url_hash, url_doc in self.get_resolver_docs(doc):
+            self.add_to_buffer('create', settings.RESOLVER_URL_INDEX, 'url',
+                               url_hash, url_doc, item)
+
+    def add_to_buffer(self, action, index, doc_type, doc_id, doc, item):
+        """Serializes a bulk action and its document, and adds both to
+        the buffer. ``item`` is the item tuple the document belongs to."""
+        serializer = elasticsearch.transport.serializer
+        action = serializer.dumps({
+            action: {'_index': index, '_type': doc_type, '_id': doc_id}
+        })
+        doc = serializer.dumps(doc)
+
+        self.bulk_buffer.append(action)
+        self.bulk_buffer.append(doc)
+        self.bulk_buffer_items.append(item)
+        self.bulk_buffer_docs += 1
+        self.bulk_buffer_bytes += len(action) + len(doc) + 2
+
+    def flush(self):
+        """Sends the buffered documents to Elasticsearch in a single bulk
+        request, and stores the items of the documents that failed in the
+        dead letters of the run."""
+        if not self.bulk_buffer:
+            return
+
+        log.info('Indexing %s documents (%s bytes) in bulk...'
+                 % (self.bulk_buffer_docs, self.bulk_buffer_bytes))
+        body = '\n'.join(self.bulk_buffer) + '\n'
+        items = self.bulk_buffer_items
+
+        self.bulk_buffer = []
+        self.bulk_buffer_items = []
+        self.bulk_buffer_docs = 0
+        self.bulk_buffer_bytes = 0
+
+        started = time()
+        try:
+            response = elasticsearch.bulk(body=body)
+        except:
+            self.add_metric(time() - started, error=True,
+                            stage='loader.bulk_request')
+            raise
+        self.add_metric(time() - started, stage='loader.bulk_request')
+
+        if not response.get('errors'):
+            return
+
+        # The results are in the same order as the buffered documents
+        failed_items = []
+        for item, result in zip(items, response['items']):
+            action, result = result.items()[0]
+            if 'error' not in result:
+                continue
+
+            if action == 'create' and result.get('status') == 409:
+                log.debug('Resolver document %s already exists'
+                          % result['_id'])
+                continue
+
+            message = ('Unable to %s document %s in index %s: %s'
+                       % (action, result['_id'], result['_index'],
+                          result['error']))
+            log.error(message)
 
-                if media_url['original_url'] in m_url_content_types:
-                    url_doc['content_type'] = \
-                        m_url_content_types[media_url['original_url']]
+            # An item with several failed documents is stored once
+            if not any(item is failed for failed, _ in failed_items):
+                failed_items.append((item, message))
 
-                try:
-                    elasticsearch.create(index=settings.RESOLVER_URL_INDEX,
-                                         doc_type='url', id=url_hash,
-                                         body=url_doc)
-                except ConflictError:
-                    log.debug('Resolver document %s already exists' % url_hash)
+        for item, message in failed_items:
+            self.dead_letter([item], BulkDocumentError(message), None,
+                             **self.task_kwargs)
 
 
 class DummyLoader(BaseLoader):
@@ -0,0 +1,180 @@
+from multiprocessing import Process, Queue, cpu_count
+from Queue import Empty
+from threading import Thread
+import sys
+
+from ocd_backend import settings
+from ocd_backend.exceptions import WorkerLost
+from ocd_backend.log import get_source_logger
+from ocd_backend.registry import registry
+from ocd_backend.utils.misc import iterate_in_batches
+
+log = get_source_logger('pipeline')
+
+
+class LocalExecutor(object):
+    """Runs the transformer, enrichers and loader of a source in local
+    processes, instead of in Celery workers. No broker is needed, and the
+    items don't have to be serialized into messages.
+
+    The extracted items are grouped in batches (of the ``batch_size`` of
+    the source, or ``settings.LOCAL_EXECUTOR_BATCH_SIZE`` items) that are
+    put on a bounded queue by a feeder thread. A pool of worker processes
+    transforms and enriches the batches, and puts them on a second bounded
+    queue. The batches on this queue are loaded by the main process. As
+    both queues are bounded, extraction is paused when the workers or the
+    loader can't keep up.
+
+    The existing transformer, enricher and loader tasks are reused, by
+    running them in batch mode. As local runs don't store any state in
+    the result backend, the tasks don't record metrics or dead letters.
+    The items that fail to be transformed or enriched (on their own, or
+    because their whole batch failed) are counted in :attr:`failed_items`.
+
+    :param source_definition: the configuration of the source.
+    :param params: the parameters of the run.
+    :param processes: the number of worker processes; defaults to
+        ``settings.LOCAL_EXECUTOR_PROCESSES`` or the number of CPUs.
+    """
+    def __init__(self, source_definition, params, processes=None):
+        self.source_definition = source_definition
+        self.params = dict(params, batch=True, record_metrics=False,
+                           record_dead_letters=False)
+        self.processes = (processes or settings.LOCAL_EXECUTOR_PROCESSES or
+                          cpu_count())
+        self.batch_size = (source_definition.get('batch_size') or
+                           settings.LOCAL_EXECUTOR_BATCH_SIZE)
+
+        self.extractor_exc_info = None
+        self.failed_items = 0
+
+    def run(self, items):
+        """Processes the extracted ``items`` and blocks until all of them
+        are loaded.
+
+        :param items: an iterable of ``(content-type, data)`` tuples, as
+            yielded by an extractor.
+        :returns: the number of loaded items.
+        :raises WorkerLost: when a worker process exits before it sent
+            all of its batches.
+        """
+        raw_queue = Queue(maxsize=settings.LOCAL_EXECUTOR_QUEUE_SIZE)
+        doc_queue = Queue(maxsize=settings.LOCAL_EXECUTOR_QUEUE_SIZE)
+
+        workers = []
+        for _ in range(self.processes):
+            worker = Process(target=self.process_batches,
+                             args=(raw_queue, doc_queue))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        feeder = Thread(target=self.feed_batches, args=(items, raw_queue))
+        feeder.daemon = True
+        feeder.start()
+
+        loader = registry.get_task(self.source_definition['loader'])
+        loaded_items = 0
+        finished_workers = 0
+
+        try:
+            while finished_workers < len(workers):
+                try:
+                    result = doc_queue.get(
+                        timeout=settings.LOCAL_EXECUTOR_POLL_INTERVAL)
+                except Empty:
+                    # A worker that died (for example because it ran out of
+                    # memory) never sends its sentinel
+                    self.check_workers(workers)
+                    continue
+
+                if result is None:
+                    finished_workers += 1
+                    continue
+
+                failed_items, docs = result
+                self.failed_items += failed_items
+                if not docs:
+                    continue
+
+                loaded_items += len(loader.run(
+                    docs,
+                    source_definition=self.source_definition,
+                    **self.params
+                ))
+        except:
+            for worker in workers:
+                worker.terminate()
+            raise
+
+        feeder.join()
+        for worker in workers:
+            worker.join()
+
+        if self.extractor_exc_info:
+            exc_type, exc_value, exc_traceback = self.extractor_exc_info
+            raise exc_type, exc_value, exc_traceback
+
+        return loaded_items
+
+    def check_workers(self, workers):
+        """Raises :class:`~ocd_backend.exceptions.WorkerLost` when one of
+        ``workers`` exited with an error."""
+        for worker in workers:
+            if not worker.is_alive() and worker.exitcode:
+                raise WorkerLost('Worker process %s of the local run exited '
+                                 'with code %s' % (worker.pid, worker.exitcode))
+
+    def feed_batches(self, items, raw_queue):
+        """Puts the extracted items on ``raw_queue`` in batches, followed
+        by a sentinel for each worker."""
+        try:
+            for batch in iterate_in_batches(items, self.batch_size):
+                raw_queue.put(batch)
+        except:
+            self.extractor_exc_info = sys.exc_info()
+            log.exception('An exception has occured in the "%s" extractor'
+                          % self.source_definition.get('extractor'))
+        finally:
+            for _ in range(self.processes):
+                raw_queue.put(None)
+
+    def process_batches(self, raw_queue, doc_queue):
+        """Transforms and enriches the batches on ``raw_queue`` and puts
+        the results on ``doc_queue``, until a sentinel is received. Each
+        result is a tuple of the number of items that failed, and the
+        documents of the batch. This method runs in a worker process."""
+        transformer = registry.get_task(self.source_definition['transformer'])
+        enrichers = [(registry.get_task(enricher[0]), enricher[1]) for enricher
+                     in self.source_definition.get('enrichers', [])]
+
+        while True:
+            batch = raw_queue.get()
+            if batch is None:
+                doc_queue.put(None)
+                return
+
+            try:
+                docs = transformer.run(
+                    batch,
+                    source_definition=self.source_definition,
+                    **self.params
+                )
+
+                for enricher_task, enricher_settings in enrichers:
+                    docs = enricher_task.run(
+                        docs,
+                        source_definition=self.source_definition,
+                        enricher_settings=enricher_settings,
+                        **self.params
+                    )
+            except Exception:
+                log.exception('Unable to process a batch of %s items, '
+                              'skipping batch' % len(batch))
+                doc_queue.put((len(batch), None))
+                continue
+
+            # Items that failed on their own are left out of the documents
+            # (see OCDBackendBatchMixin.run_batch)
+            docs = docs or []
+            doc_queue.put((len(batch) - len(docs), docs))
@@ -0,0 +1,172 @@
+from bisect import bisect_left
+from time import time
+
+from ocd_backend import celery_app
+from ocd_backend import settings
+
+
+class StageMetrics(object):
+    """Collects the number of items a stage of the pipeline processed,
+    the number of items it failed to process, and a histogram of the time
+    it took to process each item.
+
+    The histogram consists of a counter for each of the upper bounds in
+    ``settings.METRICS_LATENCY_BUCKETS`` (in seconds), followed by a
+    counter for the items that took longer than the last bound.
+    """
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(settings.METRICS_LATENCY_BUCKETS) + 1)
+        self.first = None
+        self.last = None
+
+    def add(self, seconds, error=False):
+        """Records an item that took ``seconds`` to process."""
+        now = time()
+        if self.first is None:
+            self.first = now - seconds
+        self.last = now
+
+        if error:
+            self.errors += 1
+        else:
+            self.count += 1
+
+        self.seconds += seconds
+        self.buckets[bisect_left(settings.METRICS_LATENCY_BUCKETS,
+                                 seconds)] += 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'seconds': self.seconds,
+            'buckets': self.buckets,
+            'first': self.first,
+            'last': self.last
+        }
+
+
+def percentile(buckets, fraction):
+    """Returns the upper bound (in seconds) of the histogram bucket that
+    contains the given ``fraction`` of the recorded items, or ``None``
+    when it is the bucket of items that exceeded all bounds.
+
+    :param buckets: the counters of a histogram (see
+        :class:`StageMetrics`).
+    :param fraction: the fraction of items, e.g. ``0.95``.
+    """
+    total = sum(buckets)
+    if not total:
+        return 0.0
+
+    seen = 0
+    for bound, count in zip(settings.METRICS_LATENCY_BUCKETS, buckets):
+        seen += count
+        if seen >= total * fraction:
+            return bound
+
+    return None
+
+
+def summarize_stage(metrics):
+    """Returns the throughput (in items per second, between the first and
+    the last recorded item), the mean time per item and the p50 and p95
+    of the time per item of a stage.
+
+    :param metrics: the metrics of a stage, as returned by
+        ``get_metrics`` of the backend.
+    """
+    processed = metrics['count'] + metrics['errors']
+    elapsed = (metrics['last'] or 0) - (metrics['first'] or 0)
+
+    return {
+        'items_per_second': processed / elapsed if elapsed > 0 else None,
+        'mean': metrics['seconds'] / processed if processed else 0.0,
+        'p50': percentile(metrics['buckets'], 0.5),
+        'p95': percentile(metrics['buckets'], 0.95)
+    }
+
+
+def stage_sort_key(stage):
+    """Sorts stages in the order in which they process an item."""
+    order = ['extractor', 'transformer', 'enricher', 'loader']
+    prefix = stage.split('.')[0]
+
+    return (order.index(prefix) if prefix in order else len(order), stage)
+
+
+def estimate_backlog(stages):
+    """Returns the number of extracted items that were not loaded (or
+    dropped because of an error) yet, and the estimated number of seconds
+    it takes the loader to process them (or ``None`` when the loader
+    didn't process any items yet).
+
+    :param stages: the metrics of the stages of a run, as returned by
+        ``get_metrics`` of the backend.
+    """
+    empty = {'count': 0, 'errors': 0}
+    extracted = stages.get('extractor', empty)['count']
+    dropped = (stages.get('transformer', empty)['errors'] +
+               stages.get('loader', empty)['errors'])
+    loaded = stages.get('loader', empty)['count']
+
+    backlog = max(extracted - loaded - dropped, 0)
+
+    eta = None
+    if 'loader' in stages:
+        items_per_second = \
+            summarize_stage(stages['loader'])['items_per_second']
+        if items_per_second:
+            eta = backlog / items_per_second
+
+    return backlog, eta
+
+
+def record_metrics(run_identifier, source_id, stages):
+    """Adds the metrics of one or more stages to the metrics of a run.
+
+    :param run_identifier: the identifier of the run.
+    :param source_id: the identifier of the source of the run.
+    :param stages: a dict with the name of a stage as key and its
+        :class:`StageMetrics` as value.
+    """
+    stages = dict((stage, metrics.to_dict()) for stage, metrics
+                  in stages.iteritems() if metrics.first is not None)
+    if not run_identifier or not stages:
+        return
+
+    celery_app.backend.record_metrics(run_identifier, source_id, stages)
+
+
+def measure_extraction(items, run_identifier, source_id, stage='extractor'):
+    """Passes on the ``items`` yielded by an extractor, while recording
+    the time the extractor took to produce each of them. The metrics are
+    written to the backend every ``settings.METRICS_FLUSH_INTERVAL``
+    seconds."""
+    metrics = StageMetrics()
+    last_flush = time()
+
+    items = iter(items)
+    while True:
+        started = time()
+        try:
+            item = next(items)
+        except StopIteration:
+            break
+        except:
+            metrics.add(time() - started, error=True)
+            record_metrics(run_identifier, source_id, {stage: metrics})
+            raise
+
+        metrics.add(time() - started)
+        yield item
+
+        if time() - last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            record_metrics(run_identifier, source_id, {stage: metrics})
+            metrics = StageMetrics()
+            last_flush = time()
+
+    record_metrics(run_identifier, source_id, {stage: metrics})
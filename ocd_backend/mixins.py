@@ -1,4 +1,15 @@
-from ocd_backend.utils.misc import load_object
+from time import time
+import traceback
+
+from celery import states
+
+from ocd_backend.dead_letters import record_dead_letters, RAW_ITEM_STAGES
+from ocd_backend.log import get_source_logger
+from ocd_backend.metrics import StageMetrics, record_metrics
+from ocd_backend.registry import registry
+from ocd_backend.run_context import expand_task_kwargs
+
+log = get_source_logger('pipeline')
 
 
 class OCDBackendTaskMixin(object):
@@ -12,19 +23,161 @@ class OCDBackendTaskMixin(object):
     It loads a `Task` that is defined by a dotted path in `sources.json`.
     """
     def cleanup(self, **kwargs):
-        cleanup_task = load_object(self.source_definition.get('cleanup'))()
+        cleanup_task = registry.get_task(self.source_definition.get('cleanup'))
         cleanup_task.delay(**kwargs)
 
 
-class OCDBackendTaskFailureMixin(OCDBackendTaskMixin):
+class OCDBackendDeadLetterMixin(object):
+    """Add this mixin to a task of which failed items should be stored in
+    the dead letters of the run (see :mod:`ocd_backend.dead_letters`), so
+    they can be replayed with ``./manage.py extract replay``. Tasks that
+    are called with ``record_dead_letters=False`` don't store any dead
+    letters."""
+
+    #: The stage of the pipeline the task is part of; replayed items
+    #: re-enter the pipeline at this stage
+    dead_letter_stage = None
+
+    def get_failed_items(self, args, batch=False):
+        """Returns the list of items in the ``args`` of the task."""
+        if batch:
+            return args[0]
+
+        # Raw items are passed as separate arguments, transformed items
+        # as a single tuple
+        if self.dead_letter_stage in RAW_ITEM_STAGES:
+            return [args]
+
+        return [args[0]]
+
+    def dead_letter(self, items, exc, traceback, **kwargs):
+        """Stores ``items`` in the dead letters of the run. Kwargs should
+        contain the ``run_identifier`` and the ``source_definition`` of
+        the run."""
+        if not kwargs.get('record_dead_letters', True):
+            return
+
+        try:
+            record_dead_letters(kwargs.get('run_identifier'),
+                                kwargs['source_definition']['id'],
+                                self.dead_letter_stage, items, exc, traceback,
+                                enricher_index=kwargs.get('enricher_index'))
+        except Exception:
+            log.exception('Unable to store %s failed items of %s in the dead '
+                          'letters of run %s'
+                          % (len(items), self.__class__.__name__,
+                             kwargs.get('run_identifier')))
+
+
+class OCDBackendTaskFailureMixin(OCDBackendTaskMixin,
+                                 OCDBackendDeadLetterMixin):
     """Add this mixin to a task that should execute `self.cleanup` when the
-    Task fails."""
+    Task fails. The item (or batch of items) of the task is stored in
+    the dead letters of the run."""
     def on_failure(self, exc, task_id, args, kwargs, einfo):
-        self.cleanup(**kwargs)
+        try:
+            expanded_kwargs = expand_task_kwargs(kwargs)
+            self.dead_letter(
+                self.get_failed_items(args, expanded_kwargs.get('batch')),
+                exc, einfo.traceback, **expanded_kwargs)
+        finally:
+            self.cleanup(**kwargs)
 
 
 class OCDBackendTaskSuccessMixin(OCDBackendTaskMixin):
     """Add this mixin to a task that should execute `self.cleanup` when the
     Task succeeds."""
     def after_return(self, status, retval, task_id, args, kwargs, einfo):
-        self.cleanup(**kwargs)
+        # A failed task is already cleaned up by `on_failure` (when the
+        # failure mixin is used as well), cleaning up twice would finish
+        # the chain twice
+        if status == states.SUCCESS:
+            self.cleanup(**kwargs)
+
+
+class OCDBackendBatchMixin(OCDBackendDeadLetterMixin):
+    """Add this mixin to a task that should be able to process a batch of
+    items (a list) instead of a single item. This is used when the
+    ``batch_size`` of a source is set, in which case one chain carries
+    a whole batch of extracted items.
+
+    Failures are isolated per item: an item that raises an exception is
+    logged and dropped from the batch, the remaining items of the batch
+    are processed as usual, and the failed item is stored in the dead
+    letters of the run."""
+    def run_batch(self, items, process_item, **kwargs):
+        """Call ``process_item`` for each item in ``items`` and return a
+        list containing the results of the items that were processed
+        successfully. Kwargs should contain the kwargs of the task."""
+        results = []
+        for item in items:
+            try:
+                results.append(process_item(item))
+            except Exception as e:
+                self.item_failed(item, e, **kwargs)
+
+        return results
+
+    def item_failed(self, item, exc, **kwargs):
+        """Called when processing a single item of a batch failed."""
+        log.exception('%s failed to process an item of a batch, skipping '
+                      'item: %s' % (self.__class__.__name__, exc))
+        self.dead_letter([item], exc, traceback.format_exc(), **kwargs)
+
+
+class OCDBackendMetricsMixin(object):
+    """Add this mixin to a task that should record the number of items it
+    processed, the number of failures and the processing time of each
+    item in the metrics of the run (see :mod:`ocd_backend.metrics`).
+
+    The metrics are collected while the task runs, and written to the
+    backend at once by :meth:`flush_metrics`. Tasks that are called with
+    ``record_metrics=False`` don't write any metrics."""
+
+    #: The name of the stage of the pipeline the task is part of
+    metrics_stage = None
+
+    def get_metrics_stage(self):
+        return self.metrics_stage or self.__class__.__name__
+
+    @property
+    def stage_metrics(self):
+        if not hasattr(self, '_stage_metrics'):
+            self._stage_metrics = {}
+
+        return self._stage_metrics
+
+    def add_metric(self, seconds, error=False, stage=None):
+        """Records a single processed item (or request) of ``stage``,
+        which defaults to the stage of the task."""
+        stage = stage or self.get_metrics_stage()
+        if stage not in self.stage_metrics:
+            self.stage_metrics[stage] = StageMetrics()
+
+        self.stage_metrics[stage].add(seconds, error=error)
+
+    def measured(self, process_item):
+        """Wraps ``process_item``, so each call is recorded in the metrics
+        of the task."""
+        def measured_process_item(item):
+            started = time()
+            try:
+                result = process_item(item)
+            except:
+                self.add_metric(time() - started, error=True)
+                raise
+
+            self.add_metric(time() - started)
+            return result
+
+        return measured_process_item
+
+    def flush_metrics(self, **kwargs):
+        """Writes the collected metrics to the backend, and resets them.
+        Kwargs should contain the ``run_identifier`` and the
+        ``source_definition`` of the run."""
+        stages, self._stage_metrics = self.stage_metrics, {}
+
+        if kwargs.get('record_metrics', True):
+            record_metrics(kwargs.get('run_identifier'),
+                           kwargs['source_definition']['id'], stages)
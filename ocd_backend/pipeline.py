@@ -1,19 +1,55 @@
+from collections import OrderedDict
 from datetime import datetime
+from time import sleep, time
 from uuid import uuid4
+import sys
 
 from elasticsearch.exceptions import NotFoundError
+from elasticsearch import helpers as es_helpers
 from celery import chain
 
-from ocd_backend.es import elasticsearch as es
+from ocd_backend.es import elasticsearch as es, get_index_settings
 from ocd_backend import settings, celery_app
+from ocd_backend.dead_letters import RAW_ITEM_STAGES
+from ocd_backend.extractors import DELETED_ITEM_CONTENT_TYPE, last_harvest_key
+from ocd_backend.local_executor import LocalExecutor
 from ocd_backend.log import get_source_logger
-from ocd_backend.utils.misc import load_object
-from ocd_backend.exceptions import ConfigurationError
+from ocd_backend.metrics import measure_extraction
+from ocd_backend.run_context import store_run_context, get_run_context
+from ocd_backend.spool import spool_items
+from ocd_backend.tasks import FusedPipeline
+from ocd_backend.utils.misc import (load_object, iterate_in_batches,
+                                    hash_raw_item)
+from ocd_backend.exceptions import (ConfigurationError, NotFound,
+                                    RunInProgress, RunStalled)
 
 logger = get_source_logger('pipeline')
 
+#: The available ways to execute the tasks of a run
+EXECUTORS = ('celery', 'local')
+
+
+def setup_pipeline(source_definition, incremental=False, executor='celery'):
+    """Starts a run of the pipeline for a source.
+
+    :param source_definition: the configuration of the source.
+    :param incremental: when ``True`` (and supported by the extractor of
+        the source), only the items that changed since the last successful
+        harvest are extracted. These are loaded into the index that is
+        currently behind the alias of the source, instead of a new index.
+    :param executor: ``celery`` to dispatch the items to Celery workers,
+        or ``local`` to process them in local processes (see
+        :class:`~ocd_backend.local_executor.LocalExecutor`). Local runs
+        can't be resumed and don't support incremental harvesting.
+    """
+    if executor not in EXECUTORS:
+        raise ConfigurationError('Unknown executor "{executor}"'
+                                 .format(executor=executor))
+
+    if executor == 'local' and incremental:
+        raise ConfigurationError('The local executor does not support '
+                                 'incremental harvesting')
 
-def setup_pipeline(source_definition):
     # index_name is an alias of the current version of the index
     index_alias = '{prefix}_{index_name}'.format(
         prefix=settings.DEFAULT_INDEX_PREFIX,
@@ -30,22 +66,15 @@ def setup_pipeline(source_definition):
         es.indices.put_alias(name=index_alias, index=index_name)
 
     # Find the current index name behind the alias specified in the config
-    try:
-        current_index_aliases = es.indices.get_alias(name=index_alias)
-    except NotFoundError:
-        raise ConfigurationError('Index with alias "{index_alias}" does '
-                                 'not exist'.format(index_alias=index_alias))
-
-    current_index_name = current_index_aliases.keys()[0]
+    current_index_name = _get_current_index_name(index_alias)
     new_index_name = '{index_alias}_{now}'.format(
         index_alias=index_alias, now=datetime.utcnow().strftime('%Y%m%d%H%M%S')
     )
 
-    extractor = load_object(source_definition['extractor'])(source_definition)
-    transformer = load_object(source_definition['transformer'])()
-    enrichers = [(load_object(enricher[0])(), enricher[1]) for enricher in
-                 source_definition['enrichers']]
-    loader = load_object(source_definition['loader'])()
+    if incremental:
+        incremental = _can_harvest_incrementally(source_definition)
+        if incremental:
+            new_index_name = current_index_name
 
     # Parameters that are passed to each task in the chain
     params = {
@@ -55,51 +84,599 @@ def setup_pipeline(source_definition):
         'index_alias': index_alias
     }
 
+    _create_new_index(params)
+
+    if incremental:
+        params['incremental'] = True
+
+    if executor == 'local':
+        logger.info('Starting local run "{run_identifier}" of source '
+                    '"{source}"'.format(run_identifier=params['run_identifier'],
+                                        source=source_definition['id']))
+
+        return _run_local_pipeline(source_definition, params)
+
+    # When a batch size is configured, a single chain carries a list of
+    # (at most) ``batch_size`` items instead of a single item
+    if source_definition.get('batch_size'):
+        params['batch'] = True
+
+    # Store the context of the run, so the tasks of the run only have to
+    # carry the run identifier, and the run can be resumed when the
+    # extraction is interrupted
+    store_run_context(source_definition, params)
+
+    logger.info('Starting run "{run_identifier}" of source "{source}"'
+                .format(run_identifier=params['run_identifier'],
+                        source=source_definition['id']))
+
+    _run_pipeline(source_definition, params)
+
+
+def _get_current_index_name(index_alias):
+    try:
+        current_index_aliases = es.indices.get_alias(name=index_alias)
+    except NotFoundError:
+        raise ConfigurationError('Index with alias "{index_alias}" does '
+                                 'not exist'.format(index_alias=index_alias))
+
+    return current_index_aliases.keys()[0]
+
+
+def _create_new_index(params):
+    """Creates the index a run loads its items into. Incremental runs load
+    items into the current index; other runs load them into a new index,
+    which doesn't serve reads until the run is finished, so refreshes and
+    replicas are disabled while the items are loaded. The values these
+    settings got from the index template are stored in the parameters of
+    the run as ``index_settings``, and are restored when the run is
+    finished (see
+    :meth:`~ocd_backend.tasks.CleanupElasticsearch.run_finished`)."""
+    if params['new_index_name'] == params['current_index_name']:
+        return
+
+    es.indices.create(index=params['new_index_name'])
+    params['index_settings'] = get_index_settings(
+        es, params['new_index_name'], settings.ES_BUILD_INDEX_SETTINGS.keys())
+
+    es.indices.put_settings(index=params['new_index_name'],
+                            body={'index': settings.ES_BUILD_INDEX_SETTINGS})
+
+
+def _remove_new_index(params):
+    """Removes the new index of a run that didn't load any items into it,
+    so runs that end (or fail) without items don't leave empty indexes
+    behind. The index is created again when the run is resumed."""
+    if params['new_index_name'] == params['current_index_name']:
+        return
+
+    logger.info('Removing index "{index}", as no items were loaded into it in '
+                'run "{run_identifier}"'
+                .format(index=params['new_index_name'],
+                        run_identifier=params['run_identifier']))
+
+    es.indices.delete(index=params['new_index_name'], ignore=404)
+
+
+def _can_harvest_incrementally(source_definition):
+    extractor = load_object(source_definition['extractor'])
+    if not extractor.supports_incremental:
+        logger.warning('The "{extractor}" extractor does not support '
+                       'incremental harvesting, doing a full harvest'
+                       .format(extractor=source_definition['extractor']))
+        return False
+
+    if not celery_app.backend.get_json(
+            last_harvest_key(source_definition['id'])):
+        logger.warning('Source "{source}" was never harvested completely, '
+                       'doing a full harvest'
+                       .format(source=source_definition['id']))
+        return False
+
+    return True
+
+
+def resume_pipeline(run_identifier):
+    """Resumes an interrupted run. Items are loaded into the same index
+    as the interrupted run. Extractors that store checkpoints (such as
+    the :class:`~ocd_backend.extractors.oai.OaiExtractor`) continue where
+    they left off, other extractors start from the beginning.
+
+    :param run_identifier: the identifier of the run to resume.
+    :raises NotFound: when the context of the run is not available.
+    """
+    context = get_run_context(run_identifier)
+
+    logger.info('Resuming run "{run_identifier}" of source "{source}"'
+                .format(run_identifier=run_identifier,
+                        source=context['source_definition']['id']))
+
+    # The new index is removed when the interrupted run didn't load any
+    # items into it
+    if not es.indices.exists(context['params']['new_index_name']):
+        _create_new_index(context['params'])
+        store_run_context(context['source_definition'], context['params'])
+
+    _run_pipeline(context['source_definition'], context['params'])
+
+
+def replay_dead_letters(run_identifier):
+    """Dispatches the items that failed in a run (see
+    :mod:`ocd_backend.dead_letters`) again. Each item re-enters the
+    pipeline at the stage that failed to process it. The items are
+    processed in a new run, which loads them into the index that is
+    currently behind the alias of the source (like an incremental run).
+
+    :param run_identifier: the identifier of the run of which the dead
+        letters are replayed.
+    :returns: the identifier of the new run.
+    :raises RunInProgress: when the run is still running.
+    :raises NotFound: when the run has no dead letters, or when the
+        context of the run is not available.
+    """
+    if celery_app.backend.get(run_identifier) == 'running':
+        raise RunInProgress('Run "{}" is still running'.format(run_identifier))
+
+    dead_letters = celery_app.backend.get_dead_letters(run_identifier)
+    if not dead_letters:
+        raise NotFound('No dead letters available for run "{}"'
+                       .format(run_identifier))
+
+    context = get_run_context(run_identifier)
+    source_definition = context['source_definition']
+
+    params = dict(context['params'])
+    params.pop('incremental', None)
+    current_index_name = _get_current_index_name(params['index_alias'])
+    params.update({
+        'run_identifier': 'pipeline_{}'.format(uuid4().hex),
+        'current_index_name': current_index_name,
+        'new_index_name': current_index_name
+    })
+    store_run_context(source_definition, params)
+
+    logger.info('Replaying {count} dead letters of run "{run_identifier}" in '
+                'run "{replay_run_identifier}"'
+                .format(count=len(dead_letters), run_identifier=run_identifier,
+                        replay_run_identifier=params['run_identifier']))
+
+    transformer = load_object(source_definition['transformer'])()
+    enrichers = [load_object(enricher[0])() for enricher in
+                 source_definition['enrichers']]
+    loader = load_object(source_definition['loader'])()
+
+    # Items that failed at the same stage are replayed together, in
+    # batches when the source defines a ``batch_size``
+    stages = OrderedDict()
+    for dead_letter in dead_letters:
+        stages.setdefault((dead_letter['stage'],
+                           dead_letter.get('enricher_index')), []).append(
+            dead_letter['item'])
+
     celery_app.backend.set(params['run_identifier'], 'running')
-    run_identifier_chains = '{}_chains'.format(params['run_identifier'])
 
+    pending_chains = []
     try:
-        for item in extractor.run():
-            # Generate an identifier for each chain, and record that in
-            # {}_chains, so that we can know for sure when all tasks
-            # from an extractor have finished
-            params['chain_id'] = uuid4().hex
-            celery_app.backend.add_value_to_set(set_name=run_identifier_chains,
-                                                value=params['chain_id'])
-
-            item_chain = chain()
-
-            # Tranform
-            item_chain |= transformer.s(
-                *item,
-                source_definition=source_definition,
-                **params
-            )
-
-            # Enrich
-            for enricher_task, enricher_settings in enrichers:
-                item_chain |= enricher_task.s(
-                    source_definition=source_definition,
-                    enricher_settings=enricher_settings,
-                    **params
+        for (stage, enricher_index), items in stages.iteritems():
+            if params.get('batch'):
+                items = ((batch,) for batch in iterate_in_batches(
+                    items, source_definition['batch_size']))
+            elif stage not in RAW_ITEM_STAGES:
+                # A transformed item is passed as a single argument
+                items = ((item,) for item in items)
+
+            for item in items:
+                pending_chains.append(_build_replay_chain(
+                    stage, enricher_index, item, source_definition,
+                    transformer, enrichers, loader, params['run_identifier']))
+
+                if len(pending_chains) >= settings.PIPELINE_DISPATCH_GROUP_SIZE:
+                    _dispatch_chains(params['run_identifier'], pending_chains)
+
+        _dispatch_chains(params['run_identifier'], pending_chains)
+    except:
+        celery_app.backend.set(params['run_identifier'], 'error')
+        raise
+
+    # Dead letters that were added while replaying (the run was not
+    # running, but chains may still have been pending) are kept
+    celery_app.backend.remove_dead_letters(run_identifier, len(dead_letters))
+
+    if celery_app.backend.mark_run_done(params['run_identifier']):
+        cleanup = load_object(source_definition['cleanup'])()
+        cleanup.finish(source_definition=source_definition, **params)
+
+    return params['run_identifier']
+
+
+def _run_pipeline(source_definition, params):
+    extractor = load_object(source_definition['extractor'])(
+        source_definition, run_identifier=params['run_identifier'],
+        incremental=params.get('incremental', False))
+    transformer = load_object(source_definition['transformer'])()
+    enrichers = [load_object(enricher[0])() for enricher in
+                 source_definition['enrichers']]
+    loader = load_object(source_definition['loader'])()
+
+    # Sources with cheap transformations can be processed by a single
+    # task per item (or batch), instead of a chain of tasks
+    fused = source_definition.get('fused', False)
+    fused_pipeline = FusedPipeline()
+
+    batch_size = source_definition.get('batch_size', 0)
+
+    # Items that didn't change since they were indexed in the current
+    # index are not sent through the pipeline again
+    unchanged_items_filter = None
+    if source_definition.get('skip_unchanged'):
+        unchanged_items_filter = UnchangedItemsFilter(params)
+
+    celery_app.backend.set(params['run_identifier'], 'running')
+
+    # Chains are dispatched in groups; the number of pending chains of the
+    # run is incremented once per group, before its chains are sent
+    pending_chains = []
+    group_size = settings.PIPELINE_DISPATCH_GROUP_SIZE
+
+    # When a maximum number of pending chains is configured, extraction is
+    # paused as long as the workers didn't process enough chains. Groups
+    # are at most half the limit, so extraction resumes while the workers
+    # still have chains to process.
+    max_pending_chains = source_definition.get('max_pending_chains', 0)
+    if max_pending_chains:
+        group_size = min(group_size, max(max_pending_chains / 2, 1))
+
+    try:
+        items = extractor.run()
+        if extractor.incremental:
+            items = _delete_items(items, loader, source_definition, params)
+
+        if unchanged_items_filter:
+            items = unchanged_items_filter.filter(items)
+
+        # Sources that set ``claim_check`` store the items on disk, and
+        # only send their keys through the broker
+        if source_definition.get('claim_check'):
+            items = spool_items(items, params['run_identifier'])
+
+        # The metrics of the extractor stage cover the items that are
+        # passed on to the transformer (so deleted and unchanged items
+        # are not counted)
+        items = measure_extraction(items, params['run_identifier'],
+                                   source_definition['id'])
+
+        if batch_size:
+            # Wrap each batch in a tuple, so it is passed to the
+            # transformer as a single argument
+            items = ((batch,) for batch in
+                     iterate_in_batches(items, batch_size))
+
+        for item in items:
+            if fused:
+                # A single task transforms, enriches and loads the item
+                item_chain = fused_pipeline.s(
+                    *item,
+                    run_identifier=params['run_identifier']
                 )
+            else:
+                item_chain = _build_chain(item, transformer, enrichers, loader,
+                                          params['run_identifier'])
+
+            pending_chains.append(item_chain)
+            if len(pending_chains) >= group_size:
+                if max_pending_chains:
+                    _wait_for_workers(params['run_identifier'],
+                                      max_pending_chains - group_size)
 
-            # Load
-            item_chain |= loader.s(
-                source_definition=source_definition,
-                **params
-            )
+                _dispatch_chains(params['run_identifier'], pending_chains)
 
-            item_chain.delay()
+        _dispatch_chains(params['run_identifier'], pending_chains)
     except:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+
         logger.error('An exception has occured in the "{extractor}" extractor. '
-                     'Deleting index "{index}" and setting status of run '
-                     'identifier "{run_identifier}" to "error".'
-                     .format(index=new_index_name,
-                             run_identifier=params['run_identifier'],
+                     'Setting status of run identifier "{run_identifier}" to '
+                     '"error". Use "./manage.py extract resume '
+                     '{run_identifier}" to resume the run.'
+                     .format(run_identifier=params['run_identifier'],
                              extractor=source_definition['extractor']))
 
         celery_app.backend.set(params['run_identifier'], 'error')
-        raise
 
-    celery_app.backend.set(params['run_identifier'], 'done')
+        # The extractor may have stored a checkpoint that covers items that
+        # weren't dispatched yet (the batches and the filter of unchanged
+        # items pass on the items they hold when the extractor fails), so
+        # a resumed run would skip them. They are dispatched before the
+        # exception is re-raised.
+        try:
+            _dispatch_chains(params['run_identifier'], pending_chains)
+            _record_reused_items(unchanged_items_filter, params)
+
+            if not celery_app.backend.get_run_items(params['run_identifier']):
+                _remove_new_index(params)
+        except Exception:
+            logger.exception('Unable to dispatch the remaining {count} chains '
+                             'or to remove the new index of run '
+                             '"{run_identifier}"'
+                             .format(count=len(pending_chains),
+                                     run_identifier=params['run_identifier']))
+
+        raise exc_type, exc_value, exc_traceback
+
+    _record_reused_items(unchanged_items_filter, params)
+
+    # When all chains already finished before the extractor did, no cleanup
+    # task will notice that the run is finished, so we finish it here. The
+    # items of the attempts before a run was resumed are stored in the
+    # backend as well, so a resumed run that didn't extract any (new) items
+    # is still finished.
+    if celery_app.backend.mark_run_done(params['run_identifier']):
+        if celery_app.backend.get_run_items(params['run_identifier']):
+            cleanup = load_object(source_definition['cleanup'])()
+            cleanup.finish(source_definition=source_definition, **params)
+        else:
+            logger.warning('The "{extractor}" extractor did not extract any '
+                           'items in run "{run_identifier}"'
+                           .format(extractor=source_definition['extractor'],
+                                   run_identifier=params['run_identifier']))
+            _remove_new_index(params)
+
+
+def _record_reused_items(unchanged_items_filter, params):
+    if not unchanged_items_filter or not unchanged_items_filter.reused_items:
+        return
+
+    logger.info('Reused {reused} unchanged items in run "{run_identifier}"'
+                .format(reused=unchanged_items_filter.reused_items,
+                        run_identifier=params['run_identifier']))
+
+    celery_app.backend.add_run_items(params['run_identifier'],
+                                     unchanged_items_filter.reused_items)
+
+
+def _run_local_pipeline(source_definition, params):
+    # Local runs don't store any state in the result backend, so the
+    # extractor doesn't get a run identifier to store checkpoints with
+    extractor = load_object(source_definition['extractor'])(source_definition)
+
+    items = extractor.run()
+
+    unchanged_items_filter = None
+    if source_definition.get('skip_unchanged'):
+        unchanged_items_filter = UnchangedItemsFilter(params)
+        items = unchanged_items_filter.filter(items)
+
+    # Local runs can't be resumed, so the new index of a failed run is
+    # removed
+    executor = LocalExecutor(source_definition, params)
+    try:
+        loaded_items = executor.run(items)
+    except:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        _remove_new_index(params)
+        raise exc_type, exc_value, exc_traceback
+
+    reused_items = 0
+    if unchanged_items_filter:
+        reused_items = unchanged_items_filter.reused_items
+
+    logger.info('Loaded {loaded} and reused {reused} items in local run '
+                '"{run_identifier}"'
+                .format(loaded=loaded_items, reused=reused_items,
+                        run_identifier=params['run_identifier']))
+
+    if executor.failed_items:
+        logger.warning('{failed} items failed in local run "{run_identifier}"'
+                       .format(failed=executor.failed_items,
+                               run_identifier=params['run_identifier']))
+
+    if loaded_items or reused_items:
+        cleanup = load_object(source_definition['cleanup'])()
+        cleanup.run_finished(source_definition=source_definition, **params)
+    else:
+        logger.warning('No items were loaded in local run "{run_identifier}"'
+                       .format(run_identifier=params['run_identifier']))
+        _remove_new_index(params)
+
+
+def _delete_items(items, loader, source_definition, params):
+    """Removes the items that were deleted at the source from the
+    storage (using the loader of the source), and passes all other items
+    on to the pipeline."""
+    for item in items:
+        if item[0] == DELETED_ITEM_CONTENT_TYPE:
+            loader.delete(item[1], source_definition=source_definition,
+                          **params)
+            continue
+
+        yield item
+
+
+class UnchangedItemsFilter(object):
+    """Filters out the extracted items that didn't change since they
+    were indexed in the current index of the source.
+
+    Each item is identified by the hash of its original data (see
+    :func:`~ocd_backend.utils.misc.hash_raw_item`), which is stored as
+    ``meta.hash`` in the indexed documents. The documents of unchanged
+    items are copied from the current index to the new index of the run,
+    without transforming and enriching the items again. The documents in
+    the combined index are left as is.
+
+    The hashes of the items are looked up in groups of
+    ``settings.PIPELINE_CHANGE_DETECTION_BATCH_SIZE`` items.
+
+    :param params: the parameters of the run.
+    """
+    def __init__(self, params):
+        self.current_index_name = params['current_index_name']
+        self.new_index_name = params['new_index_name']
+        self.reused_items = 0
+
+    def filter(self, items):
+        batch_size = settings.PIPELINE_CHANGE_DETECTION_BATCH_SIZE
+        for batch in iterate_in_batches(items, batch_size):
+            hashes = [hash_raw_item(*item) for item in batch]
+            docs = self.get_unchanged_docs(hashes)
+
+            for item_hash, item in zip(hashes, batch):
+                if item_hash not in docs:
+                    yield item
+
+            self.reuse_docs(docs.values())
+
+    def get_unchanged_docs(self, hashes):
+        """Returns the documents of the current index that have one of
+        ``hashes``, as a dict with the hash as key."""
+        result = es.search(index=self.current_index_name, doc_type='item',
+                           body={
+                               'query': {
+                                   'filtered': {
+                                       'filter': {
+                                           'terms': {'meta.hash': hashes}
+                                       }
+                                   }
+                               },
+                               'size': len(hashes)
+                           })
+
+        return dict((hit['_source']['meta']['hash'], hit)
+                    for hit in result['hits']['hits'])
+
+    def reuse_docs(self, docs):
+        """Copies the documents of unchanged items to the new index."""
+        if not docs:
+            return
+
+        # Incremental runs update the current index, which already
+        # contains the documents
+        if self.current_index_name != self.new_index_name:
+            es_helpers.bulk(es, ({
+                '_index': self.new_index_name,
+                '_type': 'item',
+                '_id': doc['_id'],
+                '_source': doc['_source']
+            } for doc in docs))
+
+        self.reused_items += len(docs)
+
+
+def _build_chain(item, transformer, enrichers, loader, run_identifier):
+    """Returns the chain of tasks that transforms, enriches and loads
+    a single item (or batch). The tasks only carry the run identifier,
+    they retrieve the source definition and the other parameters of the
+    run from the context of the run."""
+    item_chain = chain()
+
+    # Tranform
+    item_chain |= transformer.s(*item, run_identifier=run_identifier)
+
+    # Enrich
+    for enricher_index, enricher_task in enumerate(enrichers):
+        item_chain |= enricher_task.s(run_identifier=run_identifier,
+                                      enricher_index=enricher_index)
+
+    # Load
+    item_chain |= loader.s(run_identifier=run_identifier)
+
+    return item_chain
+
+
+def _build_replay_chain(stage, enricher_index, item, source_definition,
+                        transformer, enrichers, loader, run_identifier):
+    """Returns the chain of tasks that processes a dead letter (or batch
+    of dead letters), starting at the stage that failed."""
+    if stage in RAW_ITEM_STAGES:
+        if source_definition.get('fused', False):
+            return FusedPipeline().s(*item, run_identifier=run_identifier)
+
+        return _build_chain(item, transformer, enrichers, loader,
+                            run_identifier)
+
+    signatures = []
+    if stage == 'enricher':
+        for index in range(enricher_index, len(enrichers)):
+            signatures.append(enrichers[index].s(run_identifier=run_identifier,
+                                                 enricher_index=index))
+    signatures.append(loader.s(run_identifier=run_identifier))
+
+    # The first task of the chain receives the item
+    signatures[0] = signatures[0].clone(args=item)
+
+    return chain(*signatures)
+
+
+def _wait_for_workers(run_identifier, max_pending_chains):
+    """Blocks while the run has more than ``max_pending_chains`` pending
+    chains. Once the limit is exceeded, we wait until the workers have
+    drained the backlog to 3/4 of the limit before resuming, so the
+    extractor doesn't pause for every single group of chains.
+
+    :param run_identifier: the identifier of the run.
+    :param max_pending_chains: the number of pending chains the run may
+        have before the extractor is paused.
+    :raises RunStalled: when the backlog isn't drained within
+        ``settings.PIPELINE_BACKPRESSURE_MAX_WAIT`` seconds, or when the
+        status of the run is no longer ``running``.
+    """
+    pending = celery_app.backend.get_pending(run_identifier)
+    logger.debug('{pending} chains pending for run "{run_identifier}"'
+                 .format(pending=pending, run_identifier=run_identifier))
+
+    if pending <= max_pending_chains:
+        return
+
+    logger.info('Pausing extraction of run "{run_identifier}": {pending} '
+                'chains pending (limit is {limit})'
+                .format(run_identifier=run_identifier, pending=pending,
+                        limit=max_pending_chains))
+
+    paused_at = last_log = time()
+    while pending > max_pending_chains * 3 / 4:
+        sleep(settings.PIPELINE_BACKPRESSURE_POLL_INTERVAL)
+        pending = celery_app.backend.get_pending(run_identifier)
+
+        if celery_app.backend.get(run_identifier) != 'running':
+            raise RunStalled('Run "{run_identifier}" is no longer running'
+                             .format(run_identifier=run_identifier))
+
+        if time() - paused_at >= settings.PIPELINE_BACKPRESSURE_MAX_WAIT:
+            raise RunStalled('Extraction of run "{run_identifier}" was paused '
+                             'for {secs:.1f} seconds: {pending} chains pending'
+                             .format(run_identifier=run_identifier,
+                                     secs=time() - paused_at,
+                                     pending=pending))
+
+        if time() - last_log >= settings.PIPELINE_BACKPRESSURE_LOG_INTERVAL:
+            logger.info('Extraction of run "{run_identifier}" is paused: '
+                        '{pending} chains pending'
+                        .format(run_identifier=run_identifier,
+                                pending=pending))
+            last_log = time()
+
+    logger.info('Resuming extraction of run "{run_identifier}" after {secs:.1f}'
+                ' seconds: {pending} chains pending'
+                .format(run_identifier=run_identifier, pending=pending,
+                        secs=time() - paused_at))
+
+
+def _dispatch_chains(run_identifier, chains):
+    """Sends ``chains`` to the broker, after incrementing the number of
+    pending chains of the run with a single call to the result backend.
+
+    :param run_identifier: the identifier of the run the chains belong to.
+    :param chains: the list of chains to dispatch; it is emptied after
+        the chains are sent.
+    :returns: the number of dispatched chains.
+    """
+    if not chains:
+        return 0
+
+    celery_app.backend.increment_pending(run_identifier, len(chains))
+    for item_chain in chains:
+        item_chain.delay()
+
+    dispatched = len(chains)
+    del chains[:]
+
+    return dispatched
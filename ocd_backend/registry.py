@@ -0,0 +1,106 @@
+import os
+from time import time
+
+from ocd_backend import settings
+from ocd_backend.log import get_source_logger
+from ocd_backend.utils.http import create_http_session
+from ocd_backend.utils.misc import load_object
+
+log = get_source_logger('registry')
+
+
+class WorkerRegistry(object):
+    """Keeps the objects that are expensive to set up, but can be reused
+    for all items of a source, for the lifetime of a worker process: item
+    classes, task instances and HTTP sessions (with their pools of
+    keep-alive connections).
+
+    The registry is cleared when the sources config file
+    (``settings.SOURCES_CONFIG_FILE``) is modified; this is checked at
+    most once every ``settings.REGISTRY_CHECK_INTERVAL`` seconds. Use
+    :meth:`invalidate` to clear it explicitly.
+    """
+    def __init__(self, sources_config_file=None):
+        self.sources_config_file = (sources_config_file or
+                                    settings.SOURCES_CONFIG_FILE)
+
+        self._objects = {}
+        self._http_sessions = {}
+        self._sources_config_mtime = self._get_sources_config_mtime()
+        self._last_check = time()
+
+    def _get_sources_config_mtime(self):
+        try:
+            return os.path.getmtime(self.sources_config_file)
+        except OSError:
+            return None
+
+    def _check_sources_config(self):
+        if time() - self._last_check < settings.REGISTRY_CHECK_INTERVAL:
+            return
+        self._last_check = time()
+
+        mtime = self._get_sources_config_mtime()
+        if mtime != self._sources_config_mtime:
+            log.info('Sources config %s was modified, clearing registry'
+                     % self.sources_config_file)
+            self.invalidate()
+            self._sources_config_mtime = mtime
+
+    def _get(self, key, create):
+        self._check_sources_config()
+
+        if key not in self._objects:
+            self._objects[key] = create()
+
+        return self._objects[key]
+
+    def get_item_class(self, source_definition):
+        """Returns the item class of a source."""
+        path = source_definition['item']
+        return self._get(('item', source_definition['id'], path),
+                         lambda: load_object(path))
+
+    def get_task(self, path):
+        """Returns an instance of the task class at ``path``."""
+        return self._get(('task', path), lambda: load_object(path)())
+
+    def get_http_session(self, source_id, pool_maxsize=None,
+                         adapter_retries=True):
+        """Returns the HTTP session that is used for the media (and other
+        resources) of a source. A session is kept for each pool size that
+        is requested, so a task that needs a larger pool (such as an
+        enricher with ``http_pool_maxsize``) gets one, even when a session
+        with the default pool was set up first. Sessions without retries
+        (see :func:`~ocd_backend.utils.http.create_http_session`) are kept
+        separately."""
+        self._check_sources_config()
+
+        key = (source_id, pool_maxsize or settings.HTTP_POOL_MAXSIZE,
+               adapter_retries)
+        if key not in self._http_sessions:
+            self._http_sessions[key] = create_http_session(
+                pool_maxsize=key[1], adapter_retries=adapter_retries)
+
+        return self._http_sessions[key]
+
+    def invalidate(self, source_id=None):
+        """Clears the registry, or only the HTTP session and item class of
+        ``source_id``. The cleared objects are set up again when they are
+        requested."""
+        if source_id is None:
+            self._objects.clear()
+            session_keys = self._http_sessions.keys()
+        else:
+            for key in self._objects.keys():
+                if key[0] == 'item' and key[1] == source_id:
+                    del self._objects[key]
+            session_keys = [key for key in self._http_sessions
+                            if key[0] == source_id]
+
+        for session_key in session_keys:
+            self._http_sessions.pop(session_key).close()
+
+
+#: The registry of the current worker process
+registry = WorkerRegistry()
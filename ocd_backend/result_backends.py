@@ -1,4 +1,11 @@
+import json
+
 from celery.backends.redis import RedisBackend
+from kombu.utils import cached_property
+
+from ocd_backend import settings
+from ocd_backend.serializers import encoder, decoder
+from ocd_backend.utils import json_encoder
 
 
 class OCDBackendMixin(object):
@@ -34,6 +41,52 @@ class OCDBackendMixin(object):
         """Remove `key`"""
         raise NotImplementedError('Subclass should implement `remove` method')
 
+    def get_json(self, key):
+        """Get the JSON encoded value of `key`"""
+        raise NotImplementedError('Subclass should implement `get_json` '
+                                  'method')
+
+    def set_json(self, key, value, ttl=None):
+        """Set `key` to the JSON encoded `value`, which expires after `ttl`
+        seconds (if provided)"""
+        raise NotImplementedError('Subclass should implement `set_json` '
+                                  'method')
+
+    def record_metrics(self, run_identifier, source_id, stages):
+        """Add the metrics of `stages` (a dict of stage names and metrics,
+        see `ocd_backend.metrics.StageMetrics.to_dict`) to the metrics of
+        `run_identifier`"""
+        raise NotImplementedError('Subclass should implement '
+                                  '`record_metrics` method')
+
+    def get_metrics(self, run_identifier):
+        """Get the metrics of `run_identifier`, as a dict containing the
+        `source` and the metrics of each stage in `stages`"""
+        raise NotImplementedError('Subclass should implement `get_metrics` '
+                                  'method')
+
+    def add_dead_letters(self, run_identifier, dead_letters):
+        """Append `dead_letters` (a list of dicts, see
+        `ocd_backend.dead_letters`) to the dead letters of
+        `run_identifier`"""
+        raise NotImplementedError('Subclass should implement '
+                                  '`add_dead_letters` method')
+
+    def get_dead_letters(self, run_identifier):
+        """Get the list of dead letters of `run_identifier`"""
+        raise NotImplementedError('Subclass should implement '
+                                  '`get_dead_letters` method')
+
+    def count_dead_letters(self, run_identifier):
+        """Get the number of dead letters of `run_identifier`"""
+        raise NotImplementedError('Subclass should implement '
+                                  '`count_dead_letters` method')
+
+    def remove_dead_letters(self, run_identifier, count):
+        """Remove the first `count` dead letters of `run_identifier`"""
+        raise NotImplementedError('Subclass should implement '
+                                  '`remove_dead_letters` method')
+
     def add_value_to_set(self, set_name, value):
         """Add `value` to `set_name`"""
         raise NotImplementedError('Subclass should implement `add_to_set` '
@@ -52,8 +105,239 @@ class OCDBackendMixin(object):
     def update_ttl(self, key, ttl=300):
         """Extend the TTL of `key` with `ttl` seconds"""
 
+    def increment_pending(self, run_identifier, amount=1):
+        """Increment the number of pending chains of `run_identifier` with
+        `amount`, and add `amount` to the items of the run (see
+        `get_run_items`)"""
+        raise NotImplementedError('Subclass should implement `increment_pen'
+                                  'ding` method')
+
+    def add_run_items(self, run_identifier, amount):
+        """Add `amount` to the number of items that were dispatched or
+        reused in `run_identifier`, including the items of the attempts
+        before the run was resumed"""
+        raise NotImplementedError('Subclass should implement `add_run_items`'
+                                  ' method')
+
+    def get_run_items(self, run_identifier):
+        """Get the number of items that were dispatched or reused in
+        `run_identifier`"""
+        raise NotImplementedError('Subclass should implement `get_run_items`'
+                                  ' method')
+
+    def decrement_pending(self, run_identifier):
+        """Decrement the number of pending chains of `run_identifier`.
+        Returns `True` exactly once: when no chains are pending anymore
+        and the run is marked as done"""
+        raise NotImplementedError('Subclass should implement `decrement_pen'
+                                  'ding` method')
+
+    def get_pending(self, run_identifier):
+        """Get the number of pending chains of `run_identifier`"""
+        raise NotImplementedError('Subclass should implement `get_pending` '
+                                  'method')
+
+    def mark_run_done(self, run_identifier):
+        """Set the status of `run_identifier` to 'done'. Returns `True`
+        exactly once: when no chains of the run are pending anymore"""
+        raise NotImplementedError('Subclass should implement `mark_run_done`'
+                                  ' method')
+
+
+# KEYS: the run status, the number of pending chains and the 'finished'
+#       flag of a run
+# ARGV: the TTL of the keys and the status of a run that is done
+DECREMENT_PENDING_SCRIPT = """
+local pending = redis.call('DECR', KEYS[2])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+if pending <= 0 and redis.call('GET', KEYS[1]) == ARGV[2] then
+    if redis.call('SETNX', KEYS[3], 1) == 1 then
+        redis.call('EXPIRE', KEYS[3], ARGV[1])
+        return 1
+    end
+end
+return 0
+"""
+
+MARK_RUN_DONE_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if tonumber(redis.call('GET', KEYS[2]) or '0') <= 0 then
+    if redis.call('SETNX', KEYS[3], 1) == 1 then
+        redis.call('EXPIRE', KEYS[3], ARGV[1])
+        return 1
+    end
+end
+return 0
+"""
+
+# KEYS: the metrics of a run
+# ARGV: for each stage, the fields and values of its first and last
+#       timestamp; the earliest first and the latest last timestamp are kept
+RECORD_TIMESTAMPS_SCRIPT = """
+for i = 1, #ARGV, 4 do
+    local first = redis.call('HGET', KEYS[1], ARGV[i])
+    if not first or tonumber(ARGV[i + 1]) < tonumber(first) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    local last = redis.call('HGET', KEYS[1], ARGV[i + 2])
+    if not last or tonumber(ARGV[i + 3]) > tonumber(last) then
+        redis.call('HSET', KEYS[1], ARGV[i + 2], ARGV[i + 3])
+    end
+end
+return 0
+"""
+
 
 class OCDRedisBackend(RedisBackend, OCDBackendMixin):
+    """Redis result backend that tracks the completion of pipeline runs.
+
+    Each dispatched chain increments a counter of pending chains, each
+    finished chain decrements it. The decrement and the check whether the
+    run is finished are done atomically by a Lua script, which makes sure
+    a run is reported as finished exactly once.
+    """
+    run_done_status = 'done'
+
+    @cached_property
+    def _decrement_pending_script(self):
+        return self.client.register_script(DECREMENT_PENDING_SCRIPT)
+
+    @cached_property
+    def _mark_run_done_script(self):
+        return self.client.register_script(MARK_RUN_DONE_SCRIPT)
+
+    @cached_property
+    def _record_timestamps_script(self):
+        return self.client.register_script(RECORD_TIMESTAMPS_SCRIPT)
+
+    def _run_keys(self, run_identifier):
+        return [
+            run_identifier,
+            '{}_pending'.format(run_identifier),
+            '{}_finished'.format(run_identifier)
+        ]
+
+    def _run_ttl(self):
+        return settings.CELERY_CONFIG.get('CELERY_TASK_RESULT_EXPIRES', 1800)
+
+    def increment_pending(self, run_identifier, amount=1):
+        pending_key = '{}_pending'.format(run_identifier)
+        items_key = '{}_items'.format(run_identifier)
+
+        pipe = self.client.pipeline()
+        pipe.incrby(pending_key, amount)
+        pipe.expire(pending_key, self._run_ttl())
+        # Unlike the number of pending chains, the number of items has to
+        # last as long as the run can be resumed
+        pipe.incrby(items_key, amount)
+        pipe.expire(items_key, settings.PIPELINE_RUN_STATE_TTL)
+        pipe.execute()
+
+    def add_run_items(self, run_identifier, amount):
+        items_key = '{}_items'.format(run_identifier)
+
+        pipe = self.client.pipeline()
+        pipe.incrby(items_key, amount)
+        pipe.expire(items_key, settings.PIPELINE_RUN_STATE_TTL)
+        pipe.execute()
+
+    def get_run_items(self, run_identifier):
+        return int(self.client.get('{}_items'.format(run_identifier)) or 0)
+
+    def decrement_pending(self, run_identifier):
+        return self._decrement_pending_script(
+            keys=self._run_keys(run_identifier),
+            args=[self._run_ttl(), self.run_done_status]
+        ) == 1
+
+    def get_pending(self, run_identifier):
+        return int(self.client.get('{}_pending'.format(run_identifier)) or 0)
+
+    def mark_run_done(self, run_identifier):
+        return self._mark_run_done_script(
+            keys=self._run_keys(run_identifier),
+            args=[self._run_ttl(), self.run_done_status]
+        ) == 1
+
+    def record_metrics(self, run_identifier, source_id, stages):
+        # The metrics of a run are stored in a single hash, with fields
+        # such as 'transformer|count' and 'transformer|bucket|3'
+        metrics_key = '{}_metrics'.format(run_identifier)
+
+        # Workers flush their metrics in any order, so the first and last
+        # timestamps of a stage are compared with the stored ones by a
+        # script (timestamps are passed with repr, which keeps their
+        # precision)
+        timestamps = []
+
+        pipe = self.client.pipeline()
+        pipe.hset(metrics_key, 'source', source_id)
+        for stage, metrics in stages.iteritems():
+            pipe.hincrby(metrics_key, '%s|count' % stage, metrics['count'])
+            pipe.hincrby(metrics_key, '%s|errors' % stage, metrics['errors'])
+            pipe.hincrbyfloat(metrics_key, '%s|seconds' % stage,
+                              metrics['seconds'])
+            for bucket, count in enumerate(metrics['buckets']):
+                if count:
+                    pipe.hincrby(metrics_key, '%s|bucket|%d' % (stage, bucket),
+                                 count)
+            timestamps.extend(['%s|first' % stage, repr(metrics['first']),
+                               '%s|last' % stage, repr(metrics['last'])])
+        self._record_timestamps_script(keys=[metrics_key], args=timestamps,
+                                       client=pipe)
+        pipe.expire(metrics_key, settings.PIPELINE_RUN_STATE_TTL)
+        pipe.execute()
+
+    def get_metrics(self, run_identifier):
+        fields = self.client.hgetall('{}_metrics'.format(run_identifier))
+        if not fields:
+            return None
+
+        buckets = len(settings.METRICS_LATENCY_BUCKETS) + 1
+        metrics = {'source': None, 'stages': {}}
+        for field, value in fields.iteritems():
+            if field == 'source':
+                metrics['source'] = value
+                continue
+
+            parts = field.split('|')
+            stage = metrics['stages'].setdefault(parts[0], {
+                'count': 0, 'errors': 0, 'seconds': 0.0,
+                'buckets': [0] * buckets, 'first': None, 'last': None
+            })
+
+            if parts[1] == 'bucket':
+                stage['buckets'][int(parts[2])] = int(value)
+            elif parts[1] in ('count', 'errors'):
+                stage[parts[1]] = int(value)
+            else:
+                stage[parts[1]] = float(value)
+
+        return metrics
+
+    def add_dead_letters(self, run_identifier, dead_letters):
+        # Dead letters contain documents with datetimes, so they are
+        # serialized like task messages
+        dead_letters_key = '{}_dead_letters'.format(run_identifier)
+
+        pipe = self.client.pipeline()
+        pipe.rpush(dead_letters_key,
+                   *[encoder(dead_letter) for dead_letter in dead_letters])
+        pipe.expire(dead_letters_key, settings.PIPELINE_RUN_STATE_TTL)
+        pipe.execute()
+
+    def get_dead_letters(self, run_identifier):
+        return [decoder(dead_letter) for dead_letter in self.client.lrange(
+            '{}_dead_letters'.format(run_identifier), 0, -1)]
+
+    def count_dead_letters(self, run_identifier):
+        return self.client.llen('{}_dead_letters'.format(run_identifier))
+
+    def remove_dead_letters(self, run_identifier, count):
+        # Dead letters that were added after the first `count` are kept
+        self.client.ltrim('{}_dead_letters'.format(run_identifier), count, -1)
 
     def add_value_to_set(self, set_name, value):
         self.client.sadd(set_name, value)
@@ -70,5 +354,21 @@ class OCDRedisBackend(RedisBackend, OCDBackendMixin):
     def remove(self, key):
         return self.client.delete(key)
 
+    def get_json(self, key):
+        value = self.client.get(key)
+        if value is None:
+            return None
+
+        return json.loads(value)
+
+    def set_json(self, key, value, ttl=None):
+        value = json_encoder.encode(value)
+        if ttl:
+            # Keyword arguments, as the order of the arguments differs
+            # between the Redis and StrictRedis clients
+            return self.client.setex(name=key, time=ttl, value=value)
+
+        return self.client.set(key, value)
+
     def update_ttl(self, key, ttl=300):
         return self.client.expire(key, ttl)
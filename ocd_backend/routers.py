@@ -0,0 +1,45 @@
+from ocd_backend import celery_app
+from ocd_backend import settings
+from ocd_backend.utils.misc import load_object
+
+
+class PipelineStageRouter(object):
+    """Routes the tasks of the pipeline to the queue of their stage, as
+    defined in ``settings.PIPELINE_STAGE_QUEUES``. Source specific tasks
+    are routed by the base class they inherit from, so new transformers,
+    enrichers and loaders don't need any configuration."""
+
+    def __init__(self):
+        self._stage_classes = None
+        self._routes = {}
+
+    @property
+    def stage_classes(self):
+        if self._stage_classes is None:
+            self._stage_classes = [(load_object(path), queue) for path, queue
+                                   in settings.PIPELINE_STAGE_QUEUES]
+        return self._stage_classes
+
+    def get_queue(self, task_name):
+        """Returns the queue of the stage of a task, or ``None`` when the
+        task doesn't belong to a stage of the pipeline."""
+        if task_name not in self._routes:
+            task = celery_app.tasks.get(task_name)
+            if task is None:
+                # Don't cache; the task may be registered later on
+                return None
+
+            self._routes[task_name] = None
+            for stage_class, queue in self.stage_classes:
+                if isinstance(task, stage_class):
+                    self._routes[task_name] = queue
+                    break
+
+        return self._routes[task_name]
+
+    def route_for_task(self, task, args=None, kwargs=None):
+        queue = self.get_queue(task)
+        if queue is None:
+            return None
+
+        return {'queue': queue}
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+
+from ocd_backend import celery_app
+from ocd_backend import settings
+from ocd_backend.exceptions import NotFound
+
+# The contexts that were retrieved by this worker, the most recently used
+# context last
+_contexts = OrderedDict()
+
+
+def context_key(run_identifier):
+    """Returns the key under which the context of a run is stored."""
+    return '{}_context'.format(run_identifier)
+
+
+def store_run_context(source_definition, params):
+    """Stores the context of a run in the result backend: the source
+    definition and the parameters that are shared by all tasks of the
+    run. Tasks only carry the run identifier, and retrieve the context
+    with :func:`get_run_context`.
+
+    :param source_definition: the configuration of the source.
+    :param params: the parameters of the run, including the
+        ``run_identifier``.
+    """
+    celery_app.backend.set_json(
+        context_key(params['run_identifier']),
+        {'source_definition': source_definition, 'params': params},
+        ttl=settings.PIPELINE_RUN_STATE_TTL
+    )
+
+
+def get_run_context(run_identifier):
+    """Returns the context of a run. Contexts don't change during a run,
+    so each worker keeps the ``settings.RUN_CONTEXT_CACHE_SIZE`` most
+    recently used contexts in memory.
+
+    :param run_identifier: the identifier of the run.
+    :raises NotFound: when the context of the run is not available.
+    """
+    if run_identifier in _contexts:
+        context = _contexts.pop(run_identifier)
+    else:
+        context = celery_app.backend.get_json(context_key(run_identifier))
+        if not context:
+            raise NotFound('No context available for run "{}"'
+                           .format(run_identifier))
+
+    _contexts[run_identifier] = context
+    while len(_contexts) > settings.RUN_CONTEXT_CACHE_SIZE:
+        _contexts.popitem(last=False)
+
+    return context
+
+
+def expand_task_kwargs(kwargs):
+    """Returns the kwargs of a task, completed with the context of its
+    run. Tasks dispatched by the pipeline only receive the
+    ``run_identifier`` (and enrichers the ``enricher_index`` of their
+    settings in the source definition); tasks that are called with a
+    ``source_definition`` are expected to receive all parameters, and
+    their kwargs are returned as is.
+
+    :param kwargs: the kwargs the task was called with.
+    """
+    if 'source_definition' in kwargs:
+        return kwargs
+
+    context = get_run_context(kwargs['run_identifier'])
+
+    expanded = dict(context['params'])
+    expanded.update(kwargs)
+    expanded['source_definition'] = context['source_definition']
+
+    if 'enricher_index' in kwargs:
+        enricher = context['source_definition']['enrichers'][
+            kwargs['enricher_index']]
+        expanded['enricher_settings'] = enricher[1]
+
+    return expanded
@@ -1,8 +1,28 @@
 import datetime
+import struct
+import zlib
+
 import msgpack
 
+# Marks a compressed payload. 0xc1 is never used by msgpack, so the
+# payload of a message that was serialized by ``encoder`` can't start with
+# it.
+COMPRESSED_PREFIX = b'\xc1'
+
+# The msgpack extension type of datetimes, which are packed as the number
+# of microseconds since the epoch (as a big-endian signed 64-bit integer)
+DATETIME_EXT_TYPE = 1
+DATETIME_STRUCT = struct.Struct('>q')
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Datetimes used to be encoded as a dict containing this key; documents
+# that contain it are decoded with ``decode_datetime``
+LEGACY_DATETIME_MARKER = b'__datetime__'
+
 
 def decode_datetime(obj):
+    """Decodes a datetime in the legacy ``{'__datetime__': True, 'as_str':
+    <isoformat>}`` form."""
     if b'__datetime__' in obj:
         try:
             obj = datetime.datetime.strptime(obj['as_str'], '%Y-%m-%dT%H:%M:%S.%f')
@@ -12,9 +32,24 @@ def decode_datetime(obj):
 
 
 def encode_datetime(obj):
+    """Encodes a datetime as a ``DATETIME_EXT_TYPE`` extension type.
+    Timezone aware datetimes are converted to UTC; all datetimes are
+    decoded as naive datetimes."""
     if isinstance(obj, datetime.datetime):
-        return {'__datetime__': True, 'as_str': obj.isoformat()}
-    return obj
+        if obj.tzinfo is not None:
+            obj = obj.replace(tzinfo=None) - obj.utcoffset()
+        delta = obj - EPOCH
+        return msgpack.ExtType(DATETIME_EXT_TYPE, DATETIME_STRUCT.pack(
+            delta.days * 86400000000 + delta.seconds * 1000000 +
+            delta.microseconds))
+    raise TypeError('Unable to serialize %r' % obj)
+
+
+def decode_ext(code, data):
+    if code == DATETIME_EXT_TYPE:
+        return EPOCH + datetime.timedelta(
+            microseconds=DATETIME_STRUCT.unpack(data)[0])
+    return msgpack.ExtType(code, data)
 
 
 def encoder(obj):
@@ -30,8 +65,46 @@ def encoder(obj):
 def decoder(obj):
     """
     Reverse of ``encode``; decode objects that was serialized using ``encoder``
+    (including those that contain datetimes in the legacy dict form)
 
     :param obj: binary msgpack
     :return: dict
     """
-    return msgpack.unpackb(obj, object_hook=decode_datetime)
+    # Only documents that contain legacy datetimes pay for calling the
+    # object hook on each decoded dict
+    if LEGACY_DATETIME_MARKER in obj:
+        return msgpack.unpackb(obj, ext_hook=decode_ext,
+                               object_hook=decode_datetime)
+    return msgpack.unpackb(obj, ext_hook=decode_ext)
+
+
+def compressing_encoder(threshold, level=1):
+    """
+    Returns an encoder that works like ``encoder``, but compresses the
+    msgpack document with zlib when it is at least ``threshold`` bytes
+    (e.g. items that contain a complete XML record). Compressed documents
+    are prefixed with ``COMPRESSED_PREFIX``.
+
+    :param threshold: the minimal size (in bytes) of a document to compress
+    :param level: the zlib compression level
+    :return: encoder function
+    """
+    def encode(obj):
+        document = encoder(obj)
+        if len(document) < threshold:
+            return document
+        return COMPRESSED_PREFIX + zlib.compress(document, level)
+    return encode
+
+
+def compressed_decoder(obj):
+    """
+    Reverse of the encoders returned by ``compressing_encoder``; also
+    decodes documents that were serialized using ``encoder``
+
+    :param obj: binary msgpack, or a compressed binary msgpack
+    :return: dict
+    """
+    if obj[:1] == COMPRESSED_PREFIX:
+        obj = zlib.decompress(obj[1:])
+    return decoder(obj)
@@ -1,16 +1,37 @@
 import os
 
+from kombu import Queue
+
 # Register custom serializer for Celery that allows for encoding and decoding
 # Python datetime objects (and potentially other ones)
 from kombu.serialization import register
-from serializers import encoder, decoder
+from serializers import (encoder, decoder, compressing_encoder,
+                         compressed_decoder)
 
 register('ocd_serializer', encoder, decoder, content_encoding='binary',
          content_type='application/ocd-msgpack')
 
+# Serializer that compresses messages of at least
+# TASK_COMPRESSION_THRESHOLD bytes with zlib, at TASK_COMPRESSION_LEVEL
+# (1 is the fastest level; verbose XML records already shrink to about a
+# quarter of their size at this level). Run ``python -m
+# benchmarks.serializers`` to compare the serializers on the test dumps.
+# To use it, set CELERY_CONFIG['CELERY_TASK_SERIALIZER'] to
+# 'ocd_zlib_serializer' in local_settings.py (after importing CELERY_CONFIG
+# from this module). Both serializers are in CELERY_ACCEPT_CONTENT, so the
+# messages that are already queued can be consumed after switching.
+TASK_COMPRESSION_THRESHOLD = 1024
+TASK_COMPRESSION_LEVEL = 1
+
+register('ocd_zlib_serializer',
+         compressing_encoder(TASK_COMPRESSION_THRESHOLD,
+                             TASK_COMPRESSION_LEVEL),
+         compressed_decoder, content_encoding='binary',
+         content_type='application/ocd-msgpack-zlib')
+
 CELERY_CONFIG = {
     'BROKER_URL': 'redis://127.0.0.1:6379/0',
-    'CELERY_ACCEPT_CONTENT': ['ocd_serializer'],
+    'CELERY_ACCEPT_CONTENT': ['ocd_serializer', 'ocd_zlib_serializer'],
     'CELERY_TASK_SERIALIZER': 'ocd_serializer',
     'CELERY_RESULT_SERIALIZER': 'ocd_serializer',
     'CELERY_RESULT_BACKEND': 'ocd_backend.result_backends:OCDRedisBackend+redis://127.0.0.1:6379/0',
@@ -18,9 +39,101 @@ CELERY_CONFIG = {
     'CELERY_DISABLE_RATE_LIMITS': True,
     # Expire results after 30 minutes; otherwise Redis will keep
     # claiming memory for a day
-    'CELERY_TASK_RESULT_EXPIRES': 1800
+    'CELERY_TASK_RESULT_EXPIRES': 1800,
+    # Each stage of the pipeline has its own queue (see
+    # PIPELINE_STAGE_QUEUES), so workers can be scaled per stage. Tasks
+    # that don't belong to a stage are sent to the default 'celery' queue.
+    'CELERY_QUEUES': (
+        Queue('celery', routing_key='celery'),
+        Queue('transform', routing_key='transform'),
+        Queue('enrich', routing_key='enrich'),
+        Queue('load', routing_key='load'),
+        Queue('cleanup', routing_key='cleanup'),
+    ),
+    'CELERY_ROUTES': ('ocd_backend.routers.PipelineStageRouter',)
 }
 
+# The queue to which the tasks of each stage of the pipeline are routed;
+# tasks are matched by the base class they inherit from
+PIPELINE_STAGE_QUEUES = [
+    ('ocd_backend.transformers.BaseTransformer', 'transform'),
+    ('ocd_backend.enrichers.BaseEnricher', 'enrich'),
+    ('ocd_backend.loaders.BaseLoader', 'load'),
+    ('ocd_backend.tasks.FusedPipeline', 'transform'),
+    ('ocd_backend.tasks.BaseCleanup', 'cleanup'),
+]
+
+# The Celery settings of workers that consume the queue of a single stage
+# (``-Q <stage>``). A worker uses the settings of the stage in the
+# OCD_WORKER_STAGE environment variable (see conf/supervisor.conf).
+# Transforms and loads are CPU-bound, so they get a process per core and
+# a few prefetched messages each; enrichers mostly wait on the network, so
+# they get many processes that only reserve the message they work on.
+CELERY_STAGE_CONFIG = {
+    'transform': {
+        'CELERYD_CONCURRENCY': 4,
+        'CELERYD_PREFETCH_MULTIPLIER': 4
+    },
+    'enrich': {
+        'CELERYD_CONCURRENCY': 16,
+        'CELERYD_PREFETCH_MULTIPLIER': 1
+    },
+    'load': {
+        'CELERYD_CONCURRENCY': 2,
+        'CELERYD_PREFETCH_MULTIPLIER': 4
+    },
+    'cleanup': {
+        'CELERYD_CONCURRENCY': 1,
+        'CELERYD_PREFETCH_MULTIPLIER': 1
+    }
+}
+
+# The number of chains the pipeline dispatches at once; the number of
+# pending chains of a run is updated once for each group
+PIPELINE_DISPATCH_GROUP_SIZE = 100
+
+# The number of seconds the context and checkpoints of a run are kept,
+# which is the period in which an interrupted run can be resumed
+PIPELINE_RUN_STATE_TTL = 7 * 24 * 60 * 60
+
+# The number of run contexts (source definition and parameters of a run)
+# each worker keeps in memory
+RUN_CONTEXT_CACHE_SIZE = 32
+
+# When a source defines ``max_pending_chains``, the extractor is paused
+# while the run has too many pending chains. These are the number of
+# seconds between checks of the number of pending chains, and between
+# log messages that report it while extraction is paused. The run fails
+# when extraction is paused for longer than PIPELINE_BACKPRESSURE_MAX_WAIT
+# seconds (for example because no workers are running).
+PIPELINE_BACKPRESSURE_POLL_INTERVAL = 1
+PIPELINE_BACKPRESSURE_LOG_INTERVAL = 30
+PIPELINE_BACKPRESSURE_MAX_WAIT = 6 * 60 * 60
+
+# The number of extracted items of which the hashes are looked up at once,
+# when unchanged items are skipped (the ``skip_unchanged`` option of a
+# source)
+PIPELINE_CHANGE_DETECTION_BATCH_SIZE = 500
+
+# Settings of the local executor, which runs the pipeline in local processes
+# instead of Celery workers: the number of worker processes (defaults to
+# the number of CPUs), the number of items in a batch (unless a source
+# defines a ``batch_size``), and the number of batches each queue between
+# the stages of the pipeline can hold
+LOCAL_EXECUTOR_PROCESSES = None
+LOCAL_EXECUTOR_BATCH_SIZE = 100
+LOCAL_EXECUTOR_QUEUE_SIZE = 10
+# The number of seconds the local executor waits for processed batches,
+# before it checks whether its worker processes are still alive
+LOCAL_EXECUTOR_POLL_INTERVAL = 1
+
+# The upper bounds (in seconds) of the buckets of the histograms of the time
+# it took each stage of the pipeline to process an item, and the number of
+# seconds between writes of the metrics of the extractor to the backend
+METRICS_LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                           0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+METRICS_FLUSH_INTERVAL = 5
+
 LOGGING = {
     'version': 1,
     'formatters': {
@@ -54,11 +167,38 @@ LOGGING = {
 ELASTICSEARCH_HOST = '127.0.0.1'
 ELASTICSEARCH_PORT = 9200
 
+# The number of documents (or bytes) the BulkElasticsearchLoader collects
+# before sending a bulk request; can be overridden per source with the
+# ``bulk_flush_docs`` and ``bulk_flush_bytes`` options
+ES_BULK_FLUSH_DOCS = 500
+ES_BULK_FLUSH_BYTES = 5 * 1024 * 1024
+
+# The index settings of a new index while the pipeline is loading items into
+# it (it doesn't serve any reads until the alias is swapped). When the run is
+# finished, these settings are restored to the values the index got from the
+# index template.
+ES_BUILD_INDEX_SETTINGS = {
+    'refresh_interval': '-1',
+    'number_of_replicas': 0
+}
+
+# When set, a new index is optimized (force merged) to at most this number
+# of segments before the alias is swapped; can be overridden per source with
+# the ``optimize_max_num_segments`` option. The optimize request waits for
+# the merge to finish, for at most ES_OPTIMIZE_TIMEOUT seconds.
+ES_OPTIMIZE_MAX_NUM_SEGMENTS = None
+ES_OPTIMIZE_TIMEOUT = 60 * 60
+
 ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
 
 # The path of the directory used to store temporary files
 TEMP_DIR_PATH = os.path.join(ROOT_PATH, 'temp')
 
+# The path of the directory in which the raw items of runs of sources that
+# set ``claim_check`` are stored; it should be shared by the machine that
+# runs the extractor and the workers that run the transformers
+SPOOL_DIR_PATH = os.path.join(ROOT_PATH, 'spool')
+
 # The path of the JSON file containing the sources config
 SOURCES_CONFIG_FILE = os.path.join(ROOT_PATH, 'sources.json')
 
@@ -74,6 +214,20 @@ RESOLVER_URL_INDEX = 'ocd_resolver'
 # The User-Agent that is used when retrieving data from external sources
 USER_AGENT = 'OpenCultuurData/0.1 (+http://www.opencultuurdata.nl/)'
 
+# The number of keep-alive connections to a single host an HTTP session
+# keeps in its pool
+HTTP_POOL_MAXSIZE = 10
+
+# The number of times a request that got a 429 or 5xx response (or that
+# failed to connect) is retried by get_with_retries, and the number of
+# seconds before the first retry (doubled for each following retry)
+HTTP_RETRIES = 5
+HTTP_RETRY_BACKOFF = 1
+
+# The number of seconds between checks whether the sources config file was
+# modified, which clears the objects workers cache per source
+REGISTRY_CHECK_INTERVAL = 10
+
 # Allow any settings to be defined in local_settings.py which should be
 # ignored in your version control system allowing for settings to be
 # defined per machine.
@@ -0,0 +1,91 @@
+import errno
+import os
+import shutil
+
+from ocd_backend import settings
+from ocd_backend.utils.misc import hash_raw_item
+
+#: The content-type of an item that is stored in the spool of its run; the
+#: data of such an item is its key in the spool
+SPOOLED_ITEM_CONTENT_TYPE = 'application/x-ocd-spooled'
+
+
+class ItemSpool(object):
+    """Content-addressed storage of the raw items of a run, on disk.
+
+    Sources that set ``claim_check`` don't send the extracted items through
+    the broker: the pipeline writes each item to the spool, and the chain of
+    the item only carries a ``(SPOOLED_ITEM_CONTENT_TYPE, key)`` tuple. The
+    transformer reads the item from the spool when it processes it. The
+    spool of a run is removed by the cleanup task when the run is finished.
+
+    Items are stored in ``settings.SPOOL_DIR_PATH``, which should be on a
+    filesystem that is shared with the workers that run the transformers.
+
+    :param run_identifier: the identifier of the run.
+    :param spool_dir: the directory that contains the spools of all runs;
+        defaults to ``settings.SPOOL_DIR_PATH``.
+    """
+    def __init__(self, run_identifier, spool_dir=None):
+        self.path = os.path.join(spool_dir or settings.SPOOL_DIR_PATH,
+                                 run_identifier)
+
+    def item_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def put(self, raw_item_content_type, raw_item):
+        """Stores an item, and returns its key. Byte-identical items are
+        stored once.
+
+        :param raw_item_content_type: the content-type of the item.
+        :param raw_item: the data of the item (as a string).
+        """
+        key = hash_raw_item(raw_item_content_type, raw_item)
+        path = self.item_path(key)
+        if os.path.exists(path):
+            return key
+
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        if isinstance(raw_item, unicode):
+            raw_item = raw_item.encode('utf-8')
+
+        # Write to a temporary file first, so readers never see a partially
+        # written item
+        temp_path = '%s.%s.tmp' % (path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            f.write('%s\n' % raw_item_content_type)
+            f.write(raw_item)
+        os.rename(temp_path, path)
+
+        return key
+
+    def get(self, key):
+        """Returns the ``(content-type, data)`` tuple of a stored item.
+
+        :param key: the key returned by :meth:`put`.
+        """
+        with open(self.item_path(key), 'rb') as f:
+            raw_item_content_type = f.readline().rstrip('\n')
+            return raw_item_content_type, f.read()
+
+    def remove(self):
+        """Removes the spool of the run, including all stored items."""
+        try:
+            shutil.rmtree(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+def spool_items(items, run_identifier):
+    """Stores the extracted ``items`` in the spool of a run, and yields
+    a ``(SPOOLED_ITEM_CONTENT_TYPE, key)`` tuple for each of them."""
+    spool = ItemSpool(run_identifier)
+    for raw_item_content_type, raw_item in items:
+        yield SPOOLED_ITEM_CONTENT_TYPE, spool.put(raw_item_content_type,
+                                                   raw_item)
@@ -1,8 +1,14 @@
 
 from ocd_backend import celery_app
 from ocd_backend import settings
-from ocd_backend.es import elasticsearch as es
+from ocd_backend.es import elasticsearch as es, get_index_settings
+from ocd_backend.extractors import checkpoint_key, last_harvest_key
 from ocd_backend.log import get_source_logger
+from ocd_backend.mixins import (OCDBackendTaskSuccessMixin,
+                                OCDBackendTaskFailureMixin)
+from ocd_backend.registry import registry
+from ocd_backend.run_context import expand_task_kwargs
+from ocd_backend.spool import ItemSpool
 
 
 log = get_source_logger('ocd_backend.tasks')
@@ -12,21 +18,33 @@ class BaseCleanup(celery_app.Task):
     ignore_result = True
 
     def run(self, *args, **kwargs):
-        run_identifier = kwargs.get('run_identifier')
-        run_identifier_chains = '{}_chains'.format(run_identifier)
-        self._remove_chain(run_identifier_chains, kwargs.get('chain_id'))
-
-        if self.backend.get_set_cardinality(run_identifier_chains) < 1 and self.backend.get(run_identifier) == 'done':
-            self.backend.remove(run_identifier_chains)
-            self.run_finished(**kwargs)
-        else:
-            # If the extractor is still running, extend the lifetime of the
-            # identifier
-            self.backend.update_ttl(run_identifier, settings.CELERY_CONFIG
-                                    .get('CELERY_TASK_RESULT_EXPIRES', 1800))
-
-    def _remove_chain(self, run_identifier, value):
-        self.backend.remove_value_from_set(run_identifier, value)
+        kwargs = expand_task_kwargs(kwargs)
+
+        # Each finished chain decrements the number of pending chains of
+        # the run (and extends the lifetime of the run identifier). The
+        # backend tells us when the last chain of a run that is done has
+        # finished.
+        if self.backend.decrement_pending(kwargs.get('run_identifier')):
+            self.finish(**kwargs)
+
+    def finish(self, run_identifier, **kwargs):
+        """Called once, when all items of a run are processed. Besides
+        calling :meth:`run_finished`, the spool of the run (if any) is
+        removed, and the datestamp of the harvest (if stored by the
+        extractor) is remembered as the starting point of the next
+        incremental harvest of the source."""
+        try:
+            self.run_finished(run_identifier, **kwargs)
+        finally:
+            ItemSpool(run_identifier).remove()
+
+        checkpoint = self.backend.get_json(checkpoint_key(run_identifier))
+        if checkpoint and checkpoint.get('harvest_datestamp'):
+            source_id = kwargs['source_definition']['id']
+            log.info('Setting the datestamp of the last harvest of {} to {}'
+                     .format(source_id, checkpoint['harvest_datestamp']))
+            self.backend.set_json(last_harvest_key(source_id),
+                                  checkpoint['harvest_datestamp'])
 
     def run_finished(self, run_identifier, **kwargs):
         raise NotImplementedError('Cleanup is highly dependent on what you use '
@@ -41,6 +59,38 @@ class CleanupElasticsearch(BaseCleanup):
         new_index_name = kwargs.get('new_index_name')
         alias = kwargs.get('index_alias')
 
+        # Incremental runs update the index the alias already points to
+        if current_index_name == new_index_name:
+            log.info('Finished run {}. Alias "{}" still points to "{}"'
+                     .format(run_identifier, alias, current_index_name))
+            return
+
+        # The new index was created without refreshes and replicas (see
+        # setup_pipeline); restore them (and optionally optimize the
+        # index) before the index starts serving reads. Runs that were
+        # started without storing the settings of the template get the
+        # settings of the current index.
+        index_settings = kwargs.get('index_settings')
+        if not index_settings:
+            index_settings = get_index_settings(
+                es, current_index_name, settings.ES_BUILD_INDEX_SETTINGS.keys())
+
+        log.info('Finished run {}. Restoring the settings of "{}": {}'
+                 .format(run_identifier, new_index_name, index_settings))
+        es.indices.put_settings(index=new_index_name,
+                                body={'index': index_settings})
+
+        max_num_segments = kwargs['source_definition'].get(
+            'optimize_max_num_segments', settings.ES_OPTIMIZE_MAX_NUM_SEGMENTS)
+        if max_num_segments:
+            log.info('Optimizing "{}" to {} segments'
+                     .format(new_index_name, max_num_segments))
+            es.indices.optimize(index=new_index_name,
+                                max_num_segments=max_num_segments,
+                                request_timeout=settings.ES_OPTIMIZE_TIMEOUT)
+
+        es.indices.refresh(index=new_index_name)
+
         log.info('Finished run {}. Removing alias "{}" from "{}", and '
                  'applying it to "{}"'.format(run_identifier, alias,
                                               current_index_name,
@@ -67,5 +117,33 @@ class CleanupElasticsearch(BaseCleanup):
         es.indices.update_aliases(body=actions)
 
         # Remove old index
-        if current_index_name != new_index_name:
-            es.indices.delete(index=current_index_name)
+        es.indices.delete(index=current_index_name)
+
+
+class FusedPipeline(OCDBackendTaskSuccessMixin, OCDBackendTaskFailureMixin,
+                    celery_app.Task):
+    """Transforms, enriches and loads an item (or a batch of items) in
+    a single task, by running the transformer, enrichers and loader of
+    the source in-process. This saves a message (and the serialization
+    of the item) between each of the tasks of a chain, and is used for
+    sources that set ``fused``.
+
+    Like the chain it replaces, the task calls the cleanup task of the
+    source once, either when it succeeds or when it fails.
+    """
+    dead_letter_stage = 'fused'
+
+    def run(self, *args, **kwargs):
+        kwargs = expand_task_kwargs(kwargs)
+        self.source_definition = kwargs['source_definition']
+
+        item = registry.get_task(self.source_definition['transformer'])\
+            .run(*args, **kwargs)
+
+        for enricher_path, enricher_settings in \
+                self.source_definition.get('enrichers', []):
+            item = registry.get_task(enricher_path).run(
+                item, enricher_settings=enricher_settings, **kwargs)
+
+        return registry.get_task(self.source_definition['loader'])\
+            .run(item, **kwargs)
@@ -6,18 +6,29 @@ from lxml import etree
 from ocd_backend import celery_app
 from ocd_backend import settings
 from ocd_backend.exceptions import NoDeserializerAvailable
-from ocd_backend.mixins import OCDBackendTaskFailureMixin
-from ocd_backend.utils.misc import load_object
+from ocd_backend.mixins import (OCDBackendTaskFailureMixin,
+                                OCDBackendBatchMixin,
+                                OCDBackendMetricsMixin)
+from ocd_backend.registry import registry
+from ocd_backend.run_context import expand_task_kwargs
+from ocd_backend.spool import ItemSpool, SPOOLED_ITEM_CONTENT_TYPE
 
 
-class BaseTransformer(OCDBackendTaskFailureMixin, celery_app.Task):
+class BaseTransformer(OCDBackendTaskFailureMixin, OCDBackendBatchMixin,
+                      OCDBackendMetricsMixin, celery_app.Task):
+    metrics_stage = 'transformer'
+    dead_letter_stage = 'transformer'
 
     def run(self, *args, **kwargs):
         """Start transformation of a single item.
 
         This method is called by the extractor and expects args to
         contain the content-type and the original item (as a string).
-        Kwargs should contain the ``source_definition`` dict.
+        Kwargs should contain the ``source_definition`` dict, or the
+        ``run_identifier`` of a run of which the context is stored (see
+        :func:`~ocd_backend.run_context.expand_task_kwargs`). Items of
+        which the content-type is ``SPOOLED_ITEM_CONTENT_TYPE`` are read
+        from the spool of the run (see :class:`~ocd_backend.spool.ItemSpool`).
 
         :type raw_item_content_type: string
         :param raw_item_content_type: the content-type of the data
@@ -28,13 +39,35 @@ class BaseTransformer(OCDBackendTaskFailureMixin, celery_app.Task):
         :param source_definition: The configuration of a single source in
             the form of a dictionary (as defined in the settings).
         :type source_definition: dict.
-        :returns: the output of :py:meth:`~BaseTransformer.transform_item`
+        :param batch: when ``True``, args contains a single list of
+            ``(content-type, item)`` pairs instead of a single item.
+        :type batch: bool.
+        :returns: the output of :py:meth:`~BaseTransformer.transform_item`,
+            or a list of those outputs when a batch is transformed.
         """
+        kwargs = expand_task_kwargs(kwargs)
         self.source_definition = kwargs['source_definition']
-        self.item_class = load_object(kwargs['source_definition']['item'])
+        self.item_class = registry.get_item_class(self.source_definition)
+        self.spool = None
+        if kwargs.get('run_identifier'):
+            self.spool = ItemSpool(kwargs['run_identifier'])
 
-        item = self.deserialize_item(*args)
-        return self.transform_item(*args, item=item)
+        transform = self.measured(lambda raw: self.transform_raw_item(*raw))
+        try:
+            if kwargs.get('batch'):
+                return self.run_batch(args[0], transform, **kwargs)
+
+            return transform(args)
+        finally:
+            self.flush_metrics(**kwargs)
+
+    def transform_raw_item(self, raw_item_content_type, raw_item):
+        """Deserializes and transforms a single item."""
+        if raw_item_content_type == SPOOLED_ITEM_CONTENT_TYPE:
+            raw_item_content_type, raw_item = self.spool.get(raw_item)
+
+        item = self.deserialize_item(raw_item_content_type, raw_item)
+        return self.transform_item(raw_item_content_type, raw_item, item=item)
 
     def deserialize_item(self, raw_item_content_type, raw_item):
         if raw_item_content_type == 'application/json':
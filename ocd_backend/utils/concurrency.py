@@ -0,0 +1,178 @@
+from collections import deque
+from multiprocessing.pool import ThreadPool
+from Queue import Queue, Full
+from threading import Event, Lock, Thread
+from time import sleep, time
+import sys
+
+# Markers of the entries a producer thread puts on a queue
+_ITEM, _ERROR, _DONE = range(3)
+
+# The number of seconds a producer thread waits for space on a full queue,
+# before it checks whether the consumer is still interested
+_PUT_TIMEOUT = 0.1
+
+
+def read_ahead(iterable, size):
+    """Yields the items of ``iterable``, while a background thread already
+    retrieves up to ``size`` items ahead. Exceptions raised by ``iterable``
+    are re-raised in the consuming thread, after the items that were
+    retrieved before the exception.
+
+    The background thread stops when the generator is closed (or garbage
+    collected) before ``iterable`` is exhausted.
+
+    :param iterable: the iterable to read ahead; it is only iterated by
+        the background thread.
+    :param size: the maximal number of items that are retrieved ahead.
+    """
+    queue = Queue(maxsize=size)
+    stopped = Event()
+
+    def put(entry):
+        while not stopped.is_set():
+            try:
+                queue.put(entry, timeout=_PUT_TIMEOUT)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((_ITEM, item)):
+                    # Release the resources of a generator right away
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+                    return
+        except BaseException:
+            put((_ERROR, sys.exc_info()))
+        else:
+            put((_DONE, None))
+
+    producer = Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+
+    try:
+        while True:
+            marker, value = queue.get()
+            if marker == _DONE:
+                return
+            if marker == _ERROR:
+                raise value[0], value[1], value[2]
+            yield value
+    finally:
+        stopped.set()
+
+
+def bounded_imap(func, iterable, workers, window=None):
+    """Yields ``func(item)`` for each item of ``iterable``, in the order of
+    ``iterable``, while up to ``workers`` calls run concurrently in a pool
+    of threads. Exceptions raised by ``func`` are re-raised in the
+    consuming thread when the result of the failed item is due.
+
+    At most ``window`` items are retrieved from ``iterable`` before their
+    result is consumed, so a slow call doesn't cause the results of the
+    following items to pile up in memory. The pool is terminated when the
+    generator is closed (or garbage collected).
+
+    :param func: the function that is called with each item.
+    :param iterable: the items; it is iterated lazily.
+    :param workers: the maximal number of concurrent calls.
+    :param window: the maximal number of pending results; defaults to
+        twice the number of ``workers``.
+    """
+    window = window or workers * 2
+    items = iter(iterable)
+    pending = deque()
+
+    pool = ThreadPool(workers)
+    try:
+        while True:
+            for item in items:
+                pending.append(pool.apply_async(func, (item,)))
+                if len(pending) >= window:
+                    break
+
+            if not pending:
+                return
+
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+
+
+class RateLimiter(object):
+    """Limits the rate at which threads perform an action (such as an HTTP
+    request) to ``rate`` actions per second. The limiter is shared by the
+    threads, each of which calls :meth:`wait` before every action.
+
+    :param rate: the maximal number of actions per second; when ``None``,
+        actions are not limited.
+    """
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.lock = Lock()
+
+    def wait(self):
+        """Blocks until the calling thread may perform its action."""
+        with self.lock:
+            if not self.interval:
+                return
+
+            now = time()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+
+        if slot > now:
+            sleep(slot - now)
+
+    def throttled(self):
+        """Called when the service rejected an action because it is
+        overloaded; a fixed rate doesn't change."""
+
+    def succeeded(self):
+        """Called after a successful action; a fixed rate doesn't
+        change."""
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """A :class:`RateLimiter` that adapts the interval between actions to
+    the responses of a remote service. The interval starts at
+    ``min_interval``. Each time the service signals it is overloaded (see
+    :meth:`throttled`), the interval is doubled, up to ``max_interval``.
+    Each successful action (see :meth:`succeeded`) shortens it by a tenth,
+    until it drops below a tenth of ``backoff``, and back to
+    ``min_interval``.
+
+    :param min_interval: the minimal number of seconds between actions.
+    :param max_interval: the maximal number of seconds between actions.
+    :param backoff: the interval (in seconds) after the first throttled
+        action, when ``min_interval`` is lower.
+    """
+    def __init__(self, min_interval=0.0, max_interval=60.0, backoff=1.0):
+        super(AdaptiveRateLimiter, self).__init__()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = min(backoff, max_interval)
+        self.interval = min_interval
+
+    def throttled(self):
+        """Increases the interval after the service rejected an action, and
+        postpones the next action accordingly."""
+        with self.lock:
+            self.interval = min(max(self.interval * 2, self.backoff),
+                                self.max_interval)
+            self.next_slot = max(self.next_slot, time() + self.interval)
+
+    def succeeded(self):
+        """Decreases the interval after a successful action."""
+        with self.lock:
+            self.interval *= 0.9
+            if self.interval < self.backoff / 10:
+                self.interval = 0.0
+            self.interval = max(self.interval, self.min_interval)
@@ -0,0 +1,111 @@
+from time import sleep
+
+from requests import Session
+from requests.exceptions import ConnectionError, Timeout
+from requests.packages.urllib3.util.retry import Retry
+from requests.adapters import HTTPAdapter
+
+from ocd_backend import settings
+from ocd_backend.log import get_source_logger
+
+log = get_source_logger('http')
+
+
+def create_http_session(pool_maxsize=None, adapter_retries=True):
+    """Returns a :class:`requests.Session` that identifies itself with
+    ``settings.USER_AGENT``, and retries requests that failed because of
+    a connection error or a 500/503 response.
+
+    :param pool_maxsize: the number of connections to a single host that
+        are kept alive; defaults to ``settings.HTTP_POOL_MAXSIZE``.
+    :type pool_maxsize: int.
+    :param adapter_retries: when ``False``, the session doesn't retry any
+        request itself. Sessions that are used with
+        :func:`get_with_retries` should not retry, as their retries would
+        hide the failed responses (and their ``Retry-After`` headers)
+        from it.
+    :type adapter_retries: bool.
+    """
+    pool_maxsize = pool_maxsize or settings.HTTP_POOL_MAXSIZE
+
+    session = Session()
+    session.headers['User-Agent'] = settings.USER_AGENT
+
+    for prefix in ['http://', 'https://']:
+        if adapter_retries:
+            http_retry = Retry(total=5, status_forcelist=[500, 503],
+                               backoff_factor=.5)
+        else:
+            http_retry = Retry(0, read=False)
+        http_adapter = HTTPAdapter(max_retries=http_retry,
+                                   pool_maxsize=pool_maxsize)
+        session.mount(prefix, http_adapter)
+
+    return session
+
+
+def is_retryable_status(status_code):
+    """Returns whether a response with ``status_code`` signals a temporary
+    problem: the client exceeded its quota (429), or a server error
+    occurred (5xx)."""
+    return status_code == 429 or 500 <= status_code < 600
+
+
+def get_with_retries(session, url, rate_limiter=None, retries=None,
+                     backoff=None, **kwargs):
+    """Performs a GET request with ``session``, and retries it when the
+    connection failed or the response has a retryable status (see
+    :func:`is_retryable_status`). The time between retries starts at
+    ``backoff`` seconds and doubles after each retry; a numeric
+    ``Retry-After`` header of the response takes precedence.
+
+    :param session: the :class:`requests.Session` to use; it should not
+        retry requests itself (see :func:`create_http_session`).
+    :param url: the URL to retrieve.
+    :param rate_limiter: an optional
+        :class:`~ocd_backend.utils.concurrency.RateLimiter` that is waited
+        for before each attempt, and that is told whether the service
+        throttled the attempt.
+    :param retries: the number of retries; defaults to
+        ``settings.HTTP_RETRIES``.
+    :param backoff: the number of seconds before the first retry; defaults
+        to ``settings.HTTP_RETRY_BACKOFF``.
+    :returns: the :class:`requests.Response` of the last attempt; its
+        status is raised as an exception when it isn't successful.
+    """
+    if retries is None:
+        retries = settings.HTTP_RETRIES
+    if backoff is None:
+        backoff = settings.HTTP_RETRY_BACKOFF
+
+    for attempt in range(retries + 1):
+        if rate_limiter:
+            rate_limiter.wait()
+
+        delay = backoff * 2 ** attempt
+        try:
+            r = session.get(url, **kwargs)
+        except (ConnectionError, Timeout):
+            if attempt == retries:
+                raise
+            log.warning('Unable to connect to %s, retrying in %s seconds'
+                        % (url, delay))
+        else:
+            retryable = is_retryable_status(r.status_code)
+            if rate_limiter:
+                if retryable:
+                    rate_limiter.throttled()
+                else:
+                    rate_limiter.succeeded()
+
+            if not retryable or attempt == retries:
+                r.raise_for_status()
+                return r
+
+            retry_after = r.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = int(retry_after)
+            log.warning('Got a %s response from %s, retrying in %s seconds'
+                        % (r.status_code, url, delay))
+
+        sleep(delay)
@@ -1,6 +1,8 @@
 import datetime
+from hashlib import sha1
 import json
 import re
+import sys
 
 
 def load_sources_config(filename):
@@ -48,6 +50,52 @@ def load_object(path):
     return obj
 
 
+def iterate_in_batches(iterable, batch_size):
+    """Groups the values of ``iterable`` into lists of (at most)
+    ``batch_size`` values.
+
+    :param iterable: the values to group.
+    :param batch_size: the maximum number of values in a single batch.
+    :type batch_size: int.
+    :returns: a generator that yields lists of values. When ``iterable``
+        raises an exception, the values retrieved so far are yielded as a
+        (smaller) batch before the exception is re-raised.
+    """
+    batch = []
+    try:
+        for value in iterable:
+            batch.append(value)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    except Exception:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        if batch:
+            yield batch
+        raise exc_type, exc_value, exc_traceback
+
+    if batch:
+        yield batch
+
+
+def hash_raw_item(raw_item_content_type, raw_item):
+    """Returns a hash of an item in its original format, as yielded by
+    an extractor. Items with the same hash are byte-identical.
+
+    :param raw_item_content_type: the content-type of the item.
+    :param raw_item: the data of the item (as a string).
+    :returns: the hexadecimal SHA1 digest of the item.
+    """
+    if isinstance(raw_item, unicode):
+        raw_item = raw_item.encode('utf-8')
+
+    item_hash = sha1(str(raw_item_content_type))
+    item_hash.update('\n')
+    item_hash.update(raw_item)
+
+    return item_hash.hexdigest()
+
+
 def try_convert(conv, value):
     try:
         return conv(value)
@@ -0,0 +1,110 @@
+import codecs
+import re
+
+# The characters that delimit the elements of a JSON array
+_JSON_DELIMITERS = re.compile(r'[\[\]{},"\\]')
+
+
+class CleanUTF8Reader(object):
+    """Wraps a file-like object that contains UTF-8, and cleans its content
+    while it is read: invalid byte sequences are replaced by U+FFFD, and
+    form feeds (which are not allowed in XML) by question marks.
+
+    Only the chunk that is being read is decoded and re-encoded, so the
+    reader can be passed to a streaming parser such as
+    :func:`lxml.etree.iterparse`.
+
+    :param stream: the file-like object to read from.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+    def read(self, size=-1):
+        while True:
+            data = self.stream.read(size)
+            text = self.decoder.decode(data, final=not data)
+
+            # An empty string signals the end of the stream, so keep reading
+            # when the chunk only contained part of a multi-byte character
+            if text or not data:
+                return text.replace(u'\x0c', u'?').encode('utf-8')
+
+    def close(self):
+        if hasattr(self.stream, 'close'):
+            self.stream.close()
+
+
+def iter_json_array(stream, chunk_size=64*1024):
+    """Yields the elements of the JSON array in ``stream``, without decoding
+    them: each element is yielded as the string of bytes it consists of in
+    the stream (without surrounding whitespace). Only the element that is
+    being read is kept in memory.
+
+    The elements themselves are not validated; that is left to the
+    consumer of the elements.
+
+    :param stream: a file-like object containing a JSON array.
+    :param chunk_size: the number of bytes that is read at once.
+    :raises ValueError: when the stream doesn't contain an array, or ends
+        before the array is closed.
+    """
+    depth = 0
+    in_string = False
+    # The number of characters at the start of the next chunk that are
+    # escaped by a backslash at the end of the previous chunk
+    skip = 0
+    element = []
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            raise ValueError('Unexpected end of JSON array')
+
+        start = 0
+        position = skip
+        skip = 0
+        for match in _JSON_DELIMITERS.finditer(chunk, position):
+            index = match.start()
+            if index < position:
+                continue
+
+            char = chunk[index]
+            if in_string:
+                if char == '\\':
+                    position = index + 2
+                    skip = max(position - len(chunk), 0)
+                elif char == '"':
+                    in_string = False
+            elif depth == 0:
+                if char != '[' or chunk[:index].strip():
+                    raise ValueError('The stream does not contain a JSON '
+                                     'array')
+                depth = 1
+                start = index + 1
+            elif char == '"':
+                in_string = True
+            elif char in '[{':
+                depth += 1
+            elif char in ']}':
+                depth -= 1
+            elif char == ',' and depth == 1:
+                element.append(chunk[start:index])
+                start = index + 1
+                item = ''.join(element).strip()
+                element = []
+                if item:
+                    yield item
+
+            if depth == 0:
+                # The closing bracket of the array
+                element.append(chunk[start:index])
+                item = ''.join(element).strip()
+                if item:
+                    yield item
+                return
+
+        if depth:
+            element.append(chunk[start:])
+        elif chunk.strip():
+            raise ValueError('The stream does not contain a JSON array')
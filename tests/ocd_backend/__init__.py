@@ -2,3 +2,17 @@ from .extractors import *
 from .items import *
 from .transformers import *
 from .loaders import *
+from .pipeline import *
+from .local_executor import *
+from .metrics import *
+from .run_context import *
+from .registry import *
+from .tasks import *
+from .routers import *
+from .serializers import *
+from .spool import *
+from .dead_letters import *
+from .result_backends import *
+from .concurrency import *
+from .http import *
+from .streams import *
@@ -0,0 +1,169 @@
+from threading import Event, Lock
+import time
+from unittest import TestCase
+
+import mock
+
+from ocd_backend.utils.concurrency import (AdaptiveRateLimiter, bounded_imap,
+                                          RateLimiter, read_ahead)
+
+
+class ReadAheadTestCase(TestCase):
+    def test_yields_items_in_order(self):
+        self.assertEqual(list(read_ahead(iter(range(10)), 2)), range(10))
+
+    def test_reraises_exceptions(self):
+        def items():
+            yield 1
+            yield 2
+            raise ValueError('Unable to retrieve item')
+
+        items_iter = read_ahead(items(), 5)
+        self.assertEqual(next(items_iter), 1)
+        self.assertEqual(next(items_iter), 2)
+        with self.assertRaises(ValueError):
+            next(items_iter)
+
+    def test_reads_at_most_size_items_ahead(self):
+        retrieved = []
+        finished = Event()
+
+        def items():
+            try:
+                for i in range(100):
+                    retrieved.append(i)
+                    yield i
+            finally:
+                finished.set()
+
+        items_iter = read_ahead(items(), 3)
+        self.assertEqual(next(items_iter), 0)
+
+        # Stopping the consumer stops the background thread
+        items_iter.close()
+        self.assertTrue(finished.wait(5))
+
+        # The consumed item, the items on the queue and the item the
+        # background thread was trying to put on the queue
+        self.assertLessEqual(len(retrieved), 5)
+
+
+class BoundedImapTestCase(TestCase):
+    def test_yields_results_in_order(self):
+        def square(i):
+            # Make the first items finish last
+            time.sleep(0.01 * (5 - i) if i < 5 else 0)
+            return i * i
+
+        self.assertEqual(list(bounded_imap(square, range(10), 4)),
+                         [i * i for i in range(10)])
+
+    def test_limits_concurrent_calls(self):
+        lock = Lock()
+        running = [0]
+        max_running = [0]
+
+        def call(i):
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return i
+
+        self.assertEqual(list(bounded_imap(call, range(20), 3)), range(20))
+        self.assertLessEqual(max_running[0], 3)
+
+    def test_reraises_exceptions(self):
+        def call(i):
+            if i == 2:
+                raise ValueError('Unable to process item')
+            return i
+
+        results = bounded_imap(call, range(5), 2)
+        self.assertEqual(next(results), 0)
+        self.assertEqual(next(results), 1)
+        with self.assertRaises(ValueError):
+            next(results)
+
+    def test_retrieves_at_most_window_items_ahead(self):
+        retrieved = []
+
+        def items():
+            for i in range(100):
+                retrieved.append(i)
+                yield i
+
+        results = bounded_imap(lambda i: i, items(), 2, window=4)
+        self.assertEqual(next(results), 0)
+        results.close()
+
+        self.assertLessEqual(len(retrieved), 4)
+
+
+@mock.patch('ocd_backend.utils.concurrency.sleep')
+@mock.patch('ocd_backend.utils.concurrency.time')
+class RateLimiterTestCase(TestCase):
+    def test_spaces_actions(self, time, sleep):
+        time.return_value = 100.0
+        rate_limiter = RateLimiter(4)
+        for _ in range(3):
+            rate_limiter.wait()
+
+        self.assertEqual([c[0][0] for c in sleep.call_args_list],
+                         [0.25, 0.5])
+
+    def test_does_not_wait_after_idle_period(self, time, sleep):
+        rate_limiter = RateLimiter(4)
+        time.return_value = 100.0
+        rate_limiter.wait()
+        time.return_value = 101.0
+        rate_limiter.wait()
+
+        self.assertFalse(sleep.called)
+
+    def test_unlimited(self, time, sleep):
+        rate_limiter = RateLimiter(None)
+        for _ in range(10):
+            rate_limiter.wait()
+
+        self.assertFalse(sleep.called)
+
+
+@mock.patch('ocd_backend.utils.concurrency.sleep')
+@mock.patch('ocd_backend.utils.concurrency.time')
+class AdaptiveRateLimiterTestCase(TestCase):
+    def test_starts_without_delay(self, time, sleep):
+        time.return_value = 100.0
+        rate_limiter = AdaptiveRateLimiter()
+        for _ in range(3):
+            rate_limiter.wait()
+            rate_limiter.succeeded()
+
+        self.assertFalse(sleep.called)
+
+    def test_backs_off_when_throttled(self, time, sleep):
+        time.return_value = 100.0
+        rate_limiter = AdaptiveRateLimiter(max_interval=5, backoff=1)
+        intervals = []
+        for _ in range(5):
+            rate_limiter.throttled()
+            intervals.append(rate_limiter.interval)
+
+        self.assertEqual(intervals, [1, 2, 4, 5, 5])
+
+        rate_limiter.wait()
+        sleep.assert_called_once_with(5)
+
+    def test_recovers_after_successes(self, time, sleep):
+        rate_limiter = AdaptiveRateLimiter(min_interval=0.5, backoff=1)
+        rate_limiter.throttled()
+        self.assertEqual(rate_limiter.interval, 1)
+
+        rate_limiter.succeeded()
+        self.assertAlmostEqual(rate_limiter.interval, 0.9)
+
+        for _ in range(10):
+            rate_limiter.succeeded()
+        self.assertEqual(rate_limiter.interval, 0.5)
@@ -0,0 +1,189 @@
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+
+import mock
+
+from ocd_backend.exceptions import RunInProgress
+from ocd_backend.loaders import ElasticsearchLoader
+from ocd_backend.pipeline import replay_dead_letters
+from ocd_backend.spool import ItemSpool, SPOOLED_ITEM_CONTENT_TYPE
+from ocd_backend.transformers import BaseTransformer
+
+
+class DeadLetterTestCase(TestCase):
+    def setUp(self):
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test_dumps/item.json')) as f:
+            self.item = ('application/json', f.read())
+        self.failing_item = ('application/test', 'unknown content-type')
+
+        self.source_definition = {
+            'id': 'test_definition',
+            'item': 'ocd_backend.items.LocalDumpItem',
+            'transformer': 'ocd_backend.transformers.BaseTransformer',
+            'enrichers': [],
+            'loader': 'ocd_backend.loaders.ElasticsearchLoader',
+            'cleanup': 'ocd_backend.tasks.CleanupElasticsearch'
+        }
+        self.kwargs = {
+            'run_identifier': 'test_run',
+            'source_definition': self.source_definition,
+            'record_metrics': False
+        }
+
+    def dead_letters(self, celery_app):
+        dead_letters = []
+        for call in celery_app.backend.add_dead_letters.call_args_list:
+            run_identifier, letters = call[0]
+            self.assertEqual(run_identifier, 'test_run')
+            dead_letters += letters
+        return dead_letters
+
+    @mock.patch('ocd_backend.dead_letters.celery_app')
+    def test_failed_item_of_batch(self, celery_app):
+        items = BaseTransformer().run([self.failing_item, self.item],
+                                      batch=True, **self.kwargs)
+        self.assertEqual(len(items), 1)
+
+        dead_letters = self.dead_letters(celery_app)
+        self.assertEqual(len(dead_letters), 1)
+        self.assertEqual(dead_letters[0]['stage'], 'transformer')
+        self.assertEqual(dead_letters[0]['source_id'], 'test_definition')
+        self.assertEqual(dead_letters[0]['item'], self.failing_item)
+        self.assertTrue(dead_letters[0]['exception']
+                        .startswith('NoDeserializerAvailable'))
+        self.assertIn('Traceback', dead_letters[0]['traceback'])
+
+    @mock.patch('ocd_backend.dead_letters.celery_app')
+    def test_no_dead_letters_when_disabled(self, celery_app):
+        BaseTransformer().run([self.failing_item], batch=True,
+                              record_dead_letters=False, **self.kwargs)
+        self.assertFalse(celery_app.backend.add_dead_letters.called)
+
+    @mock.patch('ocd_backend.dead_letters.celery_app')
+    def test_spooled_items_are_stored_with_their_data(self, celery_app):
+        spool_dir = mkdtemp()
+        try:
+            with mock.patch('ocd_backend.settings.SPOOL_DIR_PATH', spool_dir):
+                key = ItemSpool('test_run').put(*self.failing_item)
+                BaseTransformer().run([(SPOOLED_ITEM_CONTENT_TYPE, key)],
+                                      batch=True, **self.kwargs)
+        finally:
+            shutil.rmtree(spool_dir)
+
+        self.assertEqual(self.dead_letters(celery_app)[0]['item'],
+                         self.failing_item)
+
+    @mock.patch('ocd_backend.dead_letters.celery_app')
+    def test_failed_task(self, celery_app):
+        item = ('object_id', {'meta': {}}, {'meta': {}})
+        loader = ElasticsearchLoader()
+        loader.source_definition = self.source_definition
+
+        einfo = mock.Mock(traceback='Traceback: ...')
+        with mock.patch.object(loader, 'cleanup') as cleanup:
+            loader.on_failure(ValueError('Unable to load'), 'task_id',
+                              (item,), self.kwargs, einfo)
+
+        dead_letters = self.dead_letters(celery_app)
+        self.assertEqual(len(dead_letters), 1)
+        self.assertEqual(dead_letters[0]['stage'], 'loader')
+        self.assertEqual(dead_letters[0]['item'], item)
+        self.assertEqual(dead_letters[0]['traceback'], 'Traceback: ...')
+        cleanup.assert_called_once_with(**self.kwargs)
+
+
+class ReplayDeadLettersTestCase(TestCase):
+    def setUp(self):
+        self.source_definition = {
+            'id': 'test_definition',
+            'transformer': 'ocd_backend.transformers.BaseTransformer',
+            'enrichers': [],
+            'loader': 'ocd_backend.loaders.ElasticsearchLoader',
+            'cleanup': 'ocd_backend.tasks.CleanupElasticsearch'
+        }
+        self.context = {
+            'source_definition': self.source_definition,
+            'params': {
+                'run_identifier': 'test_run',
+                'current_index_name': 'ocd_test_1',
+                'new_index_name': 'ocd_test_2',
+                'index_alias': 'ocd_test'
+            }
+        }
+        self.raw_item = ['application/json', '{}']
+        self.transformed_item = ['object_id', {'meta': {}}, {'meta': {}}]
+
+        patchers = [
+            mock.patch('ocd_backend.pipeline.celery_app'),
+            mock.patch('ocd_backend.pipeline.es'),
+            mock.patch('ocd_backend.pipeline.store_run_context'),
+            mock.patch('ocd_backend.pipeline.get_run_context',
+                       return_value=self.context),
+            mock.patch('ocd_backend.pipeline._dispatch_chains',
+                       side_effect=self.dispatch_chains)
+        ]
+        self.celery_app, self.es, self.store_run_context = \
+            [patcher.start() for patcher in patchers][:3]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+        self.celery_app.backend.get.return_value = 'done'
+        self.celery_app.backend.get_dead_letters.return_value = [
+            {'stage': 'transformer', 'item': self.raw_item},
+            {'stage': 'loader', 'item': self.transformed_item}
+        ]
+        self.celery_app.backend.mark_run_done.return_value = False
+        self.es.indices.get_alias.return_value = {'ocd_test_2': {}}
+
+        self.chains = []
+
+    def dispatch_chains(self, run_identifier, chains):
+        self.chains += chains
+        dispatched = len(chains)
+        del chains[:]
+        return dispatched
+
+    def test_replay(self):
+        run_identifier = replay_dead_letters('test_run')
+
+        # The items are loaded into the current index, in a new run
+        source_definition, params = self.store_run_context.call_args[0]
+        self.assertEqual(params['run_identifier'], run_identifier)
+        self.assertNotEqual(run_identifier, 'test_run')
+        self.assertEqual(params['current_index_name'], 'ocd_test_2')
+        self.assertEqual(params['new_index_name'], 'ocd_test_2')
+
+        # Each item re-enters the pipeline at the stage that failed
+        transformer_chain, loader_chain = self.chains
+        self.assertEqual([task.task for task in transformer_chain.tasks], [
+            'ocd_backend.transformers.BaseTransformer',
+            'ocd_backend.loaders.ElasticsearchLoader'
+        ])
+        self.assertEqual(list(transformer_chain.tasks[0].args), self.raw_item)
+        self.assertEqual([task.task for task in loader_chain.tasks],
+                         ['ocd_backend.loaders.ElasticsearchLoader'])
+        self.assertEqual(list(loader_chain.tasks[0].args),
+                         [self.transformed_item])
+
+        self.celery_app.backend.remove_dead_letters.assert_called_once_with(
+            'test_run', 2)
+
+    def test_replay_batches(self):
+        self.source_definition['batch_size'] = 10
+        self.context['params']['batch'] = True
+
+        replay_dead_letters('test_run')
+
+        transformer_chain, loader_chain = self.chains
+        self.assertEqual(list(transformer_chain.tasks[0].args),
+                         [[self.raw_item]])
+        self.assertEqual(list(loader_chain.tasks[0].args),
+                         [[self.transformed_item]])
+
+    def test_running_run(self):
+        self.celery_app.backend.get.return_value = 'running'
+        with self.assertRaises(RunInProgress):
+            replay_dead_letters('test_run')
@@ -22,8 +22,14 @@ class ExtractorTestCase(TestCase):
 # Import test modules here so the noserunner can pick them up, and the
 # ExtractorTestCase is parsed. Add additional testcases when required
 from .staticfile import (
-    StaticfileExtractorTestCase, StaticJSONExtractorTestCase
+    StaticfileExtractorTestCase, StaticJSONExtractorTestCase,
+    StaticJSONExtractorStreamingTestCase, StaticXmlExtractorStreamingTestCase
 )
 from .local import (
     LocalPathBaseExtractorTestCase, LocalPathJSONExtractorTestCase
 )
+from .oai import OaiExtractorTestCase
+from .adlib import AdlibExtractorTestCase
+from .rijksmuseum import RijksmuseumExtractorTestCase
+from .wikimedia import WikimediaCommonsExtractorTestCase
+from .opensearch import OpensearchExtractorTestCase
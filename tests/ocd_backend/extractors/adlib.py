@@ -0,0 +1,87 @@
+from lxml import etree
+import mock
+from requests.exceptions import HTTPError
+
+from ocd_backend import settings
+from ocd_backend.extractors.adlib import AdlibExtractor
+
+from . import ExtractorTestCase
+
+ADLIB_PAGE = """<adlibXML>
+  <recordList>%s</recordList>
+  <diagnostic><hits>%s</hits></diagnostic>
+</adlibXML>"""
+
+
+class AdlibExtractorTestCase(ExtractorTestCase):
+    def setUp(self):
+        super(AdlibExtractorTestCase, self).setUp()
+        self.source_definition.update({
+            'adlib_base_url': 'http://example.org/adlib',
+            'adlib_database': 'collect',
+            'adlib_per_page_limit': 2
+        })
+        self.total_hits = 7
+        self.failures = {}
+
+    def get(self, url, params):
+        start_from = params['startfrom']
+        if self.failures.get(start_from):
+            self.failures[start_from] -= 1
+            r = mock.Mock(status_code=503, headers={})
+            r.raise_for_status.side_effect = HTTPError(503)
+            return r
+
+        records = ''.join('<record><id>%s</id></record>' % i for i in range(
+            start_from, min(start_from + 2, self.total_hits + 1)))
+
+        return mock.Mock(status_code=200,
+                         content=ADLIB_PAGE % (records, self.total_hits))
+
+    def get_extractor(self):
+        self.http_session = mock.Mock()
+        self.http_session.get.side_effect = self.get
+
+        patcher = mock.patch.object(AdlibExtractor, 'plain_http_session',
+                                    self.http_session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return AdlibExtractor(self.source_definition)
+
+    def get_ids(self, records):
+        return [int(etree.fromstring(record).findtext('id'))
+                for _, record in records]
+
+    def test_get_all_records(self):
+        extractor = self.get_extractor()
+
+        self.assertEqual(self.get_ids(extractor.run()), range(1, 8))
+        self.assertEqual(self.http_session.get.call_count, 4)
+
+    def test_concurrent_pages_in_order(self):
+        self.source_definition['adlib_concurrency'] = 3
+        extractor = self.get_extractor()
+
+        self.assertEqual(self.get_ids(extractor.run()), range(1, 8))
+        self.assertEqual(self.http_session.get.call_count, 4)
+
+    @mock.patch('ocd_backend.utils.http.sleep')
+    def test_concurrent_retries_failed_page(self, sleep):
+        self.source_definition['adlib_concurrency'] = 3
+        self.failures[3] = 2
+        extractor = self.get_extractor()
+
+        self.assertEqual(self.get_ids(extractor.run()), range(1, 8))
+        self.assertEqual(self.http_session.get.call_count, 6)
+
+    @mock.patch('ocd_backend.utils.http.sleep')
+    def test_concurrent_fails_after_retries(self, sleep):
+        self.source_definition['adlib_concurrency'] = 3
+        self.failures[3] = settings.HTTP_RETRIES + 1
+        records = self.get_extractor().run()
+
+        # The records that precede the failed page are yielded
+        self.assertEqual(self.get_ids([next(records), next(records)]), [1, 2])
+        with self.assertRaises(HTTPError):
+            next(records)
@@ -0,0 +1,178 @@
+import io
+
+import mock
+
+from ocd_backend.extractors import DELETED_ITEM_CONTENT_TYPE
+from ocd_backend.extractors.oai import OaiExtractor
+
+from . import ExtractorTestCase
+
+OAI_PAGE = """<?xml version="1.0" encoding="UTF-8"?>
+<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">
+  <responseDate>2014-11-17T14:02:48Z</responseDate>
+  <ListRecords>
+    <record>
+      <header><identifier>oai:test:%(page)s-1</identifier></header>
+      <metadata><title>Record %(page)s-1</title></metadata>
+    </record>
+    <record>
+      <header status="deleted"><identifier>oai:test:%(page)s-2</identifier></header>
+    </record>
+    <record>
+      <header><identifier>oai:test:%(page)s-3</identifier></header>
+      <metadata><title>Record %(page)s-3</title></metadata>
+    </record>
+    <resumptionToken>%(token)s</resumptionToken>
+  </ListRecords>
+</OAI-PMH>
+"""
+
+
+class OaiExtractorTestCase(ExtractorTestCase):
+    def setUp(self):
+        super(OaiExtractorTestCase, self).setUp()
+        self.source_definition['oai_base_url'] = 'http://example.org/oai'
+        self.pages = {
+            None: OAI_PAGE % {'page': 1, 'token': 'page2'},
+            'page2': OAI_PAGE % {'page': 2, 'token': ''}
+        }
+
+    def oai_call(self, params):
+        return self.pages[params.get('resumptionToken')]
+
+    def get_extractor(self, run_identifier=None, incremental=False):
+        extractor = OaiExtractor(self.source_definition,
+                                 run_identifier=run_identifier,
+                                 incremental=incremental)
+        extractor.oai_call = mock.Mock(side_effect=self.oai_call)
+        extractor.oai_stream = mock.Mock(
+            side_effect=lambda params: io.BytesIO(self.oai_call(params)))
+
+        return extractor
+
+    def test_get_all_records(self):
+        extractor = self.get_extractor()
+        records = list(extractor.run())
+
+        self.assertEqual(len(records), 4)
+        self.assertEqual(extractor.oai_call.call_count, 2)
+        for content_type, record in records:
+            self.assertEqual(content_type, 'application/xml')
+            self.assertIn('<title>Record', record)
+
+    def test_prefetch_pages(self):
+        self.source_definition['oai_prefetch_pages'] = 1
+        records = list(self.get_extractor().run())
+
+        self.assertEqual([record for _, record in records],
+                         [record for _, record in
+                          self.get_extractor().get_all_records()])
+        self.assertEqual(len(records), 4)
+
+    def test_streaming(self):
+        records = list(self.get_extractor().run())
+
+        self.source_definition['oai_streaming'] = True
+        extractor = self.get_extractor()
+        streamed = list(extractor.run())
+
+        self.assertFalse(extractor.oai_call.called)
+        self.assertEqual(extractor.oai_stream.call_count, 2)
+        # Streamed records don't include the whitespace that follows them
+        self.assertEqual(streamed, [(content_type, record.rstrip()) for
+                                    content_type, record in records])
+
+    @mock.patch('ocd_backend.extractors.celery_app')
+    def test_streaming_checkpoints(self, celery_app):
+        celery_app.backend.get_json.return_value = None
+        self.source_definition['oai_streaming'] = True
+        self.source_definition['oai_prefetch_pages'] = 1
+        list(self.get_extractor(run_identifier='test_run').run())
+
+        checkpoints = [c[0][1] for c in
+                       celery_app.backend.set_json.call_args_list]
+        self.assertEqual(
+            [(c['resumption_token'], c['records'], c['harvest_datestamp'])
+             for c in checkpoints],
+            [('page2', 2, '2014-11-17T14:02:48Z'),
+             (None, 4, '2014-11-17T14:02:48Z')])
+
+    def test_streaming_cleans_bad_bytes(self):
+        self.pages[None] = self.pages[None].replace(
+            'Record 1-1', 'Record \x0c\xff 1-1')
+        self.source_definition['oai_streaming'] = True
+        records = list(self.get_extractor().run())
+
+        self.assertIn('Record ?&#65533; 1-1', records[0][1])
+        self.assertEqual(len(records), 4)
+
+    @mock.patch('ocd_backend.extractors.celery_app')
+    def test_save_checkpoint(self, celery_app):
+        celery_app.backend.get_json.return_value = None
+        list(self.get_extractor(run_identifier='test_run').run())
+
+        checkpoints = [c[0][1] for c in
+                       celery_app.backend.set_json.call_args_list]
+        self.assertEqual(checkpoints, [
+            {'resumption_token': 'page2', 'pages': 1, 'records': 2,
+             'completed': False, 'harvest_datestamp': '2014-11-17T14:02:48Z'},
+            {'resumption_token': None, 'pages': 2, 'records': 4,
+             'completed': True, 'harvest_datestamp': '2014-11-17T14:02:48Z'}
+        ])
+
+    @mock.patch('ocd_backend.extractors.celery_app')
+    def test_resume_from_checkpoint(self, celery_app):
+        celery_app.backend.get_json.return_value = {
+            'resumption_token': 'page2', 'pages': 1, 'records': 2,
+            'completed': False
+        }
+        extractor = self.get_extractor(run_identifier='test_run')
+        records = list(extractor.run())
+
+        self.assertEqual(len(records), 2)
+        extractor.oai_call.assert_called_once_with({
+            'verb': 'ListRecords', 'resumptionToken': 'page2',
+            'metadataPrefix': 'oai_dc'
+        })
+
+    @mock.patch('ocd_backend.extractors.celery_app')
+    def test_resume_completed_harvest(self, celery_app):
+        celery_app.backend.get_json.return_value = {
+            'resumption_token': None, 'pages': 2, 'records': 4,
+            'completed': True
+        }
+        extractor = self.get_extractor(run_identifier='test_run')
+
+        self.assertEqual(list(extractor.run()), [])
+        self.assertFalse(extractor.oai_call.called)
+
+    @mock.patch('ocd_backend.extractors.celery_app')
+    def test_incremental_harvest(self, celery_app):
+        celery_app.backend.get_json.side_effect = {
+            'test_run_checkpoint': None,
+            'test_source_last_harvest': '2014-11-01T10:00:00Z'
+        }.get
+        self.source_definition['id'] = 'test_source'
+        extractor = self.get_extractor(run_identifier='test_run',
+                                       incremental=True)
+        records = list(extractor.run())
+
+        self.assertEqual(extractor.oai_call.call_args_list[0][0][0], {
+            'verb': 'ListRecords', 'from': '2014-11-01T10:00:00Z',
+            'metadataPrefix': 'oai_dc'
+        })
+
+        # Deleted records are yielded with their identifier
+        deleted = [r for c, r in records if c == DELETED_ITEM_CONTENT_TYPE]
+        self.assertEqual(deleted, ['oai:test:1-2', 'oai:test:2-2'])
+        self.assertEqual(len(records), 6)
+
+    @mock.patch('ocd_backend.extractors.celery_app')
+    def test_incremental_harvest_day_granularity(self, celery_app):
+        celery_app.backend.get_json.return_value = '2014-11-01T10:00:00Z'
+        self.source_definition['oai_datestamp_granularity'] = 'YYYY-MM-DD'
+        extractor = self.get_extractor(incremental=True)
+        list(extractor.run())
+
+        self.assertEqual(
+            extractor.oai_call.call_args_list[0][0][0]['from'], '2014-11-01')
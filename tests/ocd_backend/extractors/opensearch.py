@@ -0,0 +1,177 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from copy import deepcopy
+from threading import Thread
+
+from lxml import etree
+import mock
+from requests.exceptions import HTTPError
+
+from ocd_backend.extractors.opensearch import OpensearchExtractor
+from ocd_backend.utils.http import create_http_session
+
+from . import ExtractorTestCase
+
+OPENSEARCH_PAGE = """<rss xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/"
+     xmlns:dc="http://purl.org/dc/elements/1.1/">
+  <channel>
+    <title>Beeldbank</title>
+    <opensearch:totalResults>%(total)s</opensearch:totalResults>
+    %(items)s
+  </channel>
+</rss>"""
+
+OPENSEARCH_ITEM = """<item>
+      <guid>http://proxy.handle.net/10648/%(i)s</guid>
+      <dc:identifier>%(i)s</dc:identifier>
+    </item>
+    """
+
+
+def response(status_code, content=''):
+    r = mock.Mock(status_code=status_code, content=content, headers={})
+    if status_code >= 400:
+        r.raise_for_status.side_effect = HTTPError(status_code)
+
+    return r
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Responds with the next ``(status, body)`` tuple of ``responses``."""
+    responses = []
+
+    def do_GET(self):
+        status, body = StubHandler.responses.pop(0)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class OpensearchExtractorTestCase(ExtractorTestCase):
+    def setUp(self):
+        super(OpensearchExtractorTestCase, self).setUp()
+        self.source_definition.update({
+            'opensearch_url': 'http://example.org/opensearch',
+            'opensearch_query': '*:*',
+            'opensearch_per_page_count': 2
+        })
+
+    def create_page(self, items, total=6):
+        return OPENSEARCH_PAGE % {
+            'total': total,
+            'items': ''.join(OPENSEARCH_ITEM % {'i': i} for i in items)
+        }
+
+    def test_serialize_items(self):
+        page = self.create_page(range(3))
+        extractor = OpensearchExtractor(self.source_definition)
+        items = list(extractor.serialize_items(etree.fromstring(page)))
+
+        # The documents are equivalent to those of a copy of the channel
+        # with a single item
+        expected = []
+        tree = etree.fromstring(page)
+        for item in tree.xpath('.//channel/item'):
+            single_item_tree = deepcopy(tree)
+            for other in single_item_tree.xpath('.//channel/item'):
+                if other.findtext('guid') != item.findtext('guid'):
+                    other.getparent().remove(other)
+            expected.append(single_item_tree)
+
+        self.assertEqual(
+            [etree.tostring(etree.fromstring(i), method='c14n')
+             for i in items],
+            [etree.tostring(e, method='c14n') for e in expected])
+
+    def run_extractor(self, responses):
+        extractor = OpensearchExtractor(self.source_definition)
+        http_session = mock.Mock()
+        http_session.get.side_effect = responses
+
+        with mock.patch.object(OpensearchExtractor, 'plain_http_session',
+                               http_session):
+            items = list(extractor.run())
+
+        return extractor, http_session, [
+            etree.fromstring(item).findtext('.//guid') for _, item in items]
+
+    @mock.patch('ocd_backend.utils.http.sleep')
+    @mock.patch('ocd_backend.utils.concurrency.sleep')
+    def test_get_all_results(self, sleep, http_sleep):
+        extractor, http_session, guids = self.run_extractor([
+            response(200, self.create_page([])),
+            response(200, self.create_page([1, 2])),
+            response(503),
+            response(200, self.create_page([3, 4])),
+            response(200, self.create_page([5]))
+        ])
+
+        # The page that was throttled is requested again
+        self.assertEqual(guids, ['http://proxy.handle.net/10648/%s' % i
+                                 for i in range(1, 6)])
+        self.assertEqual(http_session.get.call_count, 5)
+        self.assertEqual(http_session.get.call_args_list[2],
+                         http_session.get.call_args_list[3])
+
+        # The retry was delayed by the rate limiter, which eases off again
+        # after successful requests
+        self.assertTrue(sleep.called)
+        self.assertAlmostEqual(extractor.rate_limiter.interval, 0.81)
+
+    @mock.patch('ocd_backend.utils.http.sleep')
+    @mock.patch('ocd_backend.utils.concurrency.sleep')
+    @mock.patch('ocd_backend.utils.http.settings')
+    def test_skips_page_after_retries(self, settings, sleep, http_sleep):
+        settings.HTTP_RETRIES = 2
+        _, http_session, guids = self.run_extractor([
+            response(200, self.create_page([])),
+            response(200, self.create_page([1, 2])),
+            response(503), response(503), response(503),
+            response(200, self.create_page([5]))
+        ])
+
+        self.assertEqual(guids, ['http://proxy.handle.net/10648/1',
+                                 'http://proxy.handle.net/10648/2',
+                                 'http://proxy.handle.net/10648/5'])
+        self.assertEqual(http_session.get.call_count, 6)
+
+    @mock.patch('ocd_backend.utils.http.sleep')
+    @mock.patch('ocd_backend.utils.concurrency.sleep')
+    @mock.patch('ocd_backend.utils.http.settings')
+    def test_skips_page_with_session_adapter(self, settings, sleep,
+                                             http_sleep):
+        settings.HTTP_RETRIES = 2
+        StubHandler.responses = [
+            (200, self.create_page([])),
+            (200, self.create_page([1, 2])),
+            (503, ''), (503, ''), (503, ''),
+            (200, self.create_page([5]))
+        ]
+
+        server = HTTPServer(('127.0.0.1', 0), StubHandler)
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        # The 503 responses pass through the adapters of the session, so
+        # they are retried (and finally skipped) by the extractor
+        self.source_definition['opensearch_url'] = \
+            'http://127.0.0.1:%s/opensearch' % server.server_port
+        extractor = OpensearchExtractor(self.source_definition)
+        try:
+            with mock.patch.object(OpensearchExtractor, 'plain_http_session',
+                                   create_http_session(adapter_retries=False)):
+                items = list(extractor.run())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual([etree.fromstring(item).findtext('.//guid')
+                          for _, item in items],
+                         ['http://proxy.handle.net/10648/1',
+                          'http://proxy.handle.net/10648/2',
+                          'http://proxy.handle.net/10648/5'])
+        self.assertEqual(StubHandler.responses, [])
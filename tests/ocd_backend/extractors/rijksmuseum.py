@@ -0,0 +1,70 @@
+import json
+
+import mock
+
+from ocd_backend.exceptions import NotFound
+from ocd_backend.extractors.rijksmuseum import RijksmuseumExtractor
+
+from . import ExtractorTestCase
+
+
+class RijksmuseumExtractorTestCase(ExtractorTestCase):
+    def setUp(self):
+        super(RijksmuseumExtractorTestCase, self).setUp()
+        self.source_definition.update({
+            'rijksmuseum_api_key': 'test',
+            'rijksmuseum_requests_per_second': None
+        })
+        self.object_numbers = ['SK-A-%s' % i for i in range(250)]
+
+    def api_call(self, url, params={}):
+        if url == 'collection/':
+            start = params['p'] * params['ps']
+            return {
+                'count': len(self.object_numbers),
+                'artObjects': [{'objectNumber': n} for n in
+                               self.object_numbers[start:start + params['ps']]]
+            }
+
+        object_number = url.split('/')[1]
+        return {'artObject': {'objectNumber': object_number}
+                if object_number != 'missing' else None}
+
+    def get_extractor(self):
+        extractor = RijksmuseumExtractor(self.source_definition)
+        extractor.api_call = mock.Mock(side_effect=self.api_call)
+
+        return extractor
+
+    def test_yields_objects_in_order(self):
+        self.source_definition['rijksmuseum_concurrency'] = 8
+        items = list(self.get_extractor().run())
+
+        self.assertEqual([json.loads(item)['objectNumber'] for _, item
+                          in items], self.object_numbers)
+        self.assertTrue(all(content_type == 'application/json'
+                            for content_type, _ in items))
+
+    def test_missing_api_key(self):
+        del self.source_definition['rijksmuseum_api_key']
+
+        with self.assertRaises(ValueError):
+            list(self.get_extractor().run())
+
+    def test_reraises_missing_object(self):
+        self.object_numbers[5] = 'missing'
+        items = self.get_extractor().run()
+
+        with self.assertRaises(NotFound):
+            list(items)
+
+    @mock.patch('ocd_backend.extractors.rijksmuseum.get_with_retries')
+    def test_api_calls_share_rate_limiter(self, get_with_retries):
+        self.source_definition['rijksmuseum_requests_per_second'] = 5
+        extractor = RijksmuseumExtractor(self.source_definition)
+        extractor.api_call('collection/SK-A-1')
+
+        kwargs = get_with_retries.call_args[1]
+        self.assertIs(kwargs['rate_limiter'], extractor.rate_limiter)
+        self.assertEqual(extractor.rate_limiter.rate, 5)
+        self.assertEqual(kwargs['params'], {'key': 'test', 'format': 'json'})
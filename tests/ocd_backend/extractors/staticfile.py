@@ -1,9 +1,14 @@
 import gzip
 import json
+import tempfile
 
+from lxml import etree
+import mock
+
+from ocd_backend import settings
 from ocd_backend.exceptions import ConfigurationError
 from ocd_backend.extractors.staticfile import (
-    StaticJSONDumpExtractor, StaticJSONExtractor
+    StaticJSONDumpExtractor, StaticJSONExtractor, StaticXmlExtractor
 )
 
 from . import ExtractorTestCase
@@ -61,3 +66,87 @@ class StaticJSONExtractorTestCase(ExtractorTestCase):
         self.assertEqual(content_type, 'application/json')
         # Doc is a serialized JSON document, so a string
         self.assertEqual(type(doc), str)
+
+
+class StaticFileStreamingTestCase(ExtractorTestCase):
+    def setUp(self):
+        super(StaticFileStreamingTestCase, self).setUp()
+        self.source_definition['file_url'] = 'http://example.org/dump'
+
+        patcher = mock.patch.object(settings, 'TEMP_DIR_PATH',
+                                    tempfile.gettempdir())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def extract(self, extractor_class, content, streaming):
+        self.source_definition['static_file_streaming'] = streaming
+        extractor = extractor_class(self.source_definition)
+
+        response = mock.Mock(content=content)
+        response.iter_content.side_effect = lambda chunk_size: (
+            content[i:i + 16] for i in range(0, len(content), 16))
+
+        with mock.patch.object(extractor_class, 'http_session') as session:
+            session.get.return_value = response
+            return list(extractor.run())
+
+
+class StaticJSONExtractorStreamingTestCase(StaticFileStreamingTestCase):
+    def test_stream_items(self):
+        items = [{'id': i, 'title': u'Item %s, [%s]' % (i, i)}
+                 for i in range(10)]
+        streamed = self.extract(StaticJSONExtractor,
+                                json.dumps(items, indent=2), True)
+
+        self.assertEqual([json.loads(item) for _, item in streamed], items)
+        self.assertTrue(all(content_type == 'application/json'
+                            for content_type, _ in streamed))
+
+
+class StaticXmlExtractorStreamingTestCase(StaticFileStreamingTestCase):
+    def setUp(self):
+        super(StaticXmlExtractorStreamingTestCase, self).setUp()
+        self.content = """<?xml version="1.0" encoding="UTF-8"?>
+<adlibXML>
+  <recordList>
+    <record><id>1</id><title>Record 1</title></record>
+    <record><id>2</id><title>Record 2</title></record>
+    <record><id>3</id><title>Record 3</title></record>
+  </recordList>
+  <diagnostic><hits>3</hits></diagnostic>
+</adlibXML>
+"""
+
+    def extract_xml(self, streaming):
+        return [etree.tostring(etree.fromstring(item)) for _, item in
+                self.extract(StaticXmlExtractor, self.content, streaming)]
+
+    def test_stream_items(self):
+        self.source_definition['item_xpath'] = '//adlibXML/recordList/record'
+        streamed = self.extract_xml(True)
+
+        self.assertEqual(len(streamed), 3)
+        self.assertEqual(streamed, self.extract_xml(False))
+
+    def test_stream_items_default_namespace(self):
+        self.content = self.content.replace(
+            '<adlibXML>', '<adlibXML xmlns="http://example.org/cb3">')
+        self.source_definition['item_xpath'] = '//cb3:record'
+        self.source_definition['default_namespace'] = 'cb3'
+        streamed = self.extract_xml(True)
+
+        self.assertEqual(len(streamed), 3)
+        self.assertEqual(streamed, self.extract_xml(False))
+
+    def test_undefined_prefix(self):
+        self.source_definition['item_xpath'] = '//cb3:record'
+
+        with self.assertRaises(ConfigurationError):
+            self.extract_xml(True)
+
+    def test_item_xpath_without_name(self):
+        self.source_definition['item_xpath'] = '//record[@type="object"]'
+        self.source_definition['static_file_streaming'] = True
+
+        with self.assertRaises(ConfigurationError):
+            StaticXmlExtractor(self.source_definition)
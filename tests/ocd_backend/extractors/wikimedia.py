@@ -0,0 +1,61 @@
+import mock
+
+from ocd_backend.extractors.wikimedia import WikimediaCommonsExtractor
+
+from . import ExtractorTestCase
+
+CATEGORY_PAGE = """<api>
+  <query><categorymembers>%s</categorymembers></query>
+  %s
+</api>"""
+
+COMMONS_ERROR = """<response>
+  <error><code>missing</code>File does not exist</error>
+</response>"""
+
+
+class WikimediaCommonsExtractorTestCase(ExtractorTestCase):
+    def setUp(self):
+        super(WikimediaCommonsExtractorTestCase, self).setUp()
+        self.source_definition.update({
+            'wikimedia_base_url': 'http://commons.wikimedia.org/w/api.php',
+            'wikimedia_category': 'Category:Test',
+            'wikimedia_concurrency': 3
+        })
+        self.titles = [['File:%s-%s.jpg' % (p, i) for i in range(5)]
+                       for p in range(2)]
+
+    def wikimedia_api_call(self, params):
+        page = int(params.get('cmcontinue', 0))
+        members = ''.join('<cm title="%s" />' % t for t in self.titles[page])
+        query_continue = ''
+        if page + 1 < len(self.titles):
+            query_continue = ('<query-continue><categorymembers cmcontinue='
+                              '"%s" /></query-continue>' % (page + 1))
+
+        return CATEGORY_PAGE % (members, query_continue)
+
+    def commons_api_call(self, image_name):
+        if image_name == 'File:1-2.jpg':
+            return COMMONS_ERROR
+
+        return '<response><file><name>%s</name></file></response>' % image_name
+
+    def get_extractor(self):
+        extractor = WikimediaCommonsExtractor(self.source_definition)
+        extractor.wikimedia_api_call = mock.Mock(
+            side_effect=self.wikimedia_api_call)
+        extractor.commons_api_call = mock.Mock(
+            side_effect=self.commons_api_call)
+
+        return extractor
+
+    def test_get_all_records(self):
+        extractor = self.get_extractor()
+        records = list(extractor.run())
+
+        expected = [self.commons_api_call(t) for t in
+                    self.titles[0] + self.titles[1] if t != 'File:1-2.jpg']
+        self.assertEqual(records, [('application/xml', r) for r in expected])
+        self.assertEqual(extractor.wikimedia_api_call.call_count, 2)
+        self.assertEqual(extractor.commons_api_call.call_count, 10)
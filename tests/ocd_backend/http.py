@@ -0,0 +1,114 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+from unittest import TestCase
+
+import mock
+from requests.exceptions import ConnectionError, HTTPError
+
+from ocd_backend.utils.http import create_http_session, get_with_retries
+
+
+def response(status_code, headers={}):
+    r = mock.Mock(status_code=status_code, headers=headers)
+    if status_code >= 400:
+        r.raise_for_status.side_effect = HTTPError(status_code)
+
+    return r
+
+
+@mock.patch('ocd_backend.utils.http.sleep')
+class GetWithRetriesTestCase(TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+
+    def test_returns_successful_response(self, sleep):
+        self.session.get.return_value = response(200)
+        r = get_with_retries(self.session, 'http://example.org',
+                             params={'q': 'test'})
+
+        self.assertEqual(r.status_code, 200)
+        self.session.get.assert_called_once_with('http://example.org',
+                                                 params={'q': 'test'})
+        self.assertFalse(sleep.called)
+
+    def test_retries_with_backoff(self, sleep):
+        self.session.get.side_effect = [response(503), ConnectionError(),
+                                        response(502), response(200)]
+        r = get_with_retries(self.session, 'http://example.org', backoff=1)
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [1, 2, 4])
+
+    def test_respects_retry_after(self, sleep):
+        self.session.get.side_effect = [
+            response(429, headers={'Retry-After': '30'}), response(200)]
+        get_with_retries(self.session, 'http://example.org')
+
+        sleep.assert_called_once_with(30)
+
+    def test_does_not_retry_client_errors(self, sleep):
+        self.session.get.return_value = response(404)
+
+        with self.assertRaises(HTTPError):
+            get_with_retries(self.session, 'http://example.org')
+        self.assertEqual(self.session.get.call_count, 1)
+
+    def test_raises_after_retries(self, sleep):
+        self.session.get.return_value = response(500)
+
+        with self.assertRaises(HTTPError):
+            get_with_retries(self.session, 'http://example.org', retries=2)
+        self.assertEqual(self.session.get.call_count, 3)
+
+    def test_waits_for_rate_limiter(self, sleep):
+        self.session.get.side_effect = [response(500), response(200)]
+        rate_limiter = mock.Mock()
+        get_with_retries(self.session, 'http://example.org',
+                         rate_limiter=rate_limiter)
+
+        self.assertEqual(rate_limiter.wait.call_count, 2)
+
+
+class UnavailableHandler(BaseHTTPRequestHandler):
+    """Responds to each request with a 503 status."""
+    requests = 0
+
+    def do_GET(self):
+        UnavailableHandler.requests += 1
+        self.send_response(503)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@mock.patch('ocd_backend.utils.http.sleep')
+class SessionRetriesTestCase(TestCase):
+    """Sends requests through the adapters of an actual session, to a
+    local server that is unavailable."""
+    def setUp(self):
+        UnavailableHandler.requests = 0
+        self.server = HTTPServer(('127.0.0.1', 0), UnavailableHandler)
+        self.url = 'http://127.0.0.1:%s/' % self.server.server_port
+
+        thread = Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_with_retries_sees_each_response(self, sleep):
+        session = create_http_session(adapter_retries=False)
+        rate_limiter = mock.Mock()
+
+        with self.assertRaises(HTTPError):
+            get_with_retries(session, self.url, rate_limiter=rate_limiter,
+                             retries=1, backoff=0)
+
+        # Each attempt is a single request, of which the rate limiter is
+        # told that it was throttled
+        self.assertEqual(UnavailableHandler.requests, 2)
+        self.assertEqual(rate_limiter.throttled.call_count, 2)
@@ -1,9 +1,13 @@
 import json
 import os.path
 
+from elasticsearch.serializer import JSONSerializer
+import mock
+
 from . import LoaderTestCase
 from ocd_backend.exceptions import ConfigurationError
-from ocd_backend.loaders import ElasticsearchLoader
+from ocd_backend.loaders import ElasticsearchLoader, BulkElasticsearchLoader
+from ocd_backend.settings import COMBINED_INDEX
 
 
 class ESLoaderTestCase(LoaderTestCase):
@@ -34,3 +38,96 @@ class ESLoaderTestCase(LoaderTestCase):
         # self.loader.run(source_definition=self.source_definition)
         self.assertRaises(ConfigurationError, self.loader.run,
                           source_definition=self.source_definition)
+
+    @mock.patch('ocd_backend.loaders.elasticsearch')
+    def test_delete(self, es):
+        self.loader.delete(u'oai:test:1', new_index_name='ocd_test',
+                           source_definition=self.source_definition)
+
+        indices = [c[1]['index'] for c in es.delete_by_query.call_args_list]
+        self.assertEqual(sorted(indices), sorted([COMBINED_INDEX, 'ocd_test']))
+
+        query = es.delete_by_query.call_args[1]['body']
+        self.assertEqual(query['query']['filtered']['filter']['and'], [
+            {'term': {'meta.source_id': 'test_definition'}},
+            {'term': {'meta.original_object_id': u'oai:test:1'}}
+        ])
+
+
+class BulkESLoaderTestCase(ESLoaderTestCase):
+    def setUp(self):
+        super(BulkESLoaderTestCase, self).setUp()
+        self.loader = BulkElasticsearchLoader()
+        self.index_doc['enrichments'] = {}
+        self.item = (self.object_id, self.combined_index_doc, self.index_doc)
+
+    @mock.patch('ocd_backend.loaders.elasticsearch')
+    def test_single_bulk_request(self, es):
+        es.transport.serializer = JSONSerializer()
+        es.bulk.return_value = {'errors': False, 'items': []}
+
+        self.loader.run([self.item, self.item], batch=True,
+                        source_definition=self.source_definition,
+                        new_index_name='ocd_test')
+
+        self.assertEqual(es.bulk.call_count, 1)
+        self.assertFalse(es.index.called)
+        self.assertFalse(es.create.called)
+
+        # Two items, each with a combined index document, a source index
+        # document and a resolver document per media url
+        docs_per_item = 2 + len(self.index_doc['media_urls'])
+        body = es.bulk.call_args[1]['body']
+        self.assertEqual(len(body.splitlines()), 2 * 2 * docs_per_item)
+
+    @mock.patch('ocd_backend.loaders.elasticsearch')
+    def test_flush_docs(self, es):
+        es.transport.serializer = JSONSerializer()
+        es.bulk.return_value = {'errors': False, 'items': []}
+        self.source_definition['bulk_flush_docs'] = 1
+
+        self.loader.run([self.item, self.item], batch=True,
+                        source_definition=self.source_definition,
+                        new_index_name='ocd_test')
+
+        self.assertEqual(es.bulk.call_count, 2)
+
+    @mock.patch('ocd_backend.mixins.record_dead_letters')
+    @mock.patch('ocd_backend.loaders.elasticsearch')
+    def test_document_errors_do_not_fail_batch(self, es, record_dead_letters):
+        es.transport.serializer = JSONSerializer()
+        other_item = ('other', dict(self.combined_index_doc),
+                      dict(self.index_doc, media_urls=[]))
+        results = [
+            # The combined index and source index documents of the item
+            {'index': {'_index': COMBINED_INDEX, '_id': '1', 'status': 201}},
+            {'index': {'_index': 'ocd_test', '_id': '1', 'status': 400,
+                       'error': 'MapperParsingException'}}
+        ]
+        # The resolver documents of the item
+        results += [{'create': {'_index': 'ocd_resolver', '_id': '2',
+                                'status': 409,
+                                'error': 'DocumentAlreadyExistsException'}}
+                    for _ in self.index_doc['media_urls']]
+        # The documents of the other item
+        results += [
+            {'index': {'_index': COMBINED_INDEX, '_id': '3', 'status': 201}},
+            {'index': {'_index': 'ocd_test', '_id': '3', 'status': 201}}
+        ]
+        es.bulk.return_value = {'errors': True, 'items': results}
+
+        loaded = self.loader.run([self.item, other_item], batch=True,
+                                 source_definition=self.source_definition,
+                                 new_index_name='ocd_test',
+                                 run_identifier='test_run',
+                                 record_metrics=False)
+
+        self.assertEqual(es.bulk.call_count, 1)
+        self.assertEqual(len(loaded), 2)
+
+        # Only the item with the failed document is dead-lettered
+        record_dead_letters.assert_called_once_with(
+            'test_run', 'test_definition', 'loader', [self.item], mock.ANY,
+            None, enricher_index=None)
+        exc = record_dead_letters.call_args[0][4]
+        self.assertIn('MapperParsingException', str(exc))
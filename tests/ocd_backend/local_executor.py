@@ -0,0 +1,99 @@
+import os
+import os.path
+from unittest import TestCase
+
+from ocd_backend.exceptions import WorkerLost
+from ocd_backend.loaders import BaseLoader
+from ocd_backend.local_executor import LocalExecutor
+from ocd_backend.transformers import BaseTransformer
+
+
+class MemoryLoader(BaseLoader):
+    """Keeps the loaded items in memory, instead of indexing them."""
+    loaded_items = []
+
+    def load_item(self, object_id, combined_index_doc, doc):
+        self.loaded_items.append(object_id)
+
+
+class FailingTransformer(BaseTransformer):
+    """Fails to transform any batch."""
+    def run(self, *args, **kwargs):
+        raise ValueError('Unable to transform batch')
+
+
+class ExitingTransformer(BaseTransformer):
+    """Exits the worker process, like a worker that is killed."""
+    def run(self, *args, **kwargs):
+        os._exit(1)
+
+
+class LocalExecutorTestCase(TestCase):
+    def setUp(self):
+        self.PWD = os.path.dirname(__file__)
+        with open(os.path.join(self.PWD, 'test_dumps/item.json'), 'r') as f:
+            self.item = ('application/json', f.read())
+
+        self.source_definition = {
+            'id': 'test_definition',
+            'extractor': 'ocd_backend.extractors.staticfile.'
+                         'StaticJSONDumpExtractor',
+            'transformer': 'ocd_backend.transformers.BaseTransformer',
+            'item': 'ocd_backend.items.LocalDumpItem',
+            'loader': 'tests.ocd_backend.local_executor.MemoryLoader',
+            'enrichers': [],
+            'batch_size': 2
+        }
+        self.params = {'run_identifier': 'pipeline_test'}
+
+        MemoryLoader.loaded_items = []
+
+    def test_run(self):
+        executor = LocalExecutor(self.source_definition, self.params,
+                                 processes=2)
+        loaded_items = executor.run(iter([self.item] * 5))
+
+        self.assertEqual(loaded_items, 5)
+        self.assertEqual(len(MemoryLoader.loaded_items), 5)
+
+    def test_failing_items_are_skipped(self):
+        executor = LocalExecutor(self.source_definition, self.params,
+                                 processes=2)
+        items = [self.item, ('application/test', self.item[1]), self.item]
+
+        self.assertEqual(executor.run(iter(items)), 2)
+        self.assertEqual(executor.failed_items, 1)
+
+    def test_batch_of_failing_items_is_counted(self):
+        executor = LocalExecutor(self.source_definition, self.params,
+                                 processes=2)
+        items = [('application/test', self.item[1])] * 2
+
+        self.assertEqual(executor.run(iter(items)), 0)
+        self.assertEqual(executor.failed_items, 2)
+
+    def test_extractor_exception_is_raised(self):
+        def extract():
+            yield self.item
+            raise ValueError('Source unavailable')
+
+        executor = LocalExecutor(self.source_definition, self.params,
+                                 processes=2)
+        self.assertRaises(ValueError, executor.run, extract())
+
+    def test_failed_batches_are_counted(self):
+        self.source_definition['transformer'] = \
+            'tests.ocd_backend.local_executor.FailingTransformer'
+        executor = LocalExecutor(self.source_definition, self.params,
+                                 processes=2)
+
+        self.assertEqual(executor.run(iter([self.item] * 5)), 0)
+        self.assertEqual(executor.failed_items, 5)
+
+    def test_lost_worker_is_detected(self):
+        self.source_definition['transformer'] = \
+            'tests.ocd_backend.local_executor.ExitingTransformer'
+        executor = LocalExecutor(self.source_definition, self.params,
+                                 processes=2)
+
+        self.assertRaises(WorkerLost, executor.run, iter([self.item] * 5))
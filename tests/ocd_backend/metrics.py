@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+import mock
+
+from ocd_backend import settings
+from ocd_backend.metrics import (StageMetrics, percentile, estimate_backlog,
+                                 measure_extraction)
+from ocd_backend.transformers import BaseTransformer
+
+
+class StageMetricsTestCase(TestCase):
+    def test_add(self):
+        metrics = StageMetrics()
+        metrics.add(0.003)
+        metrics.add(0.2)
+        metrics.add(0.2, error=True)
+
+        self.assertEqual(metrics.count, 2)
+        self.assertEqual(metrics.errors, 1)
+        self.assertAlmostEqual(metrics.seconds, 0.403)
+        self.assertEqual(sum(metrics.buckets), 3)
+        self.assertLessEqual(metrics.first, metrics.last)
+
+    def test_percentile(self):
+        metrics = StageMetrics()
+        for _ in range(90):
+            metrics.add(0.003)
+        for _ in range(10):
+            metrics.add(3)
+
+        self.assertEqual(percentile(metrics.buckets, 0.5), 0.005)
+        self.assertEqual(percentile(metrics.buckets, 0.95), 5)
+
+        metrics.add(settings.METRICS_LATENCY_BUCKETS[-1] + 1)
+        self.assertIsNone(percentile(metrics.buckets, 1.0))
+
+    def test_estimate_backlog(self):
+        stages = {
+            'extractor': {'count': 100, 'errors': 0},
+            'transformer': {'count': 95, 'errors': 5},
+            'loader': {'count': 45, 'errors': 0, 'seconds': 4.5,
+                       'buckets': [], 'first': 0.0, 'last': 10.0}
+        }
+        backlog, eta = estimate_backlog(stages)
+
+        self.assertEqual(backlog, 50)
+        self.assertAlmostEqual(eta, 50 / 4.5)
+
+    @mock.patch('ocd_backend.metrics.record_metrics')
+    def test_measure_extraction(self, record_metrics):
+        items = list(measure_extraction(iter(range(3)), 'pipeline_test',
+                                        'test_source'))
+
+        self.assertEqual(items, range(3))
+        stages = record_metrics.call_args[0][2]
+        self.assertEqual(stages['extractor'].count, 3)
+
+
+class MetricsMixinTestCase(TestCase):
+    def setUp(self):
+        self.source_definition = {
+            'id': 'test_source',
+            'item': 'ocd_backend.items.LocalDumpItem'
+        }
+        self.transformer = BaseTransformer()
+
+    @mock.patch('ocd_backend.mixins.record_metrics')
+    def test_task_records_errors(self, record_metrics):
+        self.transformer.run([('application/test', '{}')], batch=True,
+                             run_identifier='pipeline_test',
+                             source_definition=self.source_definition)
+
+        run_identifier, source_id, stages = record_metrics.call_args[0]
+        self.assertEqual(run_identifier, 'pipeline_test')
+        self.assertEqual(source_id, 'test_source')
+        self.assertEqual(stages['transformer'].errors, 1)
+
+    @mock.patch('ocd_backend.mixins.record_metrics')
+    def test_record_metrics_disabled(self, record_metrics):
+        self.transformer.run([], batch=True, record_metrics=False,
+                             source_definition=self.source_definition)
+
+        self.assertFalse(record_metrics.called)
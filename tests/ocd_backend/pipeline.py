@@ -0,0 +1,394 @@
+from unittest import TestCase
+
+import mock
+
+from ocd_backend import settings
+from ocd_backend.exceptions import RunStalled
+from ocd_backend.extractors import BaseExtractor
+from ocd_backend.pipeline import (UnchangedItemsFilter, setup_pipeline,
+                                  resume_pipeline, _run_pipeline,
+                                  _wait_for_workers)
+from ocd_backend.utils.misc import hash_raw_item
+
+
+class UnchangedItemsFilterTestCase(TestCase):
+    def setUp(self):
+        self.items = [('application/json', '{"id": %d}' % i)
+                      for i in range(3)]
+        self.params = {
+            'current_index_name': 'ocd_test_1',
+            'new_index_name': 'ocd_test_2'
+        }
+
+        # The second item is already indexed
+        unchanged_hash = hash_raw_item(*self.items[1])
+        self.search_result = {'hits': {'hits': [{
+            '_id': 'object_1',
+            '_source': {'meta': {'hash': unchanged_hash}}
+        }]}}
+
+    @mock.patch('ocd_backend.pipeline.es_helpers')
+    @mock.patch('ocd_backend.pipeline.es')
+    def test_skips_unchanged_items(self, es, es_helpers):
+        es.search.return_value = self.search_result
+        items_filter = UnchangedItemsFilter(self.params)
+
+        items = list(items_filter.filter(iter(self.items)))
+        self.assertEqual(items, [self.items[0], self.items[2]])
+        self.assertEqual(items_filter.reused_items, 1)
+
+        # The document of the unchanged item is copied to the new index
+        copied = list(es_helpers.bulk.call_args[0][1])
+        self.assertEqual(copied, [{
+            '_index': 'ocd_test_2', '_type': 'item', '_id': 'object_1',
+            '_source': {'meta': {'hash': hash_raw_item(*self.items[1])}}
+        }])
+
+    @mock.patch('ocd_backend.pipeline.es_helpers')
+    @mock.patch('ocd_backend.pipeline.es')
+    def test_incremental_run_does_not_copy(self, es, es_helpers):
+        es.search.return_value = self.search_result
+        self.params['new_index_name'] = self.params['current_index_name']
+        items_filter = UnchangedItemsFilter(self.params)
+
+        self.assertEqual(len(list(items_filter.filter(iter(self.items)))), 2)
+        self.assertEqual(items_filter.reused_items, 1)
+        self.assertFalse(es_helpers.bulk.called)
+
+
+@mock.patch('ocd_backend.pipeline._run_pipeline')
+@mock.patch('ocd_backend.pipeline.store_run_context')
+@mock.patch('ocd_backend.pipeline.es')
+class SetupPipelineTestCase(TestCase):
+    def setUp(self):
+        self.source_definition = {'id': 'test'}
+
+    def test_new_index_is_created_with_build_settings(self, es,
+                                                      store_run_context,
+                                                      run_pipeline):
+        es.indices.get_alias.return_value = {'ocd_test_20150101000000': {}}
+        es.indices.get_settings.side_effect = lambda index: {index: {
+            'settings': {'index': {'number_of_replicas': '2',
+                                   'number_of_shards': '1'}}}}
+        setup_pipeline(self.source_definition)
+
+        params = run_pipeline.call_args[0][1]
+        es.indices.create.assert_called_once_with(
+            index=params['new_index_name'])
+        es.indices.put_settings.assert_called_once_with(
+            index=params['new_index_name'],
+            body={'index': settings.ES_BUILD_INDEX_SETTINGS})
+
+        # The settings the index got from the template are stored with the
+        # run, to be restored when the run is finished
+        self.assertEqual(params['index_settings'],
+                         {'number_of_replicas': '2', 'refresh_interval': '1s'})
+        self.assertEqual(store_run_context.call_args[0][1], params)
+
+    @mock.patch('ocd_backend.pipeline._can_harvest_incrementally',
+                return_value=True)
+    def test_incremental_run_does_not_create_index(self, can_harvest, es,
+                                                   store_run_context,
+                                                   run_pipeline):
+        es.indices.get_alias.return_value = {'ocd_test_20150101000000': {}}
+        setup_pipeline(self.source_definition, incremental=True)
+
+        self.assertFalse(es.indices.create.called)
+
+
+@mock.patch('ocd_backend.pipeline._run_pipeline')
+@mock.patch('ocd_backend.pipeline.get_run_context')
+@mock.patch('ocd_backend.pipeline.es')
+class ResumePipelineTestCase(TestCase):
+    def setUp(self):
+        self.params = {
+            'run_identifier': 'test_run',
+            'current_index_name': 'ocd_test_1',
+            'new_index_name': 'ocd_test_2',
+            'index_alias': 'ocd_test'
+        }
+
+    @mock.patch('ocd_backend.pipeline.store_run_context')
+    def test_removed_index_is_created_again(self, store_run_context, es,
+                                            get_run_context, run_pipeline):
+        get_run_context.return_value = {'source_definition': {'id': 'test'},
+                                        'params': self.params}
+        es.indices.exists.return_value = False
+        es.indices.get_settings.return_value = {'ocd_test_2': {
+            'settings': {'index': {'number_of_replicas': '1',
+                                   'refresh_interval': '5s'}}}}
+        resume_pipeline('test_run')
+
+        es.indices.create.assert_called_once_with(index='ocd_test_2')
+        es.indices.put_settings.assert_called_once_with(
+            index='ocd_test_2',
+            body={'index': settings.ES_BUILD_INDEX_SETTINGS})
+        self.assertEqual(store_run_context.call_args[0][1]['index_settings'],
+                         {'number_of_replicas': '1', 'refresh_interval': '5s'})
+        self.assertTrue(run_pipeline.called)
+
+    def test_existing_index_is_reused(self, es, get_run_context,
+                                      run_pipeline):
+        get_run_context.return_value = {'source_definition': {'id': 'test'},
+                                        'params': self.params}
+        es.indices.exists.return_value = True
+        resume_pipeline('test_run')
+
+        self.assertFalse(es.indices.create.called)
+
+
+@mock.patch('ocd_backend.pipeline.sleep')
+@mock.patch('ocd_backend.pipeline.celery_app')
+class WaitForWorkersTestCase(TestCase):
+    def test_does_not_pause_below_limit(self, celery_app, sleep):
+        celery_app.backend.get_pending.return_value = 8
+        _wait_for_workers('test_run', 8)
+
+        self.assertFalse(sleep.called)
+
+    def test_resumes_at_three_quarters_of_limit(self, celery_app, sleep):
+        celery_app.backend.get_pending.side_effect = [10, 9, 7, 6]
+        celery_app.backend.get.return_value = 'running'
+        _wait_for_workers('test_run', 8)
+
+        # Extraction resumes once 6 (3/4 of 8) chains are pending
+        self.assertEqual(celery_app.backend.get_pending.call_count, 4)
+        self.assertEqual(sleep.call_count, 3)
+
+    def test_aborts_when_run_failed(self, celery_app, sleep):
+        celery_app.backend.get_pending.return_value = 10
+        celery_app.backend.get.return_value = 'error'
+
+        self.assertRaises(RunStalled, _wait_for_workers, 'test_run', 8)
+
+    @mock.patch('ocd_backend.pipeline.time')
+    def test_aborts_after_max_wait(self, time, celery_app, sleep):
+        celery_app.backend.get_pending.return_value = 10
+        celery_app.backend.get.return_value = 'running'
+        clock = [0]
+        time.side_effect = lambda: clock[0]
+
+        def advance(seconds):
+            clock[0] += settings.PIPELINE_BACKPRESSURE_MAX_WAIT / 2
+        sleep.side_effect = advance
+
+        self.assertRaises(RunStalled, _wait_for_workers, 'test_run', 8)
+        self.assertEqual(sleep.call_count, 2)
+
+
+@mock.patch('ocd_backend.pipeline.measure_extraction', lambda items, *a: items)
+@mock.patch('ocd_backend.pipeline._build_chain',
+            lambda item, *args: mock.Mock(item=item))
+@mock.patch('ocd_backend.pipeline.celery_app')
+@mock.patch('ocd_backend.pipeline.load_object')
+class RunPipelineTestCase(TestCase):
+    def setUp(self):
+        self.source_definition = {
+            'id': 'test',
+            'extractor': 'extractor',
+            'transformer': 'transformer',
+            'enrichers': [],
+            'loader': 'loader',
+            'cleanup': 'cleanup'
+        }
+        self.params = {
+            'run_identifier': 'test_run',
+            'current_index_name': 'ocd_test_1',
+            'new_index_name': 'ocd_test_2',
+            'index_alias': 'ocd_test'
+        }
+
+    def set_items(self, load_object, items):
+        extractor = mock.Mock()
+        extractor.return_value.run.return_value = iter(items)
+        extractor.return_value.incremental = False
+        load_object.side_effect = lambda path: {
+            'extractor': extractor
+        }.get(path, mock.Mock())
+
+    @mock.patch('ocd_backend.pipeline._wait_for_workers')
+    def test_resumes_below_small_limit(self, wait_for_workers, load_object,
+                                       celery_app):
+        self.source_definition['max_pending_chains'] = 10
+        self.set_items(load_object, [('application/json', '{}')] * 12)
+
+        with mock.patch.object(settings, 'PIPELINE_DISPATCH_GROUP_SIZE', 100):
+            _run_pipeline(self.source_definition, self.params)
+
+        # Chains are dispatched in groups of half the limit, so extraction
+        # resumes while 5 chains are still pending
+        increments = [c[0][1] for c in
+                      celery_app.backend.increment_pending.call_args_list]
+        self.assertEqual(increments, [5, 5, 2])
+        wait_for_workers.assert_called_with('test_run', 5)
+
+
+class FakeBackend(object):
+    """Keeps the state of runs in memory, like the result backend."""
+    def __init__(self):
+        self.values = {}
+        self.pending = 0
+        self.items = 0
+        self.finished = False
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+    get_json = get
+
+    def set_json(self, key, value, ttl=None):
+        self.values[key] = value
+
+    def increment_pending(self, run_identifier, amount=1):
+        self.pending += amount
+        self.items += amount
+
+    def decrement_pending(self, run_identifier):
+        self.pending -= 1
+
+    def add_run_items(self, run_identifier, amount):
+        self.items += amount
+
+    def get_run_items(self, run_identifier):
+        return self.items
+
+    def mark_run_done(self, run_identifier):
+        self.values[run_identifier] = 'done'
+        if self.pending <= 0 and not self.finished:
+            self.finished = True
+            return True
+        return False
+
+
+class PagedExtractor(BaseExtractor):
+    """Yields three pages of three items, and stores a checkpoint after
+    each page. Fails once, before the page at ``failing_page``."""
+    pages = [[('application/json', '{"id": %d}' % (page * 3 + i))
+              for i in range(3)] for page in range(3)]
+    failing_page = None
+
+    def run(self):
+        checkpoint = self.get_checkpoint() or {}
+        for page in range(checkpoint.get('pages', 0), len(self.pages) + 1):
+            if page == PagedExtractor.failing_page:
+                PagedExtractor.failing_page = None
+                raise IOError('Unable to retrieve page %d' % page)
+
+            if page == len(self.pages):
+                return
+
+            for item in self.pages[page]:
+                yield item
+
+            self.save_checkpoint({'pages': page + 1})
+
+
+@mock.patch('ocd_backend.pipeline.measure_extraction', lambda items, *a: items)
+@mock.patch('ocd_backend.pipeline.es')
+class ResumeRunTestCase(TestCase):
+    def setUp(self):
+        self.source_definition = {
+            'id': 'test',
+            'extractor': 'extractor',
+            'transformer': 'transformer',
+            'enrichers': [],
+            'loader': 'loader',
+            'cleanup': 'cleanup',
+            'batch_size': 2,
+            'skip_unchanged': True
+        }
+        self.params = {
+            'run_identifier': 'test_run',
+            'current_index_name': 'ocd_test_1',
+            'new_index_name': 'ocd_test_2',
+            'index_alias': 'ocd_test'
+        }
+
+        self.backend = FakeBackend()
+        self.cleanup = mock.Mock()
+        objects = {'extractor': PagedExtractor, 'cleanup': self.cleanup}
+
+        # The workers process each chain as soon as it is dispatched
+        self.dispatched = []
+
+        def build_chain(item, *args):
+            item_chain = mock.Mock()
+            item_chain.delay.side_effect = lambda: (
+                self.dispatched.extend(item[0]),
+                self.backend.decrement_pending('test_run'))
+            return item_chain
+
+        celery_app = mock.Mock(backend=self.backend)
+        self.patches = [
+            mock.patch('ocd_backend.pipeline.celery_app', celery_app),
+            mock.patch('ocd_backend.extractors.celery_app', celery_app),
+            mock.patch('ocd_backend.pipeline.load_object',
+                       lambda path: objects.get(path, mock.Mock())),
+            mock.patch('ocd_backend.pipeline._build_chain', build_chain)
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        PagedExtractor.failing_page = None
+
+    def run_pipeline(self, es):
+        es.search.return_value = {'hits': {'hits': []}}
+        _run_pipeline(self.source_definition, self.params)
+
+    def test_resume_after_failing_page(self, es):
+        PagedExtractor.failing_page = 2
+        self.assertRaises(IOError, self.run_pipeline, es)
+
+        # The items of the pages before the failure were dispatched, even
+        # though they were still held by the filter of unchanged items
+        # and by an incomplete batch
+        self.assertEqual(self.dispatched, PagedExtractor.pages[0] +
+                         PagedExtractor.pages[1])
+        self.assertEqual(self.backend.get('test_run'), 'error')
+        self.assertFalse(self.cleanup.return_value.finish.called)
+        self.assertFalse(es.indices.delete.called)
+
+        self.run_pipeline(es)
+
+        self.assertEqual(self.dispatched, sum(PagedExtractor.pages, []))
+        self.assertEqual(self.cleanup.return_value.finish.call_count, 1)
+
+    def test_resume_without_new_items_finishes_run(self, es):
+        PagedExtractor.failing_page = 3
+        self.assertRaises(IOError, self.run_pipeline, es)
+        self.assertFalse(self.cleanup.return_value.finish.called)
+
+        # All pages were extracted before the run failed, so the resumed
+        # run doesn't dispatch any items, but the run is finished
+        self.run_pipeline(es)
+
+        self.assertEqual(self.dispatched, sum(PagedExtractor.pages, []))
+        self.assertEqual(self.cleanup.return_value.finish.call_count, 1)
+
+    def test_failed_run_without_items_removes_index(self, es):
+        PagedExtractor.failing_page = 0
+        self.assertRaises(IOError, self.run_pipeline, es)
+
+        es.indices.delete.assert_called_once_with(index='ocd_test_2',
+                                                  ignore=404)
+
+    def test_run_without_items_removes_index(self, es):
+        with mock.patch.object(PagedExtractor, 'pages', []):
+            self.run_pipeline(es)
+
+        self.assertFalse(self.cleanup.return_value.finish.called)
+        es.indices.delete.assert_called_once_with(index='ocd_test_2',
+                                                  ignore=404)
+
+    def test_incremental_run_keeps_index(self, es):
+        self.params['new_index_name'] = self.params['current_index_name']
+        with mock.patch.object(PagedExtractor, 'pages', []):
+            self.run_pipeline(es)
+
+        self.assertFalse(es.indices.delete.called)
@@ -0,0 +1,81 @@
+import os
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+import mock
+
+from ocd_backend.items import LocalDumpItem
+from ocd_backend.registry import WorkerRegistry
+
+
+class WorkerRegistryTestCase(TestCase):
+    def setUp(self):
+        self.sources_config = NamedTemporaryFile(suffix='.json', delete=False)
+        self.sources_config.write('[]')
+        self.sources_config.close()
+
+        self.registry = WorkerRegistry(self.sources_config.name)
+        self.source_definition = {
+            'id': 'test_source',
+            'item': 'ocd_backend.items.LocalDumpItem'
+        }
+
+    def tearDown(self):
+        os.remove(self.sources_config.name)
+
+    def test_get_item_class(self):
+        self.assertIs(self.registry.get_item_class(self.source_definition),
+                      LocalDumpItem)
+
+    def test_http_session_is_reused(self):
+        session = self.registry.get_http_session('test_source')
+        self.assertIs(self.registry.get_http_session('test_source'), session)
+        self.assertIsNot(self.registry.get_http_session('other_source'),
+                         session)
+
+    def test_http_session_per_pool_size(self):
+        session = self.registry.get_http_session('test_source')
+        large_session = self.registry.get_http_session('test_source',
+                                                       pool_maxsize=50)
+
+        self.assertIsNot(large_session, session)
+        self.assertIs(self.registry.get_http_session('test_source',
+                                                     pool_maxsize=50),
+                      large_session)
+        self.assertEqual(
+            large_session.get_adapter('http://example.org')._pool_maxsize, 50)
+
+        self.registry.invalidate('test_source')
+        self.assertIsNot(self.registry.get_http_session('test_source',
+                                                        pool_maxsize=50),
+                         large_session)
+
+    def test_http_session_without_retries(self):
+        session = self.registry.get_http_session('test_source')
+        plain_session = self.registry.get_http_session('test_source',
+                                                       adapter_retries=False)
+
+        self.assertIsNot(plain_session, session)
+        self.assertEqual(plain_session.get_adapter('http://example.org')
+                         .max_retries.total, 0)
+
+    def test_invalidate_source(self):
+        session = self.registry.get_http_session('test_source')
+        other_session = self.registry.get_http_session('other_source')
+        self.registry.invalidate('test_source')
+
+        self.assertIsNot(self.registry.get_http_session('test_source'),
+                         session)
+        self.assertIs(self.registry.get_http_session('other_source'),
+                      other_session)
+
+    @mock.patch('ocd_backend.registry.settings')
+    def test_modified_sources_config_clears_registry(self, settings):
+        settings.REGISTRY_CHECK_INTERVAL = 0
+        session = self.registry.get_http_session('test_source')
+
+        mtime = os.path.getmtime(self.sources_config.name) + 10
+        os.utime(self.sources_config.name, (mtime, mtime))
+
+        self.assertIsNot(self.registry.get_http_session('test_source'),
+                         session)
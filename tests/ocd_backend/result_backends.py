@@ -0,0 +1,159 @@
+from unittest import TestCase, SkipTest
+
+import mock
+from redis.exceptions import ConnectionError
+
+from ocd_backend import celery_app, settings
+from ocd_backend.metrics import StageMetrics
+from ocd_backend.result_backends import (OCDRedisBackend,
+                                         DECREMENT_PENDING_SCRIPT,
+                                         MARK_RUN_DONE_SCRIPT,
+                                         RECORD_TIMESTAMPS_SCRIPT)
+
+# The run keys are written to a separate database, so the tests don't
+# touch the state of actual runs
+TEST_REDIS_URL = 'redis://127.0.0.1:6379/15'
+
+
+class OCDRedisBackendScriptsTestCase(TestCase):
+    """Runs the scripts that track the completion of runs against Redis.
+    The tests are skipped when Redis is not available."""
+    @classmethod
+    def setUpClass(cls):
+        cls.backend = OCDRedisBackend(app=celery_app, url=TEST_REDIS_URL)
+        try:
+            cls.backend.client.ping()
+        except ConnectionError:
+            raise SkipTest('Redis is not available at %s' % TEST_REDIS_URL)
+
+    def setUp(self):
+        self.run_identifier = 'test_run'
+        self.keys = self.backend._run_keys(self.run_identifier)
+        self.backend.client.delete(*self.keys)
+        self.backend.client.delete('test_run_items', 'test_run_metrics')
+        self.backend.set(self.run_identifier, 'running')
+
+    def tearDown(self):
+        self.backend.client.delete(*self.keys)
+        self.backend.client.delete('test_run_items', 'test_run_metrics')
+
+    def test_grouped_increments(self):
+        self.backend.increment_pending(self.run_identifier, 100)
+        self.backend.increment_pending(self.run_identifier, 20)
+
+        self.assertEqual(self.backend.get_pending(self.run_identifier), 120)
+        self.assertEqual(self.backend.get_run_items(self.run_identifier), 120)
+        self.assertGreater(self.backend.client.ttl('test_run_pending'), 0)
+        self.assertGreater(self.backend.client.ttl('test_run_items'),
+                           self.backend._run_ttl())
+
+    def test_decrements_before_done(self):
+        self.backend.increment_pending(self.run_identifier, 2)
+
+        # The run is still running, so finished chains don't finish it
+        self.assertFalse(self.backend.decrement_pending(self.run_identifier))
+        self.assertFalse(self.backend.decrement_pending(self.run_identifier))
+
+        self.assertTrue(self.backend.mark_run_done(self.run_identifier))
+        self.assertEqual(self.backend.get(self.run_identifier), 'done')
+
+    def test_done_before_last_decrement(self):
+        self.backend.increment_pending(self.run_identifier, 2)
+        self.assertFalse(self.backend.decrement_pending(self.run_identifier))
+
+        self.assertFalse(self.backend.mark_run_done(self.run_identifier))
+
+        # The last chain finishes the run
+        self.assertTrue(self.backend.decrement_pending(self.run_identifier))
+
+    def test_run_is_finished_once(self):
+        self.backend.increment_pending(self.run_identifier, 1)
+        self.assertFalse(self.backend.mark_run_done(self.run_identifier))
+        self.assertTrue(self.backend.decrement_pending(self.run_identifier))
+
+        # Neither a late chain (such as a replayed dead letter) nor marking
+        # the run as done again finishes the run a second time
+        self.backend.increment_pending(self.run_identifier, 1)
+        self.assertFalse(self.backend.decrement_pending(self.run_identifier))
+        self.assertFalse(self.backend.mark_run_done(self.run_identifier))
+
+    def test_metrics_keep_earliest_and_latest_timestamps(self):
+        def stage_metrics(first, last):
+            metrics = StageMetrics().to_dict()
+            metrics.update({'count': 1, 'first': first, 'last': last})
+            return {'loader': metrics}
+
+        # The worker that flushes last processed the earliest items
+        self.backend.record_metrics(self.run_identifier, 'test',
+                                    stage_metrics(1000.25, 1500.5))
+        self.backend.record_metrics(self.run_identifier, 'test',
+                                    stage_metrics(900.125, 1200.75))
+
+        metrics = self.backend.get_metrics(self.run_identifier)
+        self.assertEqual(metrics['stages']['loader']['count'], 2)
+        self.assertEqual(metrics['stages']['loader']['first'], 900.125)
+        self.assertEqual(metrics['stages']['loader']['last'], 1500.5)
+
+
+@mock.patch.object(OCDRedisBackend, 'client', new_callable=mock.PropertyMock)
+class OCDRedisBackendClientTestCase(TestCase):
+    """Checks the commands that are sent to a mocked Redis client."""
+    def setUp(self):
+        self.backend = OCDRedisBackend(app=celery_app, url=TEST_REDIS_URL)
+        self.keys = ['test_run', 'test_run_pending', 'test_run_finished']
+        self.args = [self.backend._run_ttl(), 'done']
+
+    def test_increment_pending_sends_single_pipeline(self, client):
+        pipe = client.return_value.pipeline.return_value
+        self.backend.increment_pending('test_run', 100)
+
+        pipe.incrby.assert_has_calls([mock.call('test_run_pending', 100),
+                                      mock.call('test_run_items', 100)])
+        pipe.expire.assert_has_calls([
+            mock.call('test_run_pending', self.backend._run_ttl()),
+            mock.call('test_run_items', settings.PIPELINE_RUN_STATE_TTL)
+        ])
+        pipe.execute.assert_called_once_with()
+
+    def test_decrement_pending(self, client):
+        script = client.return_value.register_script.return_value
+        script.side_effect = [0, 1]
+
+        self.assertFalse(self.backend.decrement_pending('test_run'))
+        self.assertTrue(self.backend.decrement_pending('test_run'))
+
+        # The script is registered once
+        client.return_value.register_script.assert_called_once_with(
+            DECREMENT_PENDING_SCRIPT)
+        script.assert_called_with(keys=self.keys, args=self.args)
+
+    def test_mark_run_done(self, client):
+        script = client.return_value.register_script.return_value
+        script.side_effect = [1, 0]
+
+        self.assertTrue(self.backend.mark_run_done('test_run'))
+        self.assertFalse(self.backend.mark_run_done('test_run'))
+
+        client.return_value.register_script.assert_called_once_with(
+            MARK_RUN_DONE_SCRIPT)
+        script.assert_called_with(keys=self.keys, args=self.args)
+
+    def test_record_metrics_compares_timestamps(self, client):
+        pipe = client.return_value.pipeline.return_value
+        script = client.return_value.register_script.return_value
+        metrics = StageMetrics().to_dict()
+        metrics.update({'first': 1445000000.123456, 'last': 1445000060.5})
+
+        self.backend.record_metrics('test_run', 'test', {'loader': metrics})
+
+        # The timestamps are sent in the same pipeline as the counters,
+        # without losing their precision
+        client.return_value.register_script.assert_called_once_with(
+            RECORD_TIMESTAMPS_SCRIPT)
+        script.assert_called_once_with(
+            keys=['test_run_metrics'],
+            args=['loader|first', '1445000000.123456',
+                  'loader|last', '1445000060.5'],
+            client=pipe)
+        self.assertFalse(pipe.hsetnx.called)
+        pipe.execute.assert_called_once_with()
@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+from ocd_backend import celery_app
+from ocd_backend.enrichers import BaseEnricher
+from ocd_backend.routers import PipelineStageRouter
+
+
+class RoutedEnricher(BaseEnricher):
+    pass
+
+
+class PipelineStageRouterTestCase(TestCase):
+    def setUp(self):
+        self.router = PipelineStageRouter()
+
+    def assertQueue(self, task_name, queue):
+        self.assertEqual(self.router.route_for_task(task_name),
+                         {'queue': queue})
+
+    def test_route_stages(self):
+        self.assertQueue('ocd_backend.transformers.BaseTransformer',
+                         'transform')
+        self.assertQueue('ocd_backend.loaders.ElasticsearchLoader', 'load')
+        self.assertQueue('ocd_backend.tasks.FusedPipeline', 'transform')
+        self.assertQueue('ocd_backend.tasks.CleanupElasticsearch', 'cleanup')
+
+    def test_route_subclass_by_base_class(self):
+        self.assertQueue(RoutedEnricher.name, 'enrich')
+
+    def test_unknown_task_uses_default_queue(self):
+        self.assertIsNone(self.router.route_for_task('unknown.Task'))
+
+    def test_queues_are_defined(self):
+        queues = set(queue.name for queue
+                     in celery_app.conf.CELERY_QUEUES)
+        for _, queue in self.router.stage_classes:
+            self.assertIn(queue, queues)
+
+    def test_app_uses_router(self):
+        task = celery_app.tasks['ocd_backend.loaders.ElasticsearchLoader']
+        route = celery_app.amqp.router.route({}, task.name)
+        self.assertEqual(route['queue'].name, 'load')
@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+import mock
+
+from ocd_backend.exceptions import NotFound
+from ocd_backend.run_context import (expand_task_kwargs, get_run_context,
+                                     _contexts)
+
+
+class RunContextTestCase(TestCase):
+    def setUp(self):
+        self.source_definition = {
+            'id': 'test_source',
+            'enrichers': [
+                ['ocd_backend.enrichers.media_enricher.MediaEnricher',
+                 {'tasks': ['media_type']}]
+            ]
+        }
+        self.context = {
+            'source_definition': self.source_definition,
+            'params': {
+                'run_identifier': 'pipeline_test',
+                'new_index_name': 'ocd_test_2'
+            }
+        }
+        _contexts.clear()
+
+    def test_kwargs_with_source_definition(self):
+        kwargs = {'source_definition': self.source_definition,
+                  'run_identifier': 'pipeline_test'}
+        self.assertIs(expand_task_kwargs(kwargs), kwargs)
+
+    @mock.patch('ocd_backend.run_context.celery_app')
+    def test_expand_kwargs(self, celery_app):
+        celery_app.backend.get_json.return_value = self.context
+        kwargs = expand_task_kwargs({'run_identifier': 'pipeline_test',
+                                     'enricher_index': 0})
+
+        self.assertEqual(kwargs['source_definition'], self.source_definition)
+        self.assertEqual(kwargs['new_index_name'], 'ocd_test_2')
+        self.assertEqual(kwargs['enricher_settings'],
+                         {'tasks': ['media_type']})
+
+    @mock.patch('ocd_backend.run_context.celery_app')
+    def test_context_is_cached(self, celery_app):
+        celery_app.backend.get_json.return_value = self.context
+        get_run_context('pipeline_test')
+        get_run_context('pipeline_test')
+
+        celery_app.backend.get_json.assert_called_once_with(
+            'pipeline_test_context')
+
+    @mock.patch('ocd_backend.run_context.settings')
+    @mock.patch('ocd_backend.run_context.celery_app')
+    def test_cache_is_bounded(self, celery_app, settings):
+        settings.RUN_CONTEXT_CACHE_SIZE = 2
+        celery_app.backend.get_json.return_value = self.context
+        for run_identifier in ['run_1', 'run_2', 'run_1', 'run_3']:
+            get_run_context(run_identifier)
+
+        self.assertEqual(_contexts.keys(), ['run_1', 'run_3'])
+
+    @mock.patch('ocd_backend.run_context.celery_app')
+    def test_missing_context(self, celery_app):
+        celery_app.backend.get_json.return_value = None
+        self.assertRaises(NotFound, get_run_context, 'pipeline_test')
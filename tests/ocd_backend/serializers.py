@@ -0,0 +1,88 @@
+import datetime
+from unittest import TestCase
+
+from kombu.serialization import dumps, loads
+import msgpack
+
+from ocd_backend.serializers import (encoder, decoder, compressing_encoder,
+                                     compressed_decoder, COMPRESSED_PREFIX,
+                                     DATETIME_EXT_TYPE)
+
+
+class FixedOffset(datetime.tzinfo):
+    def __init__(self, hours):
+        self.offset = datetime.timedelta(hours=hours)
+
+    def utcoffset(self, dt):
+        return self.offset
+
+
+class DatetimeSerializerTestCase(TestCase):
+    def test_datetimes_are_packed_as_ext_type(self):
+        date = datetime.datetime(2014, 11, 17, 14, 2, 48, 642602)
+        unpacked = msgpack.unpackb(encoder({'date': date}))
+        self.assertEqual(unpacked['date'].code, DATETIME_EXT_TYPE)
+
+    def test_roundtrip(self):
+        item = ['object_id', {'meta': {
+            'processing_started': datetime.datetime(2014, 11, 17, 14, 2, 48,
+                                                    642602),
+            'date': datetime.datetime(1850, 1, 1)
+        }}, {}]
+        self.assertEqual(decoder(encoder(item)), item)
+
+    def test_timezone_aware_datetimes_are_converted_to_utc(self):
+        date = datetime.datetime(2015, 1, 1, 12, tzinfo=FixedOffset(2))
+        self.assertEqual(decoder(encoder(date)),
+                         datetime.datetime(2015, 1, 1, 10))
+
+    def test_decode_legacy_datetimes(self):
+        document = msgpack.packb({
+            'started': {'__datetime__': True,
+                        'as_str': '2014-11-17T14:02:48.642602'},
+            'date': {'__datetime__': True, 'as_str': '2012-06-12T00:00:00'}
+        })
+        self.assertEqual(decoder(document), {
+            'started': datetime.datetime(2014, 11, 17, 14, 2, 48, 642602),
+            'date': datetime.datetime(2012, 6, 12)
+        })
+
+    def test_unsupported_type(self):
+        with self.assertRaises(TypeError):
+            encoder({'value': object()})
+
+
+class CompressingSerializerTestCase(TestCase):
+    def setUp(self):
+        self.encode = compressing_encoder(threshold=1024)
+        self.small = {'args': ['application/xml', '<record/>']}
+        self.large = {
+            'args': ['application/xml', '<record>%s</record>' % ('x' * 4096)],
+            'kwargs': {'date': datetime.datetime(2015, 1, 2, 3, 4, 5)}
+        }
+
+    def test_small_documents_are_not_compressed(self):
+        self.assertEqual(self.encode(self.small), encoder(self.small))
+
+    def test_large_documents_are_compressed(self):
+        document = self.encode(self.large)
+        self.assertTrue(document.startswith(COMPRESSED_PREFIX))
+        self.assertLess(len(document), len(encoder(self.large)))
+        self.assertEqual(compressed_decoder(document), self.large)
+
+    def test_decode_uncompressed_documents(self):
+        self.assertEqual(compressed_decoder(encoder(self.large)), self.large)
+
+    def test_registered_serializers(self):
+        content_type, content_encoding, body = dumps(
+            self.large, serializer='ocd_zlib_serializer')
+        self.assertEqual(content_type, 'application/ocd-msgpack-zlib')
+        self.assertEqual(loads(body, content_type, content_encoding),
+                         self.large)
+
+        # Messages that were sent before the compressing serializer was
+        # enabled can still be decoded
+        content_type, content_encoding, body = dumps(
+            self.large, serializer='ocd_serializer')
+        self.assertEqual(loads(body, content_type, content_encoding),
+                         self.large)
@@ -0,0 +1,84 @@
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+
+import mock
+
+from ocd_backend.spool import (ItemSpool, spool_items,
+                               SPOOLED_ITEM_CONTENT_TYPE)
+from ocd_backend.tasks import BaseCleanup
+from ocd_backend.transformers import BaseTransformer
+from ocd_backend.utils.misc import hash_raw_item
+
+
+class ItemSpoolTestCase(TestCase):
+    def setUp(self):
+        self.spool_dir = mkdtemp()
+        self.settings_patcher = mock.patch(
+            'ocd_backend.settings.SPOOL_DIR_PATH', self.spool_dir)
+        self.settings_patcher.start()
+
+        self.spool = ItemSpool('test_run')
+        self.item = ('application/xml', '<record>test</record>')
+
+    def tearDown(self):
+        self.settings_patcher.stop()
+        shutil.rmtree(self.spool_dir)
+
+    def test_put_get(self):
+        key = self.spool.put(*self.item)
+        self.assertEqual(key, hash_raw_item(*self.item))
+        self.assertEqual(self.spool.get(key), self.item)
+
+    def test_put_unicode(self):
+        key = self.spool.put('application/json', u'{"title": "caf\xe9"}')
+        self.assertEqual(self.spool.get(key),
+                         ('application/json', '{"title": "caf\xc3\xa9"}'))
+
+    def test_identical_items_are_stored_once(self):
+        self.assertEqual(self.spool.put(*self.item), self.spool.put(*self.item))
+        self.assertEqual(len(os.listdir(self.spool.path)), 1)
+
+    def test_remove(self):
+        self.spool.put(*self.item)
+        self.spool.remove()
+        self.assertFalse(os.path.exists(self.spool.path))
+
+        # Removing a spool that doesn't exist is fine
+        self.spool.remove()
+
+    def test_spool_items(self):
+        items = list(spool_items([self.item], 'test_run'))
+        self.assertEqual(items, [(SPOOLED_ITEM_CONTENT_TYPE,
+                                  hash_raw_item(*self.item))])
+
+    def test_transformer_reads_spooled_item(self):
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test_dumps/item.json')) as f:
+            item = ('application/json', f.read())
+        source_definition = {
+            'id': 'test_definition',
+            'item': 'ocd_backend.items.LocalDumpItem'
+        }
+
+        key = self.spool.put(*item)
+        object_id, combined_index_doc, doc = BaseTransformer().run(
+            SPOOLED_ITEM_CONTENT_TYPE, key, run_identifier='test_run',
+            record_metrics=False,
+            source_definition=source_definition)
+
+        self.assertEqual(combined_index_doc['meta']['hash'], key)
+
+    def test_cleanup_removes_spool(self):
+        self.spool.put(*self.item)
+
+        cleanup = BaseCleanup()
+        with mock.patch.object(cleanup, 'run_finished') as run_finished, \
+                mock.patch.object(BaseCleanup, 'backend') as backend:
+            backend.get_json.return_value = None
+            cleanup.finish('test_run', source_definition={'id': 'test'})
+
+        run_finished.assert_called_once_with(
+            'test_run', source_definition={'id': 'test'})
+        self.assertFalse(os.path.exists(self.spool.path))
@@ -0,0 +1,52 @@
+import io
+import json
+from unittest import TestCase
+
+from ocd_backend.utils.streams import CleanUTF8Reader, iter_json_array
+
+
+class IterJSONArrayTestCase(TestCase):
+    def setUp(self):
+        self.items = [
+            {'title': u'Caf\xe9 "de Kroon", [1900]', 'tags': ['a', {'b': []}]},
+            u'back\\slash\\',
+            1, 2.5, True, None, [], {}, [[1, 2], [3]]
+        ]
+        self.raw = json.dumps(self.items, indent=2,
+                              ensure_ascii=False).encode('utf-8')
+
+    def test_yields_raw_elements(self):
+        items = list(iter_json_array(io.BytesIO(self.raw)))
+
+        self.assertEqual([json.loads(item) for item in items], self.items)
+        # The elements are not re-encoded
+        self.assertIn(u'Caf\xe9'.encode('utf-8'), items[0])
+
+    def test_elements_spanning_chunks(self):
+        for chunk_size in [1, 2, 3, 7]:
+            items = iter_json_array(io.BytesIO(self.raw), chunk_size)
+            self.assertEqual([json.loads(item) for item in items], self.items)
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_array(io.BytesIO(' [ ] '))), [])
+
+    def test_no_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.BytesIO('{"items": [1, 2]}')))
+
+    def test_truncated_array(self):
+        items = iter_json_array(io.BytesIO('[{"id": 1}, {"id": 2'))
+
+        self.assertEqual(next(items), '{"id": 1}')
+        with self.assertRaises(ValueError):
+            next(items)
+
+
+class CleanUTF8ReaderTestCase(TestCase):
+    def test_cleans_content(self):
+        reader = CleanUTF8Reader(
+            io.BytesIO(u'Caf\xe9\x0c'.encode('utf-8') + '\xff!'))
+        # Multi-byte characters are not split over reads
+        content = ''.join(iter(lambda: reader.read(1), ''))
+
+        self.assertEqual(content.decode('utf-8'), u'Caf\xe9?\ufffd!')
@@ -0,0 +1,105 @@
+import os.path
+from unittest import TestCase
+
+import mock
+
+from ocd_backend.enrichers import BaseEnricher
+from ocd_backend.tasks import CleanupElasticsearch, FusedPipeline
+
+from .local_executor import MemoryLoader
+
+
+class TagEnricher(BaseEnricher):
+    """Adds the configured tag to the enrichments of an item."""
+    tags = []
+
+    def enrich_item(self, enrichments, object_id, combined_index_doc, doc):
+        enrichments['tag'] = self.enricher_settings['tag']
+        self.tags.append(enrichments['tag'])
+        return enrichments
+
+
+class FusedPipelineTestCase(TestCase):
+    def setUp(self):
+        self.PWD = os.path.dirname(__file__)
+        with open(os.path.join(self.PWD, 'test_dumps/item.json'), 'r') as f:
+            self.item = ('application/json', f.read())
+
+        self.source_definition = {
+            'id': 'test_definition',
+            'transformer': 'ocd_backend.transformers.BaseTransformer',
+            'item': 'ocd_backend.items.LocalDumpItem',
+            'enrichers': [
+                ['tests.ocd_backend.tasks.TagEnricher', {'tag': 'fused'}]
+            ],
+            'loader': 'tests.ocd_backend.local_executor.MemoryLoader'
+        }
+        MemoryLoader.loaded_items = []
+        TagEnricher.tags = []
+
+    def test_run(self):
+        FusedPipeline().run(*self.item,
+                            source_definition=self.source_definition)
+
+        self.assertEqual(len(MemoryLoader.loaded_items), 1)
+        self.assertEqual(TagEnricher.tags, ['fused'])
+
+    def test_run_batch(self):
+        FusedPipeline().run([self.item, self.item], batch=True,
+                            source_definition=self.source_definition)
+
+        self.assertEqual(len(MemoryLoader.loaded_items), 2)
+
+
+class CleanupElasticsearchTestCase(TestCase):
+    def setUp(self):
+        self.kwargs = {
+            'source_definition': {'id': 'test_definition'},
+            'current_index_name': 'ocd_test_1',
+            'new_index_name': 'ocd_test_2',
+            'index_alias': 'ocd_test',
+            'index_settings': {'number_of_replicas': '2',
+                               'refresh_interval': '5s'}
+        }
+
+    @mock.patch('ocd_backend.tasks.es')
+    def test_run_finished(self, es):
+        self.kwargs['source_definition']['optimize_max_num_segments'] = 1
+        CleanupElasticsearch().run_finished('test_run', **self.kwargs)
+
+        # The settings of the new index are restored, and the index is
+        # optimized, before the alias is swapped
+        self.assertEqual([call[0] for call in es.method_calls], [
+            'indices.put_settings', 'indices.optimize', 'indices.refresh',
+            'indices.update_aliases', 'indices.delete'
+        ])
+        es.indices.put_settings.assert_called_once_with(
+            index='ocd_test_2', body={'index': {'number_of_replicas': '2',
+                                                'refresh_interval': '5s'}})
+        self.assertEqual(
+            es.indices.optimize.call_args[1]['max_num_segments'], 1)
+        es.indices.delete.assert_called_once_with(index='ocd_test_1')
+
+    @mock.patch('ocd_backend.tasks.es')
+    def test_run_finished_without_stored_settings(self, es):
+        del self.kwargs['index_settings']
+        es.indices.get_settings.return_value = {'ocd_test_1': {
+            'settings': {'index': {'number_of_replicas': '1'}}}}
+        CleanupElasticsearch().run_finished('test_run', **self.kwargs)
+
+        # The settings of the current index are applied
+        es.indices.get_settings.assert_called_once_with(index='ocd_test_1')
+        es.indices.put_settings.assert_called_once_with(
+            index='ocd_test_2', body={'index': {'number_of_replicas': '1',
+                                                'refresh_interval': '1s'}})
+
+    @mock.patch('ocd_backend.tasks.es')
+    def test_run_finished_without_optimize(self, es):
+        CleanupElasticsearch().run_finished('test_run', **self.kwargs)
+        self.assertFalse(es.indices.optimize.called)
+
+    @mock.patch('ocd_backend.tasks.es')
+    def test_incremental_run_finished(self, es):
+        self.kwargs['new_index_name'] = 'ocd_test_1'
+        CleanupElasticsearch().run_finished('test_run', **self.kwargs)
+        self.assertEqual(es.method_calls, [])
@@ -4,6 +4,7 @@ from . import TransformerTestCase
 
 from ocd_backend.exceptions import NoDeserializerAvailable
 from ocd_backend.transformers import BaseTransformer
+from ocd_backend.utils.misc import hash_raw_item
 
 
 class BaseTransformerTestCase(TransformerTestCase):
@@ -41,3 +42,25 @@ class BaseTransformerTestCase(TransformerTestCase):
         self.assertIsNotNone(object_id)
         self.assertIsNotNone(combi_doc)
         self.assertIsNotNone(doc)
+
+    def test_run_stores_hash(self):
+        object_id, combi_doc, doc = self.transformer.run(
+            *self.item, source_definition=self.source_definition)
+        self.assertEqual(combi_doc['meta']['hash'], hash_raw_item(*self.item))
+
+    def test_run_batch(self):
+        items = self.transformer.run([self.item, self.item],
+                                     source_definition=self.source_definition,
+                                     batch=True)
+        self.assertEqual(len(items), 2)
+        for object_id, combi_doc, doc in items:
+            self.assertIsNotNone(object_id)
+            self.assertIsNotNone(combi_doc)
+            self.assertIsNotNone(doc)
+
+    def test_run_batch_isolates_failures(self):
+        items = self.transformer.run(
+            [('application/test', self.item[1]), self.item],
+            source_definition=self.source_definition, batch=True
+        )
+        self.assertEqual(len(items), 1)